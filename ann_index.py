@@ -0,0 +1,211 @@
+import os
+import sys
+import math
+import time
+import numpy as np
+import faiss
+from index_versions import resolve_index_dir
+
+# Index variant loaded for the main corpus: "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw"
+FAISS_INDEX_TYPE = os.environ.get("FAISS_INDEX_TYPE", "flat")
+
+# Search-time settings: IVF lists probed per query and HNSW candidate list size
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", "64"))
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw"]
+
+def variant_file_name(index_name, index_type):
+    """File holding an index variant; variants share the folder's docstore because vector order is preserved"""
+    if index_type == "flat":
+        return f"{index_name}.faiss"
+    return f"{index_name}_{index_type}.faiss"
+
+def default_nlist(vector_count):
+    """Number of IVF lists: about 4 * sqrt(n), with at least 39 training points per list"""
+    return max(1, min(int(4 * math.sqrt(vector_count)), vector_count // 39))
+
+def build_index(vectors, index_type, nlist=None, pq_m=48, pq_nbits=8, hnsw_m=32, ef_construction=200):
+    """
+    Build an index of the given type over vectors, keeping their order
+
+    Vector i of the input is vector i of the new index, so the langchain
+    index_to_docstore_id mapping of the flat index stays valid.
+
+    Args:
+        vectors: float32 array of shape (n, d)
+        index_type: One of INDEX_TYPES
+        nlist: IVF lists (defaults to default_nlist)
+        pq_m: PQ sub-quantizers (must divide d)
+        pq_nbits: Bits per PQ code (lowered for small corpora, which cannot train 256 centroids)
+        hnsw_m: HNSW graph degree
+        ef_construction: HNSW candidate list size while building
+
+    Returns:
+        faiss.Index: The trained index with all vectors added
+    """
+    vector_count, dimension = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(vector_count)
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_L2)
+        else:
+            pq_nbits = max(1, min(pq_nbits, int(math.log2(max(2, vector_count // 39)))))
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits)
+        index.train(vectors)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_L2)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        raise ValueError(f"Unknown index type {index_type}, expected one of {', '.join(INDEX_TYPES)}")
+
+    index.add(vectors)
+    return index
+
+def apply_search_params(index, nprobe=None, ef_search=None):
+    """Set nprobe on IVF indexes and efSearch on HNSW indexes (other indexes are left unchanged)"""
+    nprobe = nprobe or FAISS_NPROBE
+    ef_search = ef_search or FAISS_EF_SEARCH
+
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        ivf_index.nprobe = min(nprobe, ivf_index.nlist)
+
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+    return index
+
+def index_memory_bytes(index):
+    """Size of an index once serialized, a close estimate of its memory use"""
+    return faiss.serialize_index(index).size
+
+def build_variant(folder_path, index_type, index_name="index", **build_kwargs):
+    """
+    Build an index variant next to a folder's flat index
+
+    Returns:
+        str: Path of the written variant
+    """
+    folder_path = resolve_index_dir(folder_path)
+    flat_index = faiss.read_index(os.path.join(folder_path, f"{index_name}.faiss"))
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+
+    start_time = time.time()
+    index = build_index(vectors, index_type, **build_kwargs)
+    build_seconds = time.time() - start_time
+
+    variant_path = os.path.join(folder_path, variant_file_name(index_name, index_type))
+    temp_path = f"{variant_path}.tmp"
+    faiss.write_index(index, temp_path)
+    os.replace(temp_path, variant_path)
+
+    print(f"Built {index_type} index for {flat_index.ntotal} vectors in {build_seconds:.1f}s: {variant_path}")
+    return variant_path
+
+def _search_timed(index, queries, k):
+    start_time = time.time()
+    _, indices = index.search(queries, k)
+    return indices, time.time() - start_time
+
+def _recall(indices, ground_truth, k):
+    hits = sum(len(set(row[:k]) & set(truth[:k])) for row, truth in zip(indices, ground_truth))
+    return hits / (len(ground_truth) * k)
+
+def benchmark(folder_path, index_name="index", query_texts=None, query_count=500, k=5):
+    """
+    Compare recall@k against the flat index, QPS and memory of each index type and search setting
+
+    Queries are embedded question texts when given, otherwise a sample of the
+    corpus's own vectors.
+
+    Returns:
+        list: One dict per configuration
+    """
+    folder_path = resolve_index_dir(folder_path)
+    flat_index = faiss.read_index(os.path.join(folder_path, f"{index_name}.faiss"))
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+
+    if query_texts:
+        from embedding_service import get_query_embeddings
+        queries = np.array(get_query_embeddings().embed_documents(query_texts), dtype=np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), size=min(query_count, len(vectors)), replace=False)]
+
+    ground_truth, flat_seconds = _search_timed(flat_index, queries, k)
+    results = [{
+        "index_type": "flat",
+        "setting": "exact",
+        "recall": 1.0,
+        "qps": round(len(queries) / flat_seconds, 1),
+        "memory_bytes": index_memory_bytes(flat_index),
+        "build_seconds": 0.0
+    }]
+
+    settings = {
+        "ivf_flat": [("nprobe", value) for value in (1, 4, 16, 64)],
+        "ivf_pq": [("nprobe", value) for value in (1, 4, 16, 64)],
+        "hnsw": [("efSearch", value) for value in (16, 32, 64, 128)]
+    }
+
+    for index_type, values in settings.items():
+        start_time = time.time()
+        index = build_index(vectors, index_type)
+        build_seconds = time.time() - start_time
+        memory_bytes = index_memory_bytes(index)
+
+        for name, value in values:
+            if name == "nprobe":
+                apply_search_params(index, nprobe=value)
+            else:
+                apply_search_params(index, ef_search=value)
+
+            indices, seconds = _search_timed(index, queries, k)
+            results.append({
+                "index_type": index_type,
+                "setting": f"{name}={value}",
+                "recall": round(_recall(indices, ground_truth, k), 4),
+                "qps": round(len(queries) / seconds, 1),
+                "memory_bytes": memory_bytes,
+                "build_seconds": round(build_seconds, 1)
+            })
+
+    print(f"Index benchmark: {flat_index.ntotal} vectors, {len(queries)} queries, recall@{k} against flat")
+    print(f"  {'type':9s} {'setting':12s} {'recall':>7s} {'QPS':>10s} {'memory':>10s} {'build':>7s}")
+    for result in results:
+        print(
+            f"  {result['index_type']:9s} {result['setting']:12s} {result['recall']:7.3f} "
+            f"{result['qps']:10.1f} {result['memory_bytes'] / (1024 * 1024):8.1f}MB {result['build_seconds']:6.1f}s"
+        )
+
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "benchmark"):
+        print("Usage: python ann_index.py <command> [args]")
+        print("Commands:")
+        print("  build <faiss_index_dir> <ivf_flat|ivf_pq|hnsw> [nlist] - Build an index variant next to the flat index")
+        print("  benchmark <faiss_index_dir> [questions_file] - Report recall@5, QPS and memory of each index type")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == "build" and len(sys.argv) >= 4 and sys.argv[3] in INDEX_TYPES[1:]:
+        nlist = int(sys.argv[4]) if len(sys.argv) >= 5 else None
+        build_variant(sys.argv[2], sys.argv[3], nlist=nlist)
+
+    elif command == "benchmark":
+        query_texts = None
+        if len(sys.argv) >= 4:
+            with open(sys.argv[3], "r") as f:
+                query_texts = [line.strip() for line in f if line.strip()]
+        benchmark(sys.argv[2], query_texts=query_texts)
+
+    else:
+        print("Invalid command or missing arguments")
+        sys.exit(1)
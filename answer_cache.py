@@ -0,0 +1,133 @@
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+
+# Minimum cosine similarity between two questions for a cached answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# How long a cached answer stays valid
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+# Maximum number of cached answers across all namespaces
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+def get_chunk_ids(docs):
+    """Get stable IDs for retrieved chunks, based on their source, page and text"""
+    chunk_ids = []
+    for doc in docs:
+        key = f"{doc.metadata.get('source', '')}|{doc.metadata.get('page', '')}|{doc.page_content}"
+        chunk_ids.append(hashlib.sha1(key.encode("utf-8")).hexdigest())
+    return tuple(chunk_ids)
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers looked up by question similarity
+
+    Answers are grouped by namespace (the main corpus or a PDF ID). A cached
+    answer is reused when a new question's embedding is within the cosine
+    threshold of the cached question and the retriever returned the same
+    chunks, so the answer was generated from identical context.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove_expired(self, now):
+        for namespace in list(self._entries):
+            entries = [entry for entry in self._entries[namespace] if now - entry["created_at"] < self.ttl_seconds]
+            if entries:
+                self._entries[namespace] = entries
+            else:
+                del self._entries[namespace]
+
+    def _entry_count(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def lookup(self, namespace, question_vector, chunk_ids):
+        """
+        Find a cached answer for a question
+
+        Args:
+            namespace: Cache namespace ("corpus" or a PDF ID)
+            question_vector: Embedding of the question
+            chunk_ids: IDs of the chunks retrieved for the question
+
+        Returns:
+            dict: The cached result, or None on a miss
+        """
+        vector = self._normalize(question_vector)
+        now = time.time()
+
+        with self._lock:
+            self._remove_expired(now)
+
+            candidates = [entry for entry in self._entries.get(namespace, []) if entry["chunk_ids"] == chunk_ids]
+            if candidates:
+                similarities = np.stack([entry["vector"] for entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return dict(candidates[best]["result"])
+
+            self.misses += 1
+            return None
+
+    def store(self, namespace, question_vector, chunk_ids, result):
+        """Cache a generated result for a question"""
+        entry = {
+            "vector": self._normalize(question_vector),
+            "chunk_ids": chunk_ids,
+            "result": dict(result),
+            "created_at": time.time()
+        }
+
+        with self._lock:
+            self._entries.setdefault(namespace, []).append(entry)
+
+            # Drop the oldest answers once the cache is full
+            while self._entry_count() > self.max_entries:
+                oldest_namespace = min(self._entries, key=lambda name: self._entries[name][0]["created_at"])
+                self._entries[oldest_namespace].pop(0)
+                if not self._entries[oldest_namespace]:
+                    del self._entries[oldest_namespace]
+
+    def invalidate(self, namespace):
+        """Remove every cached answer in a namespace (e.g. when a PDF is deleted)"""
+        with self._lock:
+            removed = self._entries.pop(namespace, [])
+            self.invalidations += len(removed)
+
+    def get_stats(self):
+        """Get hit/miss counters and the number of cached answers"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entry_count(),
+                "namespaces": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+# Process-wide answer cache
+answer_cache = SemanticAnswerCache()
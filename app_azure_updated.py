@@ -1,13 +1,13 @@
 import os
 import streamlit as st
-import tempfile
 import shutil
-import zipfile
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
 from openai import AzureOpenAI
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
+from blob_pool import get_container_client
+from blob_download import download_blob_to_file, download_index_files, extract_zip_once, BLOB_DOWNLOAD_DIR
+from faiss_loader import load_faiss_index
+from hybrid_retriever import make_retriever
+from embedding_service import get_query_embeddings
 
 # Load environment variables
 load_dotenv()
@@ -30,35 +30,28 @@ def load_retriever():
     container_name = os.environ.get("BLOB_CONTAINER_NAME")
     use_blob_storage = connection_string and container_name
     
-    # Create embeddings model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
+    # Get the shared embeddings model
+    embeddings = get_query_embeddings()
     
     if use_blob_storage:
         try:
-            # Create a temporary directory to store downloaded index
-            temp_dir = tempfile.mkdtemp()
-            zip_path = os.path.join(temp_dir, "faiss_index.zip")
-            extracted_dir = os.path.join(temp_dir, "faiss_index")
+            # Downloads go to a stable directory so an interrupted transfer resumes on the next start
+            os.makedirs(BLOB_DOWNLOAD_DIR, exist_ok=True)
+            zip_path = os.path.join(BLOB_DOWNLOAD_DIR, "faiss_index.zip")
             
             # Download from Azure Blob Storage
             with st.spinner("Downloading FAISS index from Azure Blob Storage..."):
-                blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-                container_client = blob_service_client.get_container_client(container_name)
+                container_client = get_container_client(container_name, connection_string)
                 
-                # Try to download the zip file first
+                # Try to download the zip file first, with parallel ranged requests
                 try:
-                    with open(zip_path, "wb") as download_file:
-                        download_file.write(container_client.download_blob("faiss_index.zip").readall())
+                    download_blob_to_file(container_client, "faiss_index.zip", zip_path)
                     
                     # Extract the zip file
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
+                    extracted_dir = os.path.join(extract_zip_once(zip_path, os.path.join(BLOB_DOWNLOAD_DIR, "faiss_index_zip")), "faiss_index")
                     
                     # Load the index
-                    vector_store = FAISS.load_local(extracted_dir, embeddings)
+                    vector_store = load_faiss_index(extracted_dir, embeddings)
                     st.sidebar.success("Loaded FAISS index from Azure Blob Storage (zip)")
                 
                 except Exception as e:
@@ -66,41 +59,33 @@ def load_retriever():
                     st.sidebar.warning(f"Could not download zip file: {str(e)}")
                     st.sidebar.info("Trying to download individual files...")
                     
-                    # Create directory for extracted files
-                    os.makedirs(extracted_dir, exist_ok=True)
-                    
-                    # Download index.faiss
-                    with open(os.path.join(extracted_dir, "index.faiss"), "wb") as download_file:
-                        download_file.write(container_client.download_blob("faiss_index/index.faiss").readall())
-                    
-                    # Download index.pkl
-                    with open(os.path.join(extracted_dir, "index.pkl"), "wb") as download_file:
-                        download_file.write(container_client.download_blob("faiss_index/index.pkl").readall())
+                    # Download index.faiss with its chunk store and BM25 index
+                    extracted_dir = download_index_files(container_client, "faiss_index", os.path.join(BLOB_DOWNLOAD_DIR, "faiss_index"))
                     
                     # Load the index
-                    vector_store = FAISS.load_local(extracted_dir, embeddings)
+                    vector_store = load_faiss_index(extracted_dir, embeddings)
                     st.sidebar.success("Loaded FAISS index from Azure Blob Storage (individual files)")
             
         except Exception as e:
             st.sidebar.error(f"Error loading from Azure Blob Storage: {str(e)}")
             # Fall back to local index if available
             if os.path.exists("faiss_index"):
-                vector_store = FAISS.load_local("faiss_index", embeddings)
+                vector_store = load_faiss_index("faiss_index", embeddings)
                 st.sidebar.warning("Failed to load from Blob Storage. Using local FAISS index instead.")
             else:
-                st.sidebar.error("No FAISS index found locally or in Blob Storage. Please run preprocess.py first.")
+                st.sidebar.error("No FAISS index found locally or in Blob Storage. Please run python corpus_builder.py build first.")
                 st.stop()
     
     elif os.path.exists("faiss_index"):
         # Load existing local index
-        vector_store = FAISS.load_local("faiss_index", embeddings)
+        vector_store = load_faiss_index("faiss_index", embeddings)
         st.sidebar.info("Loaded local FAISS index (Azure Blob Storage not configured)")
     else:
-        st.sidebar.error("No local FAISS index found. Please run preprocess.py first.")
+        st.sidebar.error("No local FAISS index found. Please run python corpus_builder.py build first.")
         st.stop()
     
     # Create retriever
-    retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+    retriever = make_retriever(vector_store)
     return retriever
 
 @st.cache_resource
@@ -4,10 +4,11 @@ import requests
 import re
 from flask import Flask, render_template, request, jsonify, Response
 from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 from azure.storage.blob import BlobServiceClient
+from faiss_loader import load_faiss_index
+from blob_download import download_index_files
 
 # Load environment variables
 load_dotenv()
@@ -45,16 +46,11 @@ def load_faiss_from_blob():
         blob_service_client = BlobServiceClient.from_connection_string(connection_string)
         container_client = blob_service_client.get_container_client(container_name)
         
-        # Download index.faiss
-        with open(os.path.join(extracted_dir, "index.faiss"), "wb") as download_file:
-            download_file.write(container_client.download_blob("faiss_index/index.faiss").readall())
-        
-        # Download index.pkl
-        with open(os.path.join(extracted_dir, "index.pkl"), "wb") as download_file:
-            download_file.write(container_client.download_blob("faiss_index/index.pkl").readall())
+        # Download index.faiss with its chunk store (index.sqlite, or index.pkl for older indexes)
+        download_index_files(container_client, "faiss_index", extracted_dir)
         
         # Load the index
-        vector_store = FAISS.load_local(extracted_dir, embeddings)
+        vector_store = load_faiss_index(extracted_dir, embeddings)
         print("Loaded FAISS index from Azure Blob Storage")
         
         # Create retriever
@@ -68,7 +64,7 @@ def load_faiss_from_blob():
 def load_faiss_local():
     """Load FAISS index from local storage"""
     if not os.path.exists("faiss_index"):
-        raise Exception("No FAISS index found locally. Please run preprocess.py first.")
+        raise Exception("No FAISS index found locally. Please run python corpus_builder.py build first.")
     
     # Create embeddings model
     embeddings = HuggingFaceEmbeddings(
@@ -77,7 +73,7 @@ def load_faiss_local():
     )
     
     # Load the index
-    vector_store = FAISS.load_local("faiss_index", embeddings)
+    vector_store = load_faiss_index("faiss_index", embeddings)
     print("Loaded local FAISS index")
     
     # Create retriever
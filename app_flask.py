@@ -1,21 +1,31 @@
 import os
 import tempfile
-import zipfile
+import shutil
 import json
 import requests
 import re
 import urllib.parse
 import uuid
+import time
 from bs4 import BeautifulSoup
 import trafilatura
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from werkzeug.utils import secure_filename
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
 from openai import AzureOpenAI
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
-from pdf_processor import process_pdf, get_pdf_retriever, delete_pdf, get_active_pdf_count, list_pdfs_from_blob
+from blob_pool import get_container_client, get_connection_stats, reset_thread_connection_count, get_thread_connection_count
+from index_disk_cache import index_disk_cache
+from blob_download import download_blob_to_file, download_index_files, extract_zip_once, BLOB_DOWNLOAD_DIR
+from faiss_loader import load_faiss_index, get_last_load_stats
+from hybrid_retriever import make_retriever
+from pdf_processor import search_pdfs, delete_pdf, list_pdfs_from_blob, add_pdf_reference, can_admit_pdf, get_retriever_cache_stats, get_pdf_metadata
+from retriever_cache import estimate_pdf_index_bytes
+from pdf_catalog import pdf_catalog, pdf_metadata_cache
+from shared_pdf_index import shared_pdf_index, use_shared_index
+from embedding_service import get_query_embeddings, warm_up, health_check
+from query_cache import query_embedding_cache
+from answer_cache import answer_cache, get_chunk_ids
+from ingest_queue import submit_pdf_job, get_job, get_pending_job_bytes
 
 # Load environment variables
 load_dotenv()
@@ -31,6 +41,20 @@ retriever = None
 azure_client = None
 user_pdfs = {}
 
+@app.before_request
+def start_connection_count():
+    """Count the blob storage connections opened while handling each request"""
+    reset_thread_connection_count()
+
+@app.after_request
+def report_connection_count(response):
+    """Report the blob storage connections opened while handling the request"""
+    opened = get_thread_connection_count()
+    response.headers['X-Blob-Connections-Opened'] = str(opened)
+    if opened:
+        print(f"{request.method} {request.path} opened {opened} blob storage connection(s)")
+    return response
+
 def load_faiss_from_blob():
     """Load FAISS index from Azure Blob Storage"""
     connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
@@ -40,34 +64,27 @@ def load_faiss_from_blob():
         print("Azure Storage credentials not found, checking for local index")
         return load_faiss_local()
     
-    # Create embeddings model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
+    # Get the shared embeddings model
+    embeddings = get_query_embeddings()
     
     try:
-        # Create a temporary directory to store downloaded index
-        temp_dir = tempfile.mkdtemp()
-        zip_path = os.path.join(temp_dir, "faiss_index.zip")
-        extracted_dir = os.path.join(temp_dir, "faiss_index")
+        # Downloads go to a stable directory so an interrupted transfer resumes on the next start
+        os.makedirs(BLOB_DOWNLOAD_DIR, exist_ok=True)
+        zip_path = os.path.join(BLOB_DOWNLOAD_DIR, "faiss_index.zip")
         
         # Download from Azure Blob Storage
         print("Downloading FAISS index from Azure Blob Storage...")
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
+        container_client = get_container_client(container_name, connection_string)
         
-        # Try to download the zip file
+        # Try to download the zip file with parallel ranged requests
         try:
-            with open(zip_path, "wb") as download_file:
-                download_file.write(container_client.download_blob("faiss_index.zip").readall())
+            download_blob_to_file(container_client, "faiss_index.zip", zip_path)
             
-            # Extract the zip file
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
+            # Extract the zip once per version into a directory shared by all workers
+            extracted_dir = os.path.join(extract_zip_once(zip_path, os.path.join(BLOB_DOWNLOAD_DIR, "faiss_index_zip")), "faiss_index")
             
-            # Load the index
-            vector_store = FAISS.load_local(extracted_dir, embeddings)
+            # Load the index, memory-mapped so workers share it
+            vector_store = load_faiss_index(extracted_dir, embeddings)
             print("Loaded FAISS index from Azure Blob Storage (zip)")
             
         except Exception as e:
@@ -75,23 +92,15 @@ def load_faiss_from_blob():
             print(f"Could not download zip file: {str(e)}")
             print("Trying to download individual files...")
             
-            # Create directory for extracted files
-            os.makedirs(extracted_dir, exist_ok=True)
-            
-            # Download index.faiss
-            with open(os.path.join(extracted_dir, "index.faiss"), "wb") as download_file:
-                download_file.write(container_client.download_blob("faiss_index/index.faiss").readall())
-            
-            # Download index.pkl
-            with open(os.path.join(extracted_dir, "index.pkl"), "wb") as download_file:
-                download_file.write(container_client.download_blob("faiss_index/index.pkl").readall())
+            # Download index.faiss with its chunk store and BM25 index
+            extracted_dir = download_index_files(container_client, "faiss_index", os.path.join(BLOB_DOWNLOAD_DIR, "faiss_index"))
             
             # Load the index
-            vector_store = FAISS.load_local(extracted_dir, embeddings)
+            vector_store = load_faiss_index(extracted_dir, embeddings)
             print("Loaded FAISS index from Azure Blob Storage (individual files)")
         
         # Create retriever
-        return vector_store.as_retriever(search_kwargs={"k": 5})
+        return make_retriever(vector_store)
         
     except Exception as e:
         print(f"Error loading from Azure Blob Storage: {str(e)}")
@@ -102,23 +111,27 @@ def allowed_file(filename):
     """Check if the file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def get_uploader_id():
+    """Get the ID this browser session holds PDF references under, creating it on first use"""
+    if 'uploader_id' not in session:
+        session['uploader_id'] = str(uuid.uuid4())
+        session.permanent = True
+    return session['uploader_id']
+
 def load_faiss_local():
     """Load FAISS index from local storage"""
     if not os.path.exists("faiss_index"):
-        raise Exception("No FAISS index found locally. Please run preprocess.py first.")
+        raise Exception("No FAISS index found locally. Please run python corpus_builder.py build first.")
     
-    # Create embeddings model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
+    # Get the shared embeddings model
+    embeddings = get_query_embeddings()
     
     # Load the index
-    vector_store = FAISS.load_local("faiss_index", embeddings)
+    vector_store = load_faiss_index("faiss_index", embeddings)
     print("Loaded local FAISS index")
     
     # Create retriever
-    return vector_store.as_retriever(search_kwargs={"k": 5})
+    return make_retriever(vector_store)
 
 def create_azure_openai_client():
     """Create Azure OpenAI client"""
@@ -382,8 +395,8 @@ def search_web(query, max_results=3):
             }
         ]
 
-def generate_answer(question, docs, url_content=None, web_search_enabled=True):
-    """Generate an answer based on retrieved documents, web search, and URL content"""
+def build_answer_prompt(question, docs, url_content=None, web_search_enabled=True):
+    """Build the prompt and citations for a question from retrieved documents, web search, and URL content"""
     # Extract content and citations from documents
     contexts = []
     citations = []
@@ -471,6 +484,39 @@ def generate_answer(question, docs, url_content=None, web_search_enabled=True):
     Include citations like [1], [2], etc. when referencing specific information.
     """
     
+    return prompt, citations
+
+def build_answer_messages(prompt):
+    """Build the chat messages sent to Azure OpenAI for an answer prompt"""
+    return [
+        {
+            "role": "system",
+            "content": "You are a medical assistant specializing in gynecology. Provide clear, accurate information based on medical literature and web search results. Include relevant details and maintain a professional tone."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def generate_answer(question, docs, url_content=None, web_search_enabled=True, cache_namespace=None):
+    """Generate an answer based on retrieved documents, web search, and URL content"""
+    # Serve near-identical questions over the same retrieved chunks from the answer cache
+    # Answers that use content from a URL are never cached
+    use_cache = cache_namespace is not None and not url_content
+    
+    if use_cache:
+        question_vector = get_query_embeddings().embed_query(question)
+        chunk_ids = get_chunk_ids(docs)
+        
+        cached_result = answer_cache.lookup(cache_namespace, question_vector, chunk_ids)
+        if cached_result:
+            print(f"Answer cache hit for question: {question}")
+            return cached_result
+    
+    # Build the prompt and citations
+    prompt, citations = build_answer_prompt(question, docs, url_content, web_search_enabled)
+    
     # Generate summary using Azure OpenAI
     client = azure_client
     if not client:
@@ -480,27 +526,130 @@ def generate_answer(question, docs, url_content=None, web_search_enabled=True):
         deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo")
         
         response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a medical assistant specializing in gynecology. Provide clear, accurate information based on medical literature and web search results. Include relevant details and maintain a professional tone."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=build_answer_messages(prompt),
             max_tokens=800,
             temperature=0.3,
             model=deployment
         )
         
         summary = response.choices[0].message.content
-        return {"answer": summary, "sources": citations}
+        result = {"answer": summary, "sources": citations}
+        
+        # Cache the answer for similar questions
+        if use_cache:
+            answer_cache.store(cache_namespace, question_vector, chunk_ids, result)
+        
+        return result
     
     except Exception as e:
         return {"answer": f"Error generating response: {str(e)}", "sources": citations}
 
+def format_sse(event, data):
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_answer(question, docs, url_content=None, web_search_enabled=True, cache_namespace=None, extra=None):
+    """
+    Stream an answer as Server-Sent Events
+    
+    Events are sent in this order:
+        sources - the citations (plus any extra fields, e.g. PDF metadata)
+        token   - one per answer delta produced by Azure OpenAI
+        done    - usage statistics and timings
+    An error event replaces the remaining events if generation fails.
+    """
+    start_time = time.time()
+    
+    # Serve near-identical questions from the answer cache, as in generate_answer
+    use_cache = cache_namespace is not None and not url_content
+    
+    if use_cache:
+        question_vector = get_query_embeddings().embed_query(question)
+        chunk_ids = get_chunk_ids(docs)
+        
+        cached_result = answer_cache.lookup(cache_namespace, question_vector, chunk_ids)
+        if cached_result:
+            yield format_sse("sources", dict({"sources": cached_result["sources"]}, **(extra or {})))
+            yield format_sse("token", {"delta": cached_result["answer"]})
+            yield format_sse("done", {
+                "cached": True,
+                "time_to_first_token_ms": round((time.time() - start_time) * 1000),
+                "total_ms": round((time.time() - start_time) * 1000)
+            })
+            return
+    
+    # Build the prompt and send the sources before generation starts
+    prompt, citations = build_answer_prompt(question, docs, url_content, web_search_enabled)
+    yield format_sse("sources", dict({"sources": citations}, **(extra or {})))
+    
+    client = azure_client
+    if not client:
+        yield format_sse("error", {"error": "Azure OpenAI client not available"})
+        return
+    
+    try:
+        deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo")
+        
+        response = client.chat.completions.create(
+            messages=build_answer_messages(prompt),
+            max_tokens=800,
+            temperature=0.3,
+            model=deployment,
+            stream=True
+        )
+        
+        answer_parts = []
+        first_token_time = None
+        finish_reason = None
+        
+        for chunk in response:
+            # Azure sends content filter results in chunks without choices
+            if not chunk.choices:
+                continue
+            
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+            
+            delta = choice.delta.content if choice.delta else None
+            if not delta:
+                continue
+            
+            if first_token_time is None:
+                first_token_time = time.time()
+            
+            answer_parts.append(delta)
+            yield format_sse("token", {"delta": delta})
+        
+        answer = "".join(answer_parts)
+        
+        # Cache the complete answer for similar questions
+        if use_cache:
+            answer_cache.store(cache_namespace, question_vector, chunk_ids, {"answer": answer, "sources": citations})
+        
+        yield format_sse("done", {
+            "cached": False,
+            "usage": {
+                "completion_chunks": len(answer_parts),
+                "answer_chars": len(answer),
+                "prompt_chars": len(prompt),
+                "finish_reason": finish_reason
+            },
+            "time_to_first_token_ms": round((first_token_time - start_time) * 1000) if first_token_time else None,
+            "total_ms": round((time.time() - start_time) * 1000)
+        })
+    
+    except Exception as e:
+        yield format_sse("error", {"error": f"Error generating response: {str(e)}"})
+
+def sse_response(events):
+    """Wrap an event generator in a streaming response that proxies will not buffer"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/')
 def index():
     return render_template('index_deepseek.html')
@@ -534,8 +683,14 @@ def ask():
         # Get relevant documents
         docs = retriever.get_relevant_documents(question)
         
-        # Generate answer
-        result = generate_answer(question, docs, url_content, web_search_enabled)
+        # Generate answer (web search answers are cached separately from literature-only answers)
+        cache_namespace = "corpus:web" if web_search_enabled else "corpus"
+        
+        # Stream the answer as Server-Sent Events if requested
+        if data.get('stream'):
+            return sse_response(stream_answer(question, docs, url_content, web_search_enabled, cache_namespace))
+        
+        result = generate_answer(question, docs, url_content, web_search_enabled, cache_namespace)
         
         return jsonify(result)
     
@@ -554,6 +709,38 @@ def clear_history():
     # This endpoint is optional - for clearing server-side history if implemented
     return jsonify({"message": "History cleared"})
 
+@app.route('/api/health/embeddings', methods=['GET'])
+def embeddings_health():
+    """Report the health and load metrics of the shared embeddings model"""
+    status = health_check()
+    return jsonify(status), (200 if status["status"] == "ok" else 503)
+
+@app.route('/api/health/index', methods=['GET'])
+def index_health():
+    """Report how the main FAISS index was loaded (mmap, load time, RSS before and after)"""
+    stats = get_last_load_stats()
+    return jsonify(stats), (200 if stats else 503)
+
+@app.route('/api/blob-stats', methods=['GET'])
+def blob_stats():
+    """Report how many blob storage connections the shared clients have opened"""
+    return jsonify(get_connection_stats())
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Report hit/miss counters and memory/disk usage of the caches"""
+    stats = {
+        "query_embeddings": query_embedding_cache.get_stats(),
+        "answers": answer_cache.get_stats(),
+        "pdf_indexes_on_disk": index_disk_cache.get_stats(),
+        "pdf_retrievers": get_retriever_cache_stats(),
+        "pdf_catalog": pdf_catalog.get_stats(),
+        "pdf_metadata": pdf_metadata_cache.get_stats()
+    }
+    if use_shared_index():
+        stats["shared_pdf_index"] = shared_pdf_index.get_stats()
+    return jsonify(stats)
+
 @app.route('/api/upload-pdf', methods=['POST'])
 def upload_pdf():
     """Upload and process a PDF file"""
@@ -565,51 +752,128 @@ def upload_pdf():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     
-    # Check if we've reached the upload limit (2 PDFs)
-    if get_active_pdf_count() >= 2:
-        return jsonify({"error": "Maximum of 2 PDF uploads allowed. Please delete an existing PDF first."}), 400
-    
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
         
         try:
-            # Process the PDF file
-            pdf_data = process_pdf(file, filename)
+            # Save the upload so the request can return before processing starts
+            staging_dir = tempfile.mkdtemp()
+            staged_path = os.path.join(staging_dir, filename)
+            file.save(staged_path)
             
-            # Store PDF data in the global dictionary
-            user_pdfs[pdf_data['id']] = pdf_data
+            # Check the new index, plus the ones still processing, fits the retriever memory budget
+            estimated_bytes = estimate_pdf_index_bytes(os.path.getsize(staged_path) + get_pending_job_bytes())
+            if not can_admit_pdf(estimated_bytes):
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return jsonify({"error": "Not enough memory to load another PDF right now. Please try again later or delete an existing PDF."}), 503
+            
+            # Queue the PDF for background processing
+            job_id = submit_pdf_job(
+                staged_path,
+                filename,
+                on_complete=register_uploaded_pdf,
+                cleanup_dir=staging_dir,
+                uploader_id=get_uploader_id()
+            )
             
             return jsonify({
                 "success": True,
-                "pdf_id": pdf_data['id'],
-                "filename": pdf_data['filename'],
-                "page_count": pdf_data['page_count']
-            })
+                "job_id": job_id,
+                "filename": filename,
+                "status_url": url_for('upload_status', job_id=job_id)
+            }), 202
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
     return jsonify({"error": "File type not allowed"}), 400
 
+@app.route('/api/upload-pdf/by-hash', methods=['POST'])
+def upload_pdf_by_hash():
+    """Add a PDF by its SHA-256 content hash, so the browser can skip sending bytes the server already has"""
+    data = request.json or {}
+    content_hash = data.get('sha256', '').lower()
+    
+    if not re.fullmatch(r'[0-9a-f]{64}', content_hash):
+        return jsonify({"error": "Invalid SHA-256 hash"}), 400
+    
+    # Check the PDFs still processing fit the retriever memory budget (the referenced index loads on first use)
+    if not can_admit_pdf(estimate_pdf_index_bytes(get_pending_job_bytes())):
+        return jsonify({"error": "Not enough memory to load another PDF right now. Please try again later or delete an existing PDF."}), 503
+    
+    try:
+        # Reference the existing PDF if the content is known (once per session, however often it is uploaded)
+        pdf_data = add_pdf_reference(content_hash, get_uploader_id())
+        
+        if not pdf_data:
+            return jsonify({"exists": False})
+        
+        register_uploaded_pdf(pdf_data)
+        
+        return jsonify({
+            "exists": True,
+            "success": True,
+            "pdf_id": pdf_data['id'],
+            "filename": pdf_data['filename'],
+            "page_count": pdf_data['page_count']
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def register_uploaded_pdf(pdf_data):
+    """Store PDF data in the global dictionary once its ingestion job has finished"""
+    user_pdfs[pdf_data['id']] = pdf_data
+
+@app.route('/api/upload-status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """Get the progress of a PDF ingestion job"""
+    job = get_job(job_id)
+    
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    status = {
+        "job_id": job['id'],
+        "filename": job['filename'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "pages_done": job['pages_done'],
+        "page_count": job['page_count'],
+        "progress": job['progress'],
+        "eta_seconds": job['eta_seconds']
+    }
+    
+    if job['status'] == 'completed':
+        status["pdf_id"] = job['result']['id']
+        status["page_count"] = job['result']['page_count']
+    elif job['status'] == 'failed':
+        status["error"] = job['error']
+    
+    return jsonify(status)
+
 @app.route('/api/pdf-tab-template/<pdf_id>')
 def pdf_tab_template(pdf_id):
     """Get HTML template for a PDF tab"""
-    if pdf_id not in user_pdfs:
-        # Try to load PDF info from blob storage
-        pdfs = list_pdfs_from_blob()
-        pdf_info = next((pdf for pdf in pdfs if pdf['id'] == pdf_id), None)
+    if pdf_id not in user_pdfs or not user_pdfs[pdf_id].get('page_count'):
+        # Look up this PDF's metadata record (cached, at most one small read)
+        pdf_info = get_pdf_metadata(pdf_id)
         
-        if not pdf_info:
+        if pdf_info:
+            # Store PDF data in the global dictionary
+            user_pdfs[pdf_id] = {
+                "id": pdf_id,
+                "filename": pdf_info['filename'],
+                "page_count": pdf_info.get('page_count', 0)
+            }
+        elif pdf_id not in user_pdfs:
             return "PDF not found", 404
-        
-        # Store PDF data in the global dictionary
-        user_pdfs[pdf_id] = pdf_info
     
     # Get PDF info
     pdf_info = user_pdfs[pdf_id]
     
-    # Get page count or set to Unknown
-    page_count = pdf_info.get('page_count', 'Unknown')
+    # Get page count or set to Unknown (PDFs uploaded before page counts were recorded)
+    page_count = pdf_info.get('page_count') or 'Unknown'
     
     # Render template
     try:
@@ -642,14 +906,18 @@ def pdf_tab_template(pdf_id):
 def delete_pdf_route(pdf_id):
     """Delete a PDF and its FAISS index"""
     try:
-        # Delete the PDF
-        success = delete_pdf(pdf_id)
+        # Release this session's reference, deleting the PDF with the last one
+        status = delete_pdf(pdf_id, get_uploader_id())
         
-        # Remove from user_pdfs dictionary
-        if pdf_id in user_pdfs:
-            del user_pdfs[pdf_id]
+        if status == "in_use":
+            # Nothing was deleted, so the PDF stays listed
+            return jsonify({
+                "error": "This PDF was also uploaded by other users, so it was kept",
+                "in_use": True
+            }), 409
         
-        if success:
+        if status == "deleted":
+            user_pdfs.pop(pdf_id, None)
             return jsonify({"success": True})
         else:
             return jsonify({"error": "PDF not found"}), 404
@@ -673,34 +941,55 @@ def get_pdfs():
 
 @app.route('/api/ask-pdf/<pdf_id>', methods=['POST'])
 def ask_pdf(pdf_id):
-    """Ask a question about a specific PDF"""
-    if pdf_id not in user_pdfs:
-        return jsonify({"error": "PDF not found"}), 404
+    """
+    Ask a question about a specific PDF
     
+    An optional "pdf_ids" list in the request body adds more PDFs to search
+    together with this one.
+    """
     data = request.json
     question = data.get('question', '')
     
+    # The PDF in the URL plus any others asked about together with it
+    pdf_ids = [pdf_id] + [other_id for other_id in data.get('pdf_ids', []) if other_id != pdf_id]
+    
+    missing_ids = [requested_id for requested_id in pdf_ids if requested_id not in user_pdfs]
+    if missing_ids:
+        return jsonify({"error": "PDF not found", "pdf_ids": missing_ids}), 404
+    
     if not question:
         return jsonify({"error": "No question provided"}), 400
     
     try:
-        # Get PDF-specific retriever
-        pdf_retriever = get_pdf_retriever(pdf_id)
+        # Get relevant documents from the PDFs (one filtered search when the shared index is enabled)
+        docs = search_pdfs(question, pdf_ids)
         
-        if not pdf_retriever:
+        if docs is None:
             return jsonify({"error": "Failed to load PDF retriever"}), 500
         
-        # Get relevant documents from the PDF
-        docs = pdf_retriever.get_relevant_documents(question)
+        # PDF metadata returned with the answer
+        pdf_metadata = {
+            "id": pdf_id,
+            "filename": user_pdfs[pdf_id]['filename']
+        }
+        if len(pdf_ids) > 1:
+            pdf_metadata["also_searched"] = [
+                {"id": other_id, "filename": user_pdfs[other_id]['filename']}
+                for other_id in pdf_ids[1:]
+            ]
+        
+        # Answers are cached per PDF; questions across several PDFs are not cached
+        cache_namespace = pdf_id if len(pdf_ids) == 1 else None
+        
+        # Stream the answer as Server-Sent Events if requested (no web search for PDF-specific questions)
+        if data.get('stream'):
+            return sse_response(stream_answer(question, docs, None, False, cache_namespace, {"pdf": pdf_metadata}))
         
         # Generate answer
-        result = generate_answer(question, docs, None, False)  # No web search for PDF-specific questions
+        result = generate_answer(question, docs, None, False, cache_namespace)  # No web search for PDF-specific questions
         
         # Add PDF metadata to the result
-        result["pdf"] = {
-            "id": pdf_id,
-            "filename": user_pdfs[pdf_id]['filename']
-        }
+        result["pdf"] = pdf_metadata
         
         return jsonify(result)
         
@@ -712,6 +1001,10 @@ if __name__ == '__main__':
     # Create user uploads directory if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Load the shared embeddings model before the first request needs it
+    print("Warming up embeddings model...")
+    warm_up()
+    
     # Load FAISS index
     print("Loading FAISS index...")
     retriever = load_faiss_from_blob()
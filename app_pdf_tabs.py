@@ -1,13 +1,14 @@
 import os
 import uuid
 import streamlit as st
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
+from faiss_loader import load_faiss_index
+from hybrid_retriever import make_retriever
 from langchain.chains import RetrievalQA
 from langchain.llms import HuggingFaceHub
 from dotenv import load_dotenv
 import tempfile
 from upload_faiss_to_blob import process_and_upload_pdf, list_uploaded_pdfs, download_faiss_index
+from embedding_service import get_query_embeddings
 
 # Load environment variables
 load_dotenv()
@@ -38,17 +39,14 @@ def load_pdf_retriever(upload_id):
         return None
     
     try:
-        # Initialize embeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
-        )
+        # Get the shared embeddings model
+        embeddings = get_query_embeddings()
         
         # Load FAISS index
-        vector_store = FAISS.load_local(faiss_dir, embeddings)
+        vector_store = load_faiss_index(faiss_dir, embeddings, label="pdf", index_type="flat")
         
         # Create retriever
-        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+        retriever = make_retriever(vector_store)
         
         return retriever
     except Exception as e:
@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import shutil
+import zipfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+from blob_pool import blob_timeout
+from bm25_index import bm25_file_name
+
+# Size of each ranged GET; 4MB is the largest range Azure returns a transactional MD5 for
+BLOB_DOWNLOAD_CHUNK_SIZE = int(os.environ.get("BLOB_DOWNLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+# Number of ranges downloaded at the same time
+BLOB_DOWNLOAD_WORKERS = int(os.environ.get("BLOB_DOWNLOAD_WORKERS", "8"))
+
+# Stable directory for large downloads, so an interrupted transfer can resume after a restart
+BLOB_DOWNLOAD_DIR = os.environ.get("BLOB_DOWNLOAD_DIR", os.path.join(tempfile.gettempdir(), "medical_app_downloads"))
+
+# Seconds after which a lock file left by a crashed process is taken over
+BLOB_DOWNLOAD_LOCK_STALE_SECONDS = int(os.environ.get("BLOB_DOWNLOAD_LOCK_STALE_SECONDS", "3600"))
+
+@contextmanager
+def file_lock(lock_path, poll_seconds=0.5):
+    """
+    Hold a lock shared by all processes on the node, as a file created with O_EXCL
+
+    Workers starting together otherwise download into the same ".partial"
+    file or extract over each other.
+    """
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > BLOB_DOWNLOAD_LOCK_STALE_SECONDS:
+                    print(f"Removing stale lock {lock_path}")
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                # Released between our attempts
+                continue
+            time.sleep(poll_seconds)
+
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def _load_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return None
+
+def _save_state(state, state_path):
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, state_path)
+
+def _file_md5(file_path):
+    digest = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.digest()
+
+def download_blob_to_file(container_client, blob_name, file_path, chunk_size=None, workers=None):
+    """
+    Download a blob to a file using parallel byte-range requests
+
+    Ranges are written straight to their offset in a ".partial" file, so the
+    blob is never held in memory. Completed ranges are recorded next to it,
+    so an interrupted download resumes where it stopped as long as the blob's
+    ETag has not changed. Each range is checked against its transactional MD5,
+    and the whole file against the blob's Content-MD5 when it has one.
+
+    Args:
+        container_client: Container holding the blob
+        blob_name: Name of the blob
+        file_path: Destination file
+        chunk_size: Bytes per range (defaults to BLOB_DOWNLOAD_CHUNK_SIZE)
+        workers: Parallel range requests (defaults to BLOB_DOWNLOAD_WORKERS)
+
+    Processes on the same node download one at a time; the others wait and
+    then find the finished file.
+
+    Returns:
+        str: The destination file path
+    """
+    with file_lock(f"{file_path}.lock"):
+        return _download_blob_to_file(container_client, blob_name, file_path, chunk_size, workers)
+
+def _download_blob_to_file(container_client, blob_name, file_path, chunk_size, workers):
+    chunk_size = chunk_size or BLOB_DOWNLOAD_CHUNK_SIZE
+    workers = workers or BLOB_DOWNLOAD_WORKERS
+
+    blob_client = container_client.get_blob_client(blob_name)
+    properties = blob_client.get_blob_properties(**blob_timeout("metadata"))
+    size = properties.size
+    etag = properties.etag
+
+    partial_path = f"{file_path}.partial"
+    state_path = f"{file_path}.partial.json"
+    etag_path = f"{file_path}.etag"
+
+    # A finished download of the same blob version can be used as is
+    if os.path.exists(file_path) and os.path.exists(etag_path):
+        with open(etag_path, "r") as f:
+            if f.read() == etag:
+                print(f"{blob_name} is already downloaded (unchanged)")
+                return file_path
+
+    # Resume only if the blob and range layout are unchanged
+    state = _load_state(state_path)
+    if not state or state.get("etag") != etag or state.get("size") != size or state.get("chunk_size") != chunk_size \
+            or not os.path.exists(partial_path):
+        state = {"etag": etag, "size": size, "chunk_size": chunk_size, "done": []}
+        with open(partial_path, "wb") as f:
+            f.truncate(size)
+        _save_state(state, state_path)
+    else:
+        print(f"Resuming download of {blob_name}: {len(state['done'])} ranges already done")
+
+    done = set(state["done"])
+    ranges = [index for index in range(0, (size + chunk_size - 1) // chunk_size) if index not in done]
+    state_lock = threading.Lock()
+    start_time = time.time()
+
+    def download_range(index):
+        offset = index * chunk_size
+        length = min(chunk_size, size - offset)
+
+        # Fail rather than mix data from two versions of the blob
+        downloader = blob_client.download_blob(
+            offset=offset,
+            length=length,
+            validate_content=True,
+            etag=etag,
+            match_condition=MatchConditions.IfNotModified,
+            **blob_timeout("download")
+        )
+
+        with open(partial_path, "r+b") as f:
+            f.seek(offset)
+            for data in downloader.chunks():
+                f.write(data)
+
+        with state_lock:
+            done.add(index)
+            state["done"] = sorted(done)
+            _save_state(state, state_path)
+
+    if ranges:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # list() re-raises the first failed range
+            list(executor.map(download_range, ranges))
+
+    # Verify the whole file when the blob has a stored MD5 (single-shot uploads set one)
+    content_md5 = properties.content_settings.content_md5
+    if content_md5:
+        if _file_md5(partial_path) != bytes(content_md5):
+            os.remove(partial_path)
+            os.remove(state_path)
+            raise Exception(f"MD5 mismatch for {blob_name}, discarded the download")
+    else:
+        print(f"{blob_name} has no stored Content-MD5, relying on per-range MD5 checks")
+
+    os.replace(partial_path, file_path)
+    os.remove(state_path)
+    with open(etag_path, "w") as f:
+        f.write(etag)
+
+    elapsed = time.time() - start_time
+    print(f"Downloaded {blob_name} ({size / (1024 * 1024):.1f}MB) in {elapsed:.1f}s with {workers} parallel ranges")
+    return file_path
+
+def download_index_files(container_client, blob_prefix, folder_path, index_name="index"):
+    """
+    Download a saved index stored as loose blobs (<blob_prefix>/<index_name>.faiss and its chunks)
+
+    The chunks are fetched from the SQLite chunk store, or from the pickled
+    docstore for indexes saved before it existed. The BM25 index is fetched
+    when there is one.
+
+    Returns:
+        str: The folder holding the downloaded files
+    """
+    os.makedirs(folder_path, exist_ok=True)
+
+    def download(file_name):
+        return download_blob_to_file(container_client, f"{blob_prefix}/{file_name}", os.path.join(folder_path, file_name))
+
+    download(f"{index_name}.faiss")
+
+    try:
+        download(f"{index_name}.sqlite")
+    except ResourceNotFoundError:
+        download(f"{index_name}.pkl")
+
+    try:
+        download(bm25_file_name(index_name))
+    except ResourceNotFoundError:
+        print(f"No BM25 index stored under {blob_prefix}, searching by vector only")
+
+    return folder_path
+
+def extract_zip_once(zip_path, target_root):
+    """
+    Extract a zip downloaded by download_blob_to_file into a directory named after its ETag
+
+    Every process on the node reuses the same extracted files (so memory-mapped
+    indexes share the page cache), and a new version of the blob gets a new
+    directory. Older versions are removed once the new one is in place.
+
+    Returns:
+        str: The directory the zip was extracted into
+    """
+    with open(f"{zip_path}.etag", "r") as f:
+        version = hashlib.sha1(f.read().encode("utf-8")).hexdigest()[:16]
+
+    os.makedirs(target_root, exist_ok=True)
+    target_dir = os.path.join(target_root, f"v-{version}")
+    if os.path.isdir(target_dir):
+        return target_dir
+
+    # One process extracts while the others wait for its directory
+    with file_lock(os.path.join(target_root, ".extract.lock")):
+        return _extract_zip(zip_path, target_root, version, target_dir)
+
+def _extract_zip(zip_path, target_root, version, target_dir):
+    if os.path.isdir(target_dir):
+        return target_dir
+
+    # Extract next to the target and rename, so other processes never see a partial directory
+    staging_dir = tempfile.mkdtemp(prefix="staging-", dir=target_root)
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        zip_ref.extractall(staging_dir)
+
+    try:
+        os.rename(staging_dir, target_dir)
+    except OSError:
+        # Another process extracted the same version first
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return target_dir
+
+    # Processes still using an old version keep their open files and mappings
+    for name in os.listdir(target_root):
+        if name.startswith("v-") and name != f"v-{version}":
+            shutil.rmtree(os.path.join(target_root, name), ignore_errors=True)
+
+    return target_dir
@@ -0,0 +1,157 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient, ExponentialRetry
+
+# Connection pool size per storage host
+BLOB_POOL_SIZE = int(os.environ.get("BLOB_POOL_SIZE", "16"))
+
+# Seconds to wait for a TCP/TLS connection
+BLOB_CONNECT_TIMEOUT = int(os.environ.get("BLOB_CONNECT_TIMEOUT", "10"))
+
+# Retry policy: number of retries and exponential backoff (initial delay and growth base, in seconds)
+BLOB_RETRY_TOTAL = int(os.environ.get("BLOB_RETRY_TOTAL", "4"))
+BLOB_RETRY_INITIAL_BACKOFF = int(os.environ.get("BLOB_RETRY_INITIAL_BACKOFF", "1"))
+BLOB_RETRY_INCREMENT_BASE = int(os.environ.get("BLOB_RETRY_INCREMENT_BASE", "2"))
+
+# Read timeout in seconds for each kind of operation
+BLOB_OPERATION_TIMEOUTS = {
+    "metadata": int(os.environ.get("BLOB_METADATA_TIMEOUT", "15")),
+    "list": int(os.environ.get("BLOB_LIST_TIMEOUT", "30")),
+    "download": int(os.environ.get("BLOB_DOWNLOAD_TIMEOUT", "120")),
+    "upload": int(os.environ.get("BLOB_UPLOAD_TIMEOUT", "300")),
+    "delete": int(os.environ.get("BLOB_DELETE_TIMEOUT", "30"))
+}
+
+# Clients are shared by every thread in the process
+_service_clients = {}
+_container_clients = {}
+_existing_containers = set()
+_clients_lock = threading.Lock()
+
+# Connections opened, in total and by the current thread since its counter was reset
+_connection_stats = {"opened": 0}
+_connection_stats_lock = threading.Lock()
+_thread_stats = threading.local()
+
+def _record_connection_opened():
+    with _connection_stats_lock:
+        _connection_stats["opened"] += 1
+    _thread_stats.opened = getattr(_thread_stats, "opened", 0) + 1
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _record_connection_opened()
+        return super()._new_conn()
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _record_connection_opened()
+        return super()._new_conn()
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that keeps connections alive and counts each new one it opens"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool
+        }
+
+def _create_session():
+    """Create a keep-alive HTTP session shared by all blob clients"""
+    session = requests.Session()
+    adapter = _CountingHTTPAdapter(pool_connections=BLOB_POOL_SIZE, pool_maxsize=BLOB_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_blob_service_client(connection_string=None):
+    """
+    Get the shared BlobServiceClient for a connection string (defaults to AZURE_STORAGE_CONNECTION_STRING)
+
+    Returns:
+        BlobServiceClient: The shared client, or None if no connection string is configured
+    """
+    connection_string = connection_string or os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+    if not connection_string:
+        return None
+
+    with _clients_lock:
+        if connection_string not in _service_clients:
+            transport = RequestsTransport(
+                session=_create_session(),
+                session_owner=False,
+                connection_timeout=BLOB_CONNECT_TIMEOUT,
+                read_timeout=BLOB_OPERATION_TIMEOUTS["download"]
+            )
+            retry_policy = ExponentialRetry(
+                initial_backoff=BLOB_RETRY_INITIAL_BACKOFF,
+                increment_base=BLOB_RETRY_INCREMENT_BASE,
+                retry_total=BLOB_RETRY_TOTAL
+            )
+            _service_clients[connection_string] = BlobServiceClient.from_connection_string(
+                connection_string,
+                transport=transport,
+                retry_policy=retry_policy
+            )
+
+        return _service_clients[connection_string]
+
+def get_container_client(container_name=None, connection_string=None, create=False):
+    """
+    Get a shared container client (defaults to BLOB_CONTAINER_NAME)
+
+    Args:
+        container_name: Name of the container
+        connection_string: Storage connection string
+        create: Create the container if it does not exist (checked once per process)
+
+    Returns:
+        ContainerClient: The shared client, or None if Azure Storage is not configured
+    """
+    container_name = container_name or os.environ.get("BLOB_CONTAINER_NAME")
+    blob_service_client = get_blob_service_client(connection_string)
+
+    if not container_name or not blob_service_client:
+        return None
+
+    key = (id(blob_service_client), container_name)
+    with _clients_lock:
+        if key not in _container_clients:
+            _container_clients[key] = blob_service_client.get_container_client(container_name)
+        container_client = _container_clients[key]
+
+    # Check if container exists, if not create it
+    if create and key not in _existing_containers:
+        if not container_client.exists(**blob_timeout("metadata")):
+            print(f"Container {container_name} does not exist. Creating...")
+            container_client.create_container(**blob_timeout("metadata"))
+        _existing_containers.add(key)
+
+    return container_client
+
+def blob_timeout(operation):
+    """Keyword arguments setting the read timeout for a kind of blob operation"""
+    return {"read_timeout": BLOB_OPERATION_TIMEOUTS[operation]}
+
+def reset_thread_connection_count():
+    """Start counting connections opened by the current thread (e.g. at the start of a request)"""
+    _thread_stats.opened = 0
+
+def get_thread_connection_count():
+    """Get the number of connections opened by the current thread since its counter was reset"""
+    return getattr(_thread_stats, "opened", 0)
+
+def get_connection_stats():
+    """Get process-wide connection statistics"""
+    with _connection_stats_lock:
+        return {
+            "connections_opened": _connection_stats["opened"],
+            "service_clients": len(_service_clients),
+            "container_clients": len(_container_clients)
+        }
@@ -0,0 +1,234 @@
+import os
+import re
+import math
+from collections import Counter
+import numpy as np
+
+# Build a BM25 index next to every saved FAISS index ("0" to skip)
+BM25_INDEX_ENABLED = os.environ.get("BM25_INDEX_ENABLED", "1") == "1"
+
+# BM25 term frequency saturation and length normalisation
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Words, numbers and dotted or hyphenated codes, so "2.5mg", "N83.2" and "co-trimoxazole" stay whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+# Longer tokens are almost always extraction noise, and would widen every entry of the term array
+_MAX_TOKEN_LENGTH = 32
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it of on or should that the this to was what when "
+    "which who why with".split()
+)
+
+def tokenize(text):
+    """Lowercase a text and split it into index terms"""
+    return [
+        token for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) <= _MAX_TOKEN_LENGTH and token not in _STOPWORDS
+    ]
+
+def bm25_file_name(index_name="index"):
+    return f"{index_name}.bm25.npz"
+
+class BM25Index:
+    """
+    BM25 inverted index over the chunks of one FAISS index, with array-backed postings
+
+    Document IDs are the FAISS vector IDs. Terms are kept UTF-8 encoded in one
+    sorted fixed-width array and looked up by binary search; each term's postings are a slice of a
+    shared document ID array and term frequency array, found through an
+    offsets array. No per-term Python objects are held.
+    """
+
+    def __init__(self, terms, offsets, doc_ids, term_freqs, doc_lengths):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.doc_count = len(doc_lengths)
+
+        # The length part of the BM25 denominator, precomputed per document
+        average_length = float(doc_lengths.mean()) if self.doc_count else 1.0
+        self._length_norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(average_length, 1.0))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts):
+        """Build an index over texts; the i-th text gets document ID i"""
+        term_ids = {}
+        posting_docs = []
+        posting_freqs = []
+        doc_lengths = []
+
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                term_id = term_ids.setdefault(term, len(term_ids))
+                if term_id == len(posting_docs):
+                    posting_docs.append([])
+                    posting_freqs.append([])
+                posting_docs[term_id].append(doc_id)
+                posting_freqs[term_id].append(count)
+
+        terms = sorted(term_ids)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids = []
+        term_freqs = []
+        for position, term in enumerate(terms):
+            term_id = term_ids[term]
+            doc_ids.extend(posting_docs[term_id])
+            term_freqs.extend(posting_freqs[term_id])
+            offsets[position + 1] = len(doc_ids)
+
+        return cls(
+            np.array([term.encode("utf-8") for term in terms], dtype=bytes),
+            offsets,
+            np.array(doc_ids, dtype=np.uint32),
+            np.minimum(np.array(term_freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            np.array(doc_lengths, dtype=np.uint32)
+        )
+
+    @classmethod
+    def _from_postings(cls, terms, posting_terms, doc_ids, term_freqs, doc_lengths):
+        """
+        Assemble an index from postings given as parallel arrays
+
+        posting_terms holds each posting's position in terms; postings of one
+        term must already be in doc ID order. Terms without postings are dropped.
+        """
+        order = np.argsort(posting_terms, kind="stable")
+        counts = np.bincount(posting_terms, minlength=len(terms))
+        kept = counts > 0
+        offsets = np.zeros(int(kept.sum()) + 1, dtype=np.int64)
+        np.cumsum(counts[kept], out=offsets[1:])
+
+        return cls(
+            terms[kept],
+            offsets,
+            doc_ids[order].astype(np.uint32),
+            term_freqs[order],
+            doc_lengths.astype(np.uint32)
+        )
+
+    def _posting_terms(self):
+        """Position in self.terms of the term each posting belongs to"""
+        return np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+
+    def appended(self, texts):
+        """
+        Get a copy of the index with texts added as the next document IDs
+
+        Only the new texts are tokenized; their postings are merged into the
+        existing arrays.
+        """
+        added = BM25Index.build(texts)
+        terms = np.union1d(self.terms, added.terms)
+
+        return BM25Index._from_postings(
+            terms,
+            np.concatenate([
+                np.searchsorted(terms, self.terms)[self._posting_terms()],
+                np.searchsorted(terms, added.terms)[added._posting_terms()]
+            ]),
+            np.concatenate([self.doc_ids.astype(np.int64), added.doc_ids.astype(np.int64) + self.doc_count]),
+            np.concatenate([self.term_freqs, added.term_freqs]),
+            np.concatenate([self.doc_lengths, added.doc_lengths])
+        )
+
+    def without(self, doc_ids):
+        """
+        Get a copy of the index with documents removed and later document IDs shifted down
+
+        Matches removing the same vector IDs from a flat FAISS index.
+        """
+        removed = np.unique(np.asarray(doc_ids, dtype=np.int64))
+        kept = ~np.isin(self.doc_ids, removed)
+        remaining_ids = self.doc_ids[kept].astype(np.int64)
+
+        return BM25Index._from_postings(
+            self.terms,
+            self._posting_terms()[kept],
+            remaining_ids - np.searchsorted(removed, remaining_ids),
+            self.term_freqs[kept],
+            np.delete(self.doc_lengths, removed)
+        )
+
+    def _postings(self, term):
+        term = term.encode("utf-8")
+        position = int(np.searchsorted(self.terms, term))
+        if position >= len(self.terms) or self.terms[position] != term:
+            return None
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.doc_ids[start:end], self.term_freqs[start:end]
+
+    def search(self, query, k=20):
+        """
+        Score documents against a query with BM25
+
+        Returns:
+            list: (doc_id, score) pairs, best first, for documents matching at least one term
+        """
+        if not self.doc_count:
+            return []
+
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            doc_ids, term_freqs = postings
+            doc_freq = len(doc_ids)
+            idf = math.log(1 + (self.doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            freqs = term_freqs.astype(np.float32)
+            scores[doc_ids] += idf * freqs * (BM25_K1 + 1) / (freqs + self._length_norm[doc_ids])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in matched]
+
+    def document_frequency(self, term):
+        postings = self._postings(term)
+        return 0 if postings is None else len(postings[0])
+
+    def memory_bytes(self):
+        """Bytes held by the index arrays"""
+        return sum(array.nbytes for array in (self.terms, self.offsets, self.doc_ids, self.term_freqs, self.doc_lengths, self._length_norm))
+
+    def save(self, path):
+        """Write the index arrays to a .npz file, renamed into place once complete"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=self.terms,
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs,
+                doc_lengths=self.doc_lengths
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["terms"], data["offsets"], data["doc_ids"], data["term_freqs"], data["doc_lengths"])
+
+def write_bm25_index(folder_path, texts, index_name="index"):
+    """Build a BM25 index over texts in vector ID order and save it next to the FAISS index"""
+    if not BM25_INDEX_ENABLED:
+        return None
+    index = BM25Index.build(texts)
+    index.save(os.path.join(folder_path, bm25_file_name(index_name)))
+    return index
+
+def load_bm25_index(folder_path, index_name="index"):
+    """Load the BM25 index saved next to a FAISS index, or None if there is none"""
+    path = os.path.join(folder_path, bm25_file_name(index_name))
+    if not os.path.exists(path):
+        return None
+    return BM25Index.load(path)
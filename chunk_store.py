@@ -0,0 +1,329 @@
+import os
+import sys
+import glob
+import json
+import time
+import pickle
+import sqlite3
+import threading
+from collections.abc import Mapping
+import faiss
+from langchain.docstore.base import Docstore
+from langchain.docstore.document import Document
+from vector_encoding import encode_vector_store
+from bm25_index import write_bm25_index
+from index_versions import resolve_index_dir
+
+# How new indexes store their chunks: "sqlite" (index.sqlite) or "pickle" (langchain's index.pkl)
+CHUNK_STORE_FORMAT = os.environ.get("CHUNK_STORE_FORMAT", "sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id INTEGER PRIMARY KEY,
+    docstore_id TEXT NOT NULL UNIQUE,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+)
+"""
+
+class _SqliteConnection:
+    """
+    One read-only SQLite connection to a chunk store, shared by all threads
+
+    The connection is opened when the store is, so a loaded index keeps reading
+    the file it was loaded from even if its directory is later removed or
+    replaced (cache eviction, temporary downloads, corpus publishes).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def fetchone(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchone()
+
+    def fetchall(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+class SqliteDocstore(Docstore):
+    """
+    Chunk store backed by SQLite, fetching chunk text only for the documents asked for
+
+    Replaces the pickled InMemoryDocstore: nothing is unpickled at load time and
+    no chunk text is held in memory between queries.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def search(self, search):
+        """Get a Document by its docstore ID (the interface FAISS uses for each hit)"""
+        row = self._connection.fetchone(
+            "SELECT page_content, metadata FROM chunks WHERE docstore_id = ?",
+            (search,)
+        )
+
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+class SqliteIdMap(Mapping):
+    """Read-only mapping from FAISS vector ID to docstore ID, backed by the chunk store"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getitem__(self, vector_id):
+        row = self._connection.fetchone(
+            "SELECT docstore_id FROM chunks WHERE vector_id = ?",
+            (int(vector_id),)
+        )
+
+        if row is None:
+            raise KeyError(vector_id)
+        return row[0]
+
+    def __iter__(self):
+        for (vector_id,) in self._connection.fetchall("SELECT vector_id FROM chunks ORDER BY vector_id"):
+            yield vector_id
+
+    def __len__(self):
+        return self._connection.fetchone("SELECT COUNT(*) FROM chunks")[0]
+
+def open_chunk_store(sqlite_path):
+    """
+    Open a chunk store written by write_chunk_store
+
+    Returns:
+        tuple: (docstore, index_to_docstore_id) in the form FAISS expects
+    """
+    connection = _SqliteConnection(sqlite_path)
+    return SqliteDocstore(connection), SqliteIdMap(connection)
+
+def write_chunk_store(sqlite_path, docstore, index_to_docstore_id):
+    """
+    Write a docstore and its vector ID mapping to a SQLite chunk store
+
+    The file is written next to its final path and renamed into place.
+    """
+    temp_path = f"{sqlite_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.execute(_SCHEMA)
+
+        rows = []
+        for vector_id, docstore_id in index_to_docstore_id.items():
+            doc = docstore.search(docstore_id)
+            if not isinstance(doc, Document):
+                raise Exception(f"Docstore has no document for {docstore_id}")
+            rows.append((int(vector_id), docstore_id, doc.page_content, json.dumps(doc.metadata, default=str)))
+
+        connection.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(temp_path, sqlite_path)
+
+def append_chunks(sqlite_path, first_vector_id, docstore_ids, documents):
+    """Add documents to a chunk store (created if missing) under consecutive vector IDs from first_vector_id"""
+    connection = sqlite3.connect(sqlite_path)
+    try:
+        connection.execute(_SCHEMA)
+        connection.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            [
+                (first_vector_id + offset, docstore_id, doc.page_content, json.dumps(doc.metadata, default=str))
+                for offset, (docstore_id, doc) in enumerate(zip(docstore_ids, documents))
+            ]
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+def delete_chunks(sqlite_path, vector_ids):
+    """
+    Delete chunks from a chunk store and renumber the rest to match the FAISS index
+
+    Removing vectors from a flat index shifts the later ones down, keeping
+    their order; the remaining vector IDs are shifted the same way.
+    """
+    connection = sqlite3.connect(sqlite_path)
+    try:
+        connection.execute("CREATE TEMP TABLE removed (vector_id INTEGER PRIMARY KEY)")
+        connection.executemany("INSERT INTO removed VALUES (?)", [(int(vector_id),) for vector_id in vector_ids])
+        connection.execute("DELETE FROM chunks WHERE vector_id IN (SELECT vector_id FROM removed)")
+
+        # Renumber through negative IDs so no intermediate value collides with an existing row
+        connection.execute(
+            """UPDATE chunks SET vector_id = -1 - (vector_id - (
+                SELECT COUNT(*) FROM removed WHERE removed.vector_id < chunks.vector_id
+            ))"""
+        )
+        connection.execute("UPDATE chunks SET vector_id = -1 - vector_id")
+        connection.commit()
+    finally:
+        connection.close()
+
+def iter_chunk_keys(sqlite_path):
+    """Yield (vector_id, docstore_id, metadata) for every chunk, without reading chunk text"""
+    connection = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+    try:
+        for vector_id, docstore_id, metadata in connection.execute(
+            "SELECT vector_id, docstore_id, metadata FROM chunks ORDER BY vector_id"
+        ):
+            yield vector_id, docstore_id, json.loads(metadata)
+    finally:
+        connection.close()
+
+def iter_chunk_texts(sqlite_path):
+    """Yield the text of every chunk in vector ID order"""
+    connection = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+    try:
+        for (page_content,) in connection.execute("SELECT page_content FROM chunks ORDER BY vector_id"):
+            yield page_content
+    finally:
+        connection.close()
+
+def save_faiss_index(vector_store, folder_path, index_name="index"):
+    """
+    Save a FAISS vector store, storing its chunks in the configured format (CHUNK_STORE_FORMAT)
+
+    With "sqlite" the folder holds <index_name>.faiss and <index_name>.sqlite;
+    with "pickle" it is exactly what FAISS.save_local writes. Vectors are
+    stored in the configured encoding (VECTOR_ENCODING); the store's own index
+    is replaced by the encoded one, so it uses the same memory as a reloaded copy.
+    A BM25 index of the chunks is written alongside and attached to the store
+    as vector_store.bm25_index, as load_faiss_index does.
+    """
+    encode_vector_store(vector_store)
+
+    if CHUNK_STORE_FORMAT != "sqlite":
+        vector_store.save_local(folder_path, index_name)
+    else:
+        os.makedirs(folder_path, exist_ok=True)
+        faiss.write_index(vector_store.index, os.path.join(folder_path, f"{index_name}.faiss"))
+        write_chunk_store(
+            os.path.join(folder_path, f"{index_name}.sqlite"),
+            vector_store.docstore,
+            vector_store.index_to_docstore_id
+        )
+
+    texts = (
+        vector_store.docstore.search(vector_store.index_to_docstore_id[vector_id]).page_content
+        for vector_id in range(vector_store.index.ntotal)
+    )
+    vector_store.bm25_index = write_bm25_index(folder_path, texts, index_name)
+
+def convert_index_dir(folder_path, index_name="index", remove_pickle=False):
+    """
+    Convert a saved index's pickled docstore to a SQLite chunk store
+
+    Returns:
+        bool: True if the folder was converted, False if there was nothing to convert
+    """
+    folder_path = resolve_index_dir(folder_path)
+    pkl_path = os.path.join(folder_path, f"{index_name}.pkl")
+    sqlite_path = os.path.join(folder_path, f"{index_name}.sqlite")
+
+    if not os.path.exists(pkl_path):
+        return False
+
+    if not os.path.exists(sqlite_path):
+        with open(pkl_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        write_chunk_store(sqlite_path, docstore, index_to_docstore_id)
+        print(f"Converted {folder_path}: {len(index_to_docstore_id)} chunks")
+
+    if remove_pickle:
+        os.remove(pkl_path)
+
+    return True
+
+def find_index_dirs(root="."):
+    """Find the main corpus index and the per-PDF indexes under user_uploads"""
+    candidates = [os.path.join(root, "faiss_index")] + glob.glob(os.path.join(root, "user_uploads", "*", "faiss_index"))
+    return [resolve_index_dir(path) for path in candidates if os.path.isdir(path)]
+
+def benchmark(folder_path, index_name="index", queries=200):
+    """Compare load time, memory and per-hit fetch time of the pickled and SQLite docstores"""
+    from faiss_loader import get_rss_bytes
+
+    folder_path = resolve_index_dir(folder_path)
+    pkl_path = os.path.join(folder_path, f"{index_name}.pkl")
+    sqlite_path = os.path.join(folder_path, f"{index_name}.sqlite")
+    convert_index_dir(folder_path, index_name)
+
+    rss_before = get_rss_bytes()
+    start_time = time.time()
+    with open(pkl_path, "rb") as f:
+        pickled_docstore, pickled_ids = pickle.load(f)
+    pickle_seconds = time.time() - start_time
+    pickle_rss = get_rss_bytes() - rss_before
+
+    rss_before = get_rss_bytes()
+    start_time = time.time()
+    sqlite_docstore, sqlite_ids = open_chunk_store(sqlite_path)
+    sqlite_seconds = time.time() - start_time
+    sqlite_rss = get_rss_bytes() - rss_before
+
+    # Fetch as many hits as a few hundred top-5 queries would
+    vector_ids = list(range(0, len(pickled_ids), max(1, len(pickled_ids) // (queries * 5))))[:queries * 5]
+    start_time = time.time()
+    for vector_id in vector_ids:
+        sqlite_docstore.search(sqlite_ids[vector_id])
+    fetch_ms = (time.time() - start_time) * 1000 / max(1, len(vector_ids))
+
+    identical = all(
+        pickled_docstore.search(pickled_ids[vector_id]).page_content == sqlite_docstore.search(sqlite_ids[vector_id]).page_content
+        for vector_id in vector_ids
+    )
+
+    print(f"Chunk store benchmark for {folder_path} ({len(pickled_ids)} chunks)")
+    print(f"  pickle: load {pickle_seconds:.3f}s, RSS +{pickle_rss / (1024 * 1024):.1f}MB, file {os.path.getsize(pkl_path) / (1024 * 1024):.1f}MB")
+    print(f"  sqlite: open {sqlite_seconds:.3f}s, RSS +{sqlite_rss / (1024 * 1024):.1f}MB, file {os.path.getsize(sqlite_path) / (1024 * 1024):.1f}MB")
+    print(f"  sqlite fetch: {fetch_ms:.3f}ms per hit, identical text: {'Yes' if identical else 'No'}")
+
+    return {
+        "chunks": len(pickled_ids),
+        "pickle_load_seconds": round(pickle_seconds, 3),
+        "pickle_rss_bytes": pickle_rss,
+        "sqlite_open_seconds": round(sqlite_seconds, 3),
+        "sqlite_rss_bytes": sqlite_rss,
+        "sqlite_fetch_ms": round(fetch_ms, 3),
+        "identical": identical
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("convert", "convert-all", "benchmark"):
+        print("Usage: python chunk_store.py <command> [args]")
+        print("Commands:")
+        print("  convert <faiss_index_dir> [--remove-pkl] - Convert one index's docstore to SQLite")
+        print("  convert-all [--remove-pkl] - Convert faiss_index and every index under user_uploads")
+        print("  benchmark <faiss_index_dir> - Compare the pickled and SQLite docstores")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    remove_pickle = "--remove-pkl" in sys.argv
+
+    if command == "convert" and len(sys.argv) >= 3:
+        if not convert_index_dir(sys.argv[2], remove_pickle=remove_pickle):
+            print(f"No index.pkl found in {sys.argv[2]}")
+
+    elif command == "convert-all":
+        folders = find_index_dirs()
+        converted = sum(1 for folder in folders if convert_index_dir(folder, remove_pickle=remove_pickle))
+        print(f"Converted {converted} of {len(folders)} indexes")
+
+    elif command == "benchmark" and len(sys.argv) >= 3:
+        benchmark(sys.argv[2])
+
+    else:
+        print("Invalid command or missing arguments")
+        sys.exit(1)
@@ -0,0 +1,12 @@
+import hashlib
+
+# Read files in 1MB blocks so large PDFs are never held in memory
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def compute_file_hash(file_path):
+    """Compute the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,384 @@
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import faiss
+from langchain.docstore.document import Document
+from langchain.docstore.in_memory import InMemoryDocstore
+from content_hash import compute_file_hash
+from pdf_extract import load_pdf_pages, init_worker_process
+from embedding_service import EMBEDDING_MODEL_NAME
+from chunk_store import CHUNK_STORE_FORMAT, append_chunks
+from vector_encoding import VECTOR_ENCODING, build_encoded_index
+from bm25_index import write_bm25_index
+from corpus_index import CORPUS_INDEX_DIR, book_name, chunk_pages, embed_chunks
+from index_versions import VERSION_FILE, resolve_index_dir, read_version, staging_dir, publish_version
+
+# Directory of books the corpus index is built from
+CORPUS_BOOKS_DIR = os.environ.get("CORPUS_BOOKS_DIR", "Gynec_books")
+
+# Extracted page text and chunk embeddings of each book, keyed by the book's content hash
+CORPUS_BUILD_CACHE_DIR = os.environ.get("CORPUS_BUILD_CACHE_DIR", ".corpus_build_cache")
+
+# Shard builder processes that extract and embed books in parallel (1 builds in this process)
+CORPUS_BUILD_SHARDS = int(os.environ.get("CORPUS_BUILD_SHARDS", "1"))
+
+# Chunk embeddings are reused only while the model and chunking are unchanged
+EMBEDDING_CACHE_KEY = f"{EMBEDDING_MODEL_NAME}|chunk_size=1000|chunk_overlap=200"
+
+def find_books(books_dir=CORPUS_BOOKS_DIR):
+    """Find the PDFs under a directory, in a stable order"""
+    paths = []
+    for root, _, files in os.walk(books_dir):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+    return sorted(paths, key=lambda path: (book_name(path), path))
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(manifest, manifest_path):
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+def fingerprint_books(pdf_paths, cache_dir=CORPUS_BUILD_CACHE_DIR):
+    """
+    Get the content hash of each book
+
+    Hashes are remembered with the file's size and modification time, so an
+    unchanged file is not read again.
+
+    Returns:
+        dict: Content hash by path
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, "fingerprints.json")
+    manifest = _load_manifest(manifest_path)
+
+    hashes = {}
+    updated = {}
+    for pdf_path in pdf_paths:
+        stat = os.stat(pdf_path)
+        key = os.path.abspath(pdf_path)
+        entry = manifest.get(key)
+        if not entry or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": compute_file_hash(pdf_path)}
+        updated[key] = entry
+        hashes[pdf_path] = entry["hash"]
+
+    _save_manifest(updated, manifest_path)
+    return hashes
+
+def _write_atomic(path, write):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+
+def load_book(pdf_path, content_hash, cache_dir=CORPUS_BUILD_CACHE_DIR):
+    """
+    Get a book's chunks and their embeddings, extracting and embedding only what is not cached
+
+    Returns:
+        tuple: (chunks, vectors, {"extracted": bool, "embedded": bool})
+    """
+    entry_dir = os.path.join(cache_dir, content_hash)
+    os.makedirs(entry_dir, exist_ok=True)
+    work = {"extracted": False, "embedded": False}
+
+    pages_path = os.path.join(entry_dir, "pages.json")
+    if os.path.exists(pages_path):
+        with open(pages_path, "r") as f:
+            texts = json.load(f)
+        # Same content and metadata as pdf_extract produces
+        documents = [Document(page_content=text, metadata={"source": pdf_path, "page": page}) for page, text in enumerate(texts)]
+    else:
+        documents = load_pdf_pages(pdf_path)
+        texts = [doc.page_content for doc in documents]
+        _write_atomic(pages_path, lambda f: f.write(json.dumps(texts).encode("utf-8")))
+        work["extracted"] = True
+
+    chunks = chunk_pages(documents, book_name(pdf_path))
+
+    vectors_path = os.path.join(entry_dir, "embeddings.npy")
+    info_path = os.path.join(entry_dir, "embeddings.json")
+    info = _load_manifest(info_path)
+    if info.get("key") == EMBEDDING_CACHE_KEY and info.get("count") == len(chunks) and os.path.exists(vectors_path):
+        vectors = np.load(vectors_path)
+    else:
+        vectors = embed_chunks(chunks)
+        _write_atomic(vectors_path, lambda f: np.save(f, vectors))
+        _save_manifest({"key": EMBEDDING_CACHE_KEY, "count": len(chunks)}, info_path)
+        work["embedded"] = True
+
+    return chunks, vectors, work
+
+def _is_cached(content_hash, cache_dir):
+    """Check whether a book's page text and embeddings for the current model are cached"""
+    entry_dir = os.path.join(cache_dir, content_hash)
+    info = _load_manifest(os.path.join(entry_dir, "embeddings.json"))
+    return (
+        info.get("key") == EMBEDDING_CACHE_KEY
+        and os.path.exists(os.path.join(entry_dir, "pages.json"))
+        and os.path.exists(os.path.join(entry_dir, "embeddings.npy"))
+    )
+
+def assign_shards(pdf_paths, shard_count):
+    """
+    Split books into at most shard_count disjoint shards of similar total size
+
+    Largest books are assigned first, each to the currently smallest shard;
+    the assignment only depends on the paths and file sizes.
+
+    Returns:
+        list: One list of paths per non-empty shard
+    """
+    shards = [[] for _ in range(shard_count)]
+    sizes = [0] * shard_count
+    for pdf_path in sorted(pdf_paths, key=lambda path: (-os.path.getsize(path), path)):
+        shard = sizes.index(min(sizes))
+        shards[shard].append(pdf_path)
+        sizes[shard] += os.path.getsize(pdf_path)
+    return [shard for shard in shards if shard]
+
+def _build_shard(shard_number, books, cache_dir):
+    """Extract and embed a shard's books into the build cache (runs in a shard process)"""
+    start_time = time.time()
+    result = {"shard": shard_number, "books": len(books), "chunks": 0, "extracted": 0, "embedded": 0}
+
+    for pdf_path, content_hash in books:
+        chunks, _, work = load_book(pdf_path, content_hash, cache_dir)
+        result["chunks"] += len(chunks)
+        result["extracted"] += work["extracted"]
+        result["embedded"] += work["embedded"]
+
+    result["seconds"] = round(time.time() - start_time, 1)
+    return result
+
+def build_shards(pdf_paths, hashes, cache_dir=CORPUS_BUILD_CACHE_DIR, shard_count=None):
+    """
+    Extract and embed books in parallel shard processes, filling the build cache
+
+    Each shard handles a disjoint set of books in its own process. Shards only
+    write cache entries, so a failed shard loses none of the books the others
+    finished and a rerun picks up where it stopped.
+
+    Returns:
+        list: Books, chunks and wall time of each shard
+    """
+    shard_books = assign_shards(pdf_paths, shard_count or CORPUS_BUILD_SHARDS)
+
+    # Split the CPU between shards so their embedding threads do not oversubscribe it
+    embedding_threads = max(1, (os.cpu_count() or 1) // len(shard_books))
+
+    with ProcessPoolExecutor(
+        max_workers=len(shard_books),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker_process,
+        initargs=(embedding_threads,)
+    ) as executor:
+        futures = [
+            executor.submit(_build_shard, shard_number, [(pdf_path, hashes[pdf_path]) for pdf_path in books], cache_dir)
+            for shard_number, books in enumerate(shard_books)
+        ]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        print(f"  shard {result['shard']}: {result['books']} books, {result['chunks']} chunks in {result['seconds']}s")
+    return results
+
+def write_index_dir(folder_path, chunks, vectors, index_name="index"):
+    """Write chunks and their vectors as an index directory load_faiss_index can open"""
+    os.makedirs(folder_path, exist_ok=True)
+
+    index = build_encoded_index(np.ascontiguousarray(vectors, dtype=np.float32), VECTOR_ENCODING)
+    faiss.write_index(index, os.path.join(folder_path, f"{index_name}.faiss"))
+
+    docstore_ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+    if CHUNK_STORE_FORMAT == "sqlite":
+        append_chunks(os.path.join(folder_path, f"{index_name}.sqlite"), 0, docstore_ids, chunks)
+    else:
+        # Same layout FAISS.save_local writes
+        with open(os.path.join(folder_path, f"{index_name}.pkl"), "wb") as f:
+            pickle.dump((InMemoryDocstore(dict(zip(docstore_ids, chunks))), dict(enumerate(docstore_ids))), f)
+
+    write_bm25_index(folder_path, (chunk.page_content for chunk in chunks), index_name)
+
+def write_corpus_zip(index_dir, zip_path):
+    """Zip an index directory's current version as faiss_index/..., the layout load_faiss_from_blob extracts"""
+    index_dir = resolve_index_dir(index_dir)
+    temp_path = f"{zip_path}.tmp"
+    with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(os.listdir(index_dir)):
+            archive.write(os.path.join(index_dir, name), f"faiss_index/{name}")
+    os.replace(temp_path, zip_path)
+    print(f"Wrote {zip_path} ({os.path.getsize(zip_path) / (1024 * 1024):.1f}MB)")
+
+def _build_record(hashes):
+    return {
+        "books": {book_name(pdf_path): content_hash for pdf_path, content_hash in hashes.items()},
+        "embedding": EMBEDDING_CACHE_KEY,
+        "vector_encoding": VECTOR_ENCODING,
+        "chunk_store": CHUNK_STORE_FORMAT
+    }
+
+def _prune_cache(cache_dir, hashes):
+    """Delete cache entries of books no longer in the corpus"""
+    keep = set(hashes.values())
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path) and name not in keep:
+            shutil.rmtree(path)
+
+def build_corpus(books_dir=CORPUS_BOOKS_DIR, index_dir=CORPUS_INDEX_DIR, cache_dir=CORPUS_BUILD_CACHE_DIR, zip_path=None, force=False, shards=None):
+    """
+    Build the corpus index from a books directory, re-processing only books whose content changed
+
+    Every book is fingerprinted by content hash. Page text and chunk
+    embeddings are cached per hash, so only new or changed books are
+    extracted and embedded, split across shard processes when shards > 1.
+    The index is then merged from the cache in book order and published as a
+    new version of index_dir, so vector IDs do not depend on the number of
+    shards. When nothing changed since the last build, nothing is written.
+
+    Books added with corpus_index but not present in books_dir are not kept.
+
+    Args:
+        books_dir: Directory of PDFs
+        index_dir: Corpus index directory
+        cache_dir: Build cache directory
+        zip_path: Also write the index as this zip (e.g. faiss_index.zip for upload)
+        force: Reassemble the index even if nothing changed
+        shards: Shard processes for new and changed books (defaults to CORPUS_BUILD_SHARDS)
+
+    Returns:
+        dict: Books, chunks, books extracted and embedded, per-shard results and the time taken
+    """
+    start_time = time.time()
+    pdf_paths = find_books(books_dir)
+    if not pdf_paths:
+        raise Exception(f"No PDFs found in {books_dir}")
+
+    names = [book_name(pdf_path) for pdf_path in pdf_paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise Exception(f"Book file names must be unique, found duplicates: {', '.join(duplicates)}")
+
+    hashes = fingerprint_books(pdf_paths, cache_dir)
+    record = _build_record(hashes)
+    result = {"books": len(pdf_paths), "extracted": 0, "embedded": 0, "built": False}
+
+    current = read_version(index_dir)
+    if not force and os.path.isdir(index_dir) and current.get("build") == record:
+        result["chunks"] = current.get("vectors", 0)
+        print(f"Corpus index {index_dir} is up to date ({len(pdf_paths)} books)")
+    else:
+        shards = shards or CORPUS_BUILD_SHARDS
+        # One path per uncached content hash, so no two shards write the same cache entry
+        pending = list({
+            hashes[pdf_path]: pdf_path for pdf_path in reversed(pdf_paths) if not _is_cached(hashes[pdf_path], cache_dir)
+        }.values())
+        if shards > 1 and len(pending) > 1:
+            shard_start = time.time()
+            result["shards"] = build_shards(pending, hashes, cache_dir, shards)
+            result["shard_seconds"] = round(time.time() - shard_start, 1)
+            result["extracted"] = sum(shard["extracted"] for shard in result["shards"])
+            result["embedded"] = sum(shard["embedded"] for shard in result["shards"])
+
+        # Merge in book order; any book the shards did not cover is processed here
+        merge_start = time.time()
+        all_chunks = []
+        all_vectors = []
+        for pdf_path in pdf_paths:
+            chunks, vectors, work = load_book(pdf_path, hashes[pdf_path], cache_dir)
+            all_chunks.extend(chunks)
+            all_vectors.append(vectors)
+            result["extracted"] += work["extracted"]
+            result["embedded"] += work["embedded"]
+            print(
+                f"  {book_name(pdf_path)}: {len(chunks)} chunks"
+                f"{' (extracted)' if work['extracted'] else ''}{' (embedded)' if work['embedded'] else ''}"
+            )
+
+        if not all_chunks:
+            raise Exception(f"No text could be extracted from the PDFs in {books_dir}")
+
+        staged_path, version = staging_dir(index_dir)
+        try:
+            write_index_dir(staged_path, all_chunks, np.concatenate(all_vectors))
+            publish_version(index_dir, staged_path, {"version": version, "vectors": len(all_chunks), "build": record})
+        except Exception:
+            shutil.rmtree(staged_path, ignore_errors=True)
+            raise
+
+        _prune_cache(cache_dir, hashes)
+        result["merge_seconds"] = round(time.time() - merge_start, 1)
+        result["chunks"] = len(all_chunks)
+        result["built"] = True
+
+    if zip_path and (result["built"] or not os.path.exists(zip_path)
+                     or os.path.getmtime(zip_path) < os.path.getmtime(os.path.join(resolve_index_dir(index_dir), VERSION_FILE))):
+        write_corpus_zip(index_dir, zip_path)
+
+    result["seconds"] = round(time.time() - start_time, 1)
+    timing = ""
+    if "shards" in result:
+        timing = f" ({len(result['shards'])} shards {result['shard_seconds']}s, merge {result['merge_seconds']}s)"
+    print(
+        f"Corpus build: {result['books']} books, {result['chunks']} chunks, "
+        f"{result['extracted']} extracted, {result['embedded']} embedded, in {result['seconds']}s{timing}"
+    )
+    return result
+
+def corpus_status(books_dir=CORPUS_BOOKS_DIR, index_dir=CORPUS_INDEX_DIR, cache_dir=CORPUS_BUILD_CACHE_DIR):
+    """Compare the books directory with the last build: new, changed, unchanged and removed books"""
+    hashes = fingerprint_books(find_books(books_dir), cache_dir)
+    built_books = read_version(index_dir).get("build", {}).get("books", {})
+
+    status = {}
+    for pdf_path, content_hash in hashes.items():
+        name = book_name(pdf_path)
+        if name not in built_books:
+            status[name] = "new"
+        elif built_books[name] != content_hash:
+            status[name] = "changed"
+        else:
+            status[name] = "unchanged"
+    for name in built_books:
+        status.setdefault(name, "removed")
+    return status
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("build", "status"):
+        print("Usage: python corpus_builder.py <command> [books_dir] [options]")
+        print("Commands:")
+        print(f"  build [books_dir] [--zip] [--force] [--shards=N] - Build {CORPUS_INDEX_DIR} from {CORPUS_BOOKS_DIR} (--zip also writes faiss_index.zip)")
+        print("  status [books_dir] - Show which books changed since the last build")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    args = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
+    books_dir = args[0] if args else CORPUS_BOOKS_DIR
+
+    if command == "build":
+        build_corpus(
+            books_dir,
+            zip_path="faiss_index.zip" if "--zip" in sys.argv else None,
+            force="--force" in sys.argv,
+            shards=next((int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--shards=")), None)
+        )
+
+    elif command == "status":
+        for name, state in sorted(corpus_status(books_dir).items()):
+            print(f"  {state:10s} {name}")
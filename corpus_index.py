@@ -0,0 +1,347 @@
+import os
+import sys
+import time
+import struct
+import pickle
+import shutil
+import numpy as np
+import faiss
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pdf_extract import load_pdf_pages
+from embedding_engine import get_engine
+from chunk_store import CHUNK_STORE_FORMAT, append_chunks, delete_chunks, iter_chunk_keys, iter_chunk_texts
+from bm25_index import BM25Index, write_bm25_index
+from vector_encoding import VECTOR_ENCODING, build_encoded_index, append_to_index_file
+from ann_index import INDEX_TYPES, variant_file_name
+from index_versions import VERSION_FILE, resolve_index_dir, read_version, staging_dir, publish_version, clone_file
+import index_versions
+
+# Main corpus index maintained by this module (the directory load_faiss_local reads)
+CORPUS_INDEX_DIR = os.environ.get("CORPUS_INDEX_DIR", "faiss_index")
+
+def book_name(pdf_path):
+    """Name a book is indexed under: its file name"""
+    return os.path.basename(pdf_path)
+
+def chunk_id(book, position):
+    """Stable docstore ID of a book's chunk; the same book split the same way gets the same IDs"""
+    return f"{book}#{position}"
+
+def split_book(pdf_path):
+    """
+    Extract and chunk a book the same way uploaded PDFs are chunked
+
+    Returns:
+        list: Documents with "book" and "chunk_id" in their metadata
+    """
+    return chunk_pages(load_pdf_pages(pdf_path), book_name(pdf_path))
+
+def chunk_pages(documents, name):
+    """Split a book's page Documents into chunks with stable IDs"""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200
+    )
+    chunks = text_splitter.split_documents(documents)
+
+    for position, chunk in enumerate(chunks):
+        chunk.metadata["book"] = name
+        chunk.metadata["chunk_id"] = chunk_id(name, position)
+    return chunks
+
+def embed_chunks(chunks):
+    """Embed chunks with the batched ingestion engine"""
+    vectors = get_engine().embed_documents([chunk.page_content for chunk in chunks])
+    return np.array(vectors, dtype=np.float32).reshape(len(chunks), -1)
+
+def _chunk_book(metadata):
+    # Chunks indexed before books were tracked only carry PyPDFLoader's source path
+    return metadata.get("book") or os.path.basename(metadata.get("source", ""))
+
+class _StagedIndex:
+    """
+    The next version of the corpus index, being edited; nothing is visible to loaders until publish
+
+    The current version's files are cloned (copy-on-write where the
+    filesystem supports it) and edited in place. Added books are appended:
+    their vector codes to the end of the FAISS file, their rows to the chunk
+    store and their postings to the BM25 index, so adding a book costs about
+    as much as the book itself. Removing chunks renumbers the ones after
+    them, so removals rewrite the FAISS file.
+    """
+
+    def __init__(self, index_dir, index_name="index"):
+        self.index_dir = index_dir
+        self.index_name = index_name
+        self.path, self.version = staging_dir(index_dir)
+
+        current_dir = resolve_index_dir(index_dir)
+        if os.path.isdir(current_dir):
+            for name in os.listdir(current_dir):
+                source_path = os.path.join(current_dir, name)
+                if name != VERSION_FILE and os.path.isfile(source_path):
+                    clone_file(source_path, os.path.join(self.path, name))
+
+        # The FAISS index is only read into memory when it has to be rewritten
+        self.index = None
+        self.vector_count = _stored_vector_count(self._file(".faiss"))
+
+        self.sqlite_path = self._file(".sqlite")
+        self.use_sqlite = os.path.exists(self.sqlite_path) or (
+            not os.path.exists(self._file(".pkl")) and CHUNK_STORE_FORMAT == "sqlite"
+        )
+        if self.use_sqlite:
+            self.docstore = self.index_to_docstore_id = None
+        elif os.path.exists(self._file(".pkl")):
+            with open(self._file(".pkl"), "rb") as f:
+                self.docstore, self.index_to_docstore_id = pickle.load(f)
+        else:
+            self.docstore, self.index_to_docstore_id = InMemoryDocstore({}), {}
+
+        bm25_path = self._file(".bm25.npz")
+        self.bm25_index = BM25Index.load(bm25_path) if os.path.exists(bm25_path) else None
+        self.bm25_changed = False
+
+        # Approximate variants can take new vectors but not removals, which would renumber them
+        self.variant_types = [index_type for index_type in INDEX_TYPES[1:] if os.path.exists(self._file(".faiss", index_type))]
+
+    def _file(self, extension, index_type="flat"):
+        if extension == ".faiss":
+            return os.path.join(self.path, variant_file_name(self.index_name, index_type))
+        return os.path.join(self.path, f"{self.index_name}{extension}")
+
+    def _load_index(self):
+        if self.index is None and os.path.exists(self._file(".faiss")):
+            self.index = faiss.read_index(self._file(".faiss"))
+        return self.index
+
+    def chunk_keys(self):
+        """Yield (vector_id, docstore_id, metadata) for every chunk"""
+        if self.use_sqlite:
+            if os.path.exists(self.sqlite_path):
+                yield from iter_chunk_keys(self.sqlite_path)
+            return
+
+        for vector_id in sorted(self.index_to_docstore_id):
+            docstore_id = self.index_to_docstore_id[vector_id]
+            yield vector_id, docstore_id, self.docstore.search(docstore_id).metadata
+
+    def _texts(self):
+        """Chunk texts in vector ID order"""
+        if self.use_sqlite:
+            return iter_chunk_texts(self.sqlite_path)
+        return (
+            self.docstore.search(self.index_to_docstore_id[vector_id]).page_content
+            for vector_id in sorted(self.index_to_docstore_id)
+        )
+
+    def remove(self, vector_ids):
+        vector_ids = sorted(set(vector_ids))
+        if not vector_ids:
+            return
+
+        ids = np.array(vector_ids, dtype=np.int64)
+        self._load_index().remove_ids(faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+        self.vector_count = self.index.ntotal
+
+        if self.use_sqlite:
+            delete_chunks(self.sqlite_path, vector_ids)
+        else:
+            removed = set(vector_ids)
+            kept = []
+            for vector_id in sorted(self.index_to_docstore_id):
+                docstore_id = self.index_to_docstore_id[vector_id]
+                if vector_id in removed:
+                    self.docstore._dict.pop(docstore_id, None)
+                else:
+                    kept.append(docstore_id)
+            self.index_to_docstore_id = dict(enumerate(kept))
+
+        if self.bm25_index is not None:
+            self.bm25_index = self.bm25_index.without(vector_ids)
+            self.bm25_changed = True
+
+        for index_type in self.variant_types:
+            os.remove(self._file(".faiss", index_type))
+            print(f"Dropped the {index_type} variant; rebuild it with: python ann_index.py build {self.index_dir} {index_type}")
+        self.variant_types = []
+
+    def add(self, chunks, vectors):
+        if not chunks:
+            return
+
+        first_vector_id = self.vector_count
+        if self.index is not None:
+            self.index.add(vectors)
+        elif first_vector_id == 0 and not os.path.exists(self._file(".faiss")):
+            self.index = build_encoded_index(vectors, VECTOR_ENCODING)
+        elif append_to_index_file(self._file(".faiss"), vectors) is None:
+            # Codes are not at the end of the file (PQ), so the index is rewritten
+            self._load_index().add(vectors)
+        self.vector_count += len(chunks)
+
+        for index_type in self.variant_types:
+            variant_path = self._file(".faiss", index_type)
+            variant = faiss.read_index(variant_path)
+            variant.add(vectors)
+            faiss.write_index(variant, variant_path)
+
+        docstore_ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+        if self.use_sqlite:
+            append_chunks(self.sqlite_path, first_vector_id, docstore_ids, chunks)
+        else:
+            self.docstore.add(dict(zip(docstore_ids, chunks)))
+            for offset, docstore_id in enumerate(docstore_ids):
+                self.index_to_docstore_id[first_vector_id + offset] = docstore_id
+
+        if self.bm25_index is not None:
+            self.bm25_index = self.bm25_index.appended(chunk.page_content for chunk in chunks)
+            self.bm25_changed = True
+
+    def publish(self, changes):
+        """Write the edited files and make this the current version"""
+        if self.index is not None:
+            faiss.write_index(self.index, self._file(".faiss"))
+
+        if not self.use_sqlite:
+            with open(self._file(".pkl"), "wb") as f:
+                pickle.dump((self.docstore, self.index_to_docstore_id), f)
+
+        if self.bm25_changed:
+            self.bm25_index.save(self._file(".bm25.npz"))
+        elif self.bm25_index is None:
+            # Indexes written before BM25 existed get one built over all their chunks
+            write_bm25_index(self.path, self._texts(), self.index_name)
+
+        publish_version(self.index_dir, self.path, {"version": self.version, "vectors": self.vector_count, "changes": changes})
+
+def _stored_vector_count(index_path):
+    """Number of vectors in a saved FAISS index, read from its header"""
+    if not os.path.exists(index_path):
+        return 0
+    with open(index_path, "rb") as f:
+        return struct.unpack("<q", f.read(16)[8:16])[0]
+
+def update_corpus_index(add_paths=(), remove_books=(), remove_chunk_ids=(), index_dir=CORPUS_INDEX_DIR):
+    """
+    Add books to and remove books or chunks from the corpus index as one new version
+
+    Only the books being added are extracted and embedded, and they are
+    appended to a clone of the current version. Adding a book that is already
+    indexed replaces its chunks. The new version is written next to the
+    current one and published by switching CURRENT, so a failure leaves the
+    current index untouched.
+
+    Args:
+        add_paths: Paths of PDFs to add
+        remove_books: File names of books to remove
+        remove_chunk_ids: Docstore IDs of individual chunks to remove
+        index_dir: Corpus index directory
+
+    Returns:
+        dict: Version number, chunks added and removed, and the time taken
+    """
+    start_time = time.time()
+
+    # Extract and embed first, so the slow part runs before the index is touched
+    new_chunks = []
+    for pdf_path in add_paths:
+        chunks = split_book(pdf_path)
+        print(f"Split {book_name(pdf_path)} into {len(chunks)} chunks")
+        new_chunks.extend(chunks)
+    vectors = embed_chunks(new_chunks) if new_chunks else None
+
+    staged = _StagedIndex(index_dir)
+    try:
+        books_to_remove = set(remove_books) | {book_name(pdf_path) for pdf_path in add_paths}
+        chunk_ids_to_remove = set(remove_chunk_ids)
+        removed_ids = [
+            vector_id for vector_id, docstore_id, metadata in staged.chunk_keys()
+            if docstore_id in chunk_ids_to_remove or _chunk_book(metadata) in books_to_remove
+        ]
+
+        staged.remove(removed_ids)
+        staged.add(new_chunks, vectors)
+        if staged.index is None and not os.path.exists(staged._file(".faiss")):
+            raise Exception(f"{index_dir} does not exist yet; add a book to create it")
+
+        result = {
+            "version": staged.version,
+            "added_chunks": len(new_chunks),
+            "removed_chunks": len(removed_ids),
+            "vectors": staged.vector_count,
+        }
+        staged.publish({
+            "added_books": [book_name(pdf_path) for pdf_path in add_paths],
+            "removed_books": sorted(remove_books),
+            "removed_chunks": len(removed_ids)
+        })
+    except Exception:
+        shutil.rmtree(staged.path, ignore_errors=True)
+        raise
+
+    result["seconds"] = round(time.time() - start_time, 1)
+    print(
+        f"Published corpus index version {result['version']}: +{result['added_chunks']} / -{result['removed_chunks']} chunks, "
+        f"{result['vectors']} vectors, in {result['seconds']}s"
+    )
+    return result
+
+def list_books(index_dir=CORPUS_INDEX_DIR):
+    """Count the chunks of each book in the corpus index"""
+    counts = {}
+    index_dir = resolve_index_dir(index_dir)
+    sqlite_path = os.path.join(index_dir, "index.sqlite")
+
+    if os.path.exists(sqlite_path):
+        keys = iter_chunk_keys(sqlite_path)
+    else:
+        with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        keys = ((vector_id, docstore_id, docstore.search(docstore_id).metadata) for vector_id, docstore_id in index_to_docstore_id.items())
+
+    for _, _, metadata in keys:
+        book = _chunk_book(metadata)
+        counts[book] = counts.get(book, 0) + 1
+    return counts
+
+def rollback(index_dir=CORPUS_INDEX_DIR):
+    """Make the previous version current again; the newer one is kept until pruned"""
+    version = read_version(index_dir)["version"]
+    previous_version = index_versions.rollback(index_dir)
+    print(f"Rolled {index_dir} back to version {previous_version} (version {version} kept)")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("add", "remove-book", "remove-chunks", "books", "rollback"):
+        print("Usage: python corpus_index.py <command> [args]")
+        print("Commands:")
+        print("  add <pdf_path> [pdf_path ...] - Add books to the corpus index (replacing them if already indexed)")
+        print("  remove-book <file_name> [file_name ...] - Remove books from the corpus index")
+        print("  remove-chunks <chunk_id> [chunk_id ...] - Remove individual chunks by docstore ID")
+        print("  books - List indexed books and their chunk counts")
+        print("  rollback - Restore the previous version of the corpus index")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+
+    if command == "add" and args:
+        update_corpus_index(add_paths=args)
+
+    elif command == "remove-book" and args:
+        update_corpus_index(remove_books=args)
+
+    elif command == "remove-chunks" and args:
+        update_corpus_index(remove_chunk_ids=args)
+
+    elif command == "books":
+        for book, count in sorted(list_books().items()):
+            print(f"{count:8d}  {book}")
+
+    elif command == "rollback":
+        rollback()
+
+    else:
+        print("Invalid command or missing arguments")
+        sys.exit(1)
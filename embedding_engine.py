@@ -0,0 +1,263 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+from langchain.vectorstores import FAISS
+from embedding_service import get_embeddings, get_query_embeddings, EMBEDDING_MODEL_NAME
+
+# Embedding backend used for ingestion: "torch" (sentence-transformers) or "onnx-int8"
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+# Number of chunks embedded per forward pass
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+
+# Number of intra-op threads used by the backend
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", str(os.cpu_count() or 1)))
+
+# Directory holding the exported int8 ONNX model
+EMBEDDING_ONNX_DIR = os.environ.get(
+    "EMBEDDING_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models", "all-MiniLM-L6-v2-int8")
+)
+
+# Maximum sequence length of all-MiniLM-L6-v2
+MAX_SEQ_LENGTH = 256
+
+# Engines are expensive to build, so keep one per backend
+_engines = {}
+_engines_lock = threading.Lock()
+
+class BatchedEmbeddingEngine:
+    """
+    Embed text chunks in length-sorted batches with a fixed number of threads
+
+    Sorting by length keeps chunks of similar size in the same batch, so very
+    little of each forward pass is spent on padding. Implements the
+    embed_documents/embed_query interface langchain expects.
+    """
+
+    def __init__(self, backend="torch", batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_THREADS):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+
+        if backend == "torch":
+            self._encode_batch = self._load_torch_backend()
+        elif backend == "onnx-int8":
+            self._encode_batch = self._load_onnx_backend()
+        else:
+            raise Exception(f"Unknown embedding backend: {backend}")
+
+    def _load_torch_backend(self):
+        """Use the SentenceTransformer behind the shared embeddings model"""
+        import torch
+
+        torch.set_num_threads(self.num_threads)
+        model = get_embeddings().client
+
+        def encode_batch(texts):
+            return model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+        return encode_batch
+
+    def _load_onnx_backend(self):
+        """Run the int8-quantized ONNX export of the model with onnxruntime"""
+        try:
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise Exception("The onnx-int8 backend requires onnxruntime and transformers to be installed")
+
+        model_path = os.path.join(EMBEDDING_ONNX_DIR, "model_quantized.onnx")
+        if not os.path.exists(model_path):
+            raise Exception(f"No quantized ONNX model found at {model_path}. Run 'python embedding_engine.py export' first.")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_ONNX_DIR)
+        input_names = {model_input.name for model_input in session.get_inputs()}
+
+        def encode_batch(texts):
+            encoded = tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+            inputs = {name: value.astype(np.int64) for name, value in encoded.items() if name in input_names}
+            token_embeddings = session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens, then L2 normalisation, as in the sentence-transformers pipeline
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+        return encode_batch
+
+    def embed_documents(self, texts, progress_callback=None):
+        """
+        Embed a list of texts, returning vectors in the original order
+
+        Args:
+            texts: Texts to embed
+            progress_callback: Optional function called as progress_callback(done, total) after each batch
+        """
+        if not texts:
+            return []
+
+        # Process the longest texts first so padding within a batch stays small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors = [None] * len(texts)
+
+        for start in range(0, len(order), self.batch_size):
+            batch_indexes = order[start:start + self.batch_size]
+            batch_vectors = self._encode_batch([texts[i] for i in batch_indexes])
+            for i, vector in zip(batch_indexes, batch_vectors):
+                vectors[i] = vector.tolist()
+
+            if progress_callback:
+                progress_callback(start + len(batch_indexes), len(texts))
+
+        return vectors
+
+    def embed_query(self, text):
+        """Embed a single query"""
+        return self.embed_documents([text])[0]
+
+def get_engine(backend=None, num_threads=None):
+    """
+    Get the shared ingestion engine for a backend (defaults to EMBEDDING_BACKEND)
+
+    num_threads only applies when the engine is created; later calls get the existing engine.
+    """
+    backend = backend or EMBEDDING_BACKEND
+
+    if backend not in _engines:
+        with _engines_lock:
+            if backend not in _engines:
+                _engines[backend] = BatchedEmbeddingEngine(backend, num_threads=num_threads or EMBEDDING_THREADS)
+
+    return _engines[backend]
+
+def create_vector_store(chunks, backend=None, progress_callback=None):
+    """
+    Create a FAISS vector store from document chunks using the batched engine
+
+    The store answers queries with the cached shared embeddings model, so it
+    behaves the same as one created with FAISS.from_documents.
+
+    Args:
+        chunks: List of langchain Documents
+        backend: Optional backend name (defaults to EMBEDDING_BACKEND)
+        progress_callback: Optional function called as progress_callback(done, total) after each batch
+
+    Returns:
+        FAISS: The vector store
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+
+    vectors = get_engine(backend).embed_documents(texts, progress_callback)
+
+    return FAISS.from_embeddings(list(zip(texts, vectors)), get_query_embeddings(), metadatas=metadatas)
+
+def export_quantized_onnx(output_dir=EMBEDDING_ONNX_DIR):
+    """Export all-MiniLM-L6-v2 to ONNX and quantize its weights to int8"""
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise Exception("Exporting the ONNX model requires optimum[onnxruntime] to be installed")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Exporting {EMBEDDING_MODEL_NAME} to ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL_NAME, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME).save_pretrained(output_dir)
+
+    # Dynamic int8 quantization of the weights, targeting AVX2 CPUs
+    print("Quantizing ONNX model to int8...")
+    quantizer = ORTQuantizer.from_pretrained(output_dir)
+    quantizer.quantize(save_dir=output_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+
+    print(f"Saved quantized ONNX model to {output_dir}")
+    return output_dir
+
+def benchmark(pdf_path, backends=("torch", "onnx-int8")):
+    """
+    Compare embedding throughput and drift of each backend against the reference model
+
+    Args:
+        pdf_path: Path to a PDF used as the benchmark corpus
+        backends: Backends to benchmark
+
+    Returns:
+        list: One result dict per backend
+    """
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    documents = PyPDFLoader(pdf_path).load()
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents(documents)
+    texts = [chunk.page_content for chunk in chunks]
+    print(f"Benchmarking on {len(texts)} chunks from {os.path.basename(pdf_path)}")
+
+    # Reference: the default langchain path used by FAISS.from_documents
+    start_time = time.time()
+    reference = np.array(get_embeddings().embed_documents(texts))
+    reference_seconds = time.time() - start_time
+
+    results = [{
+        "backend": "reference",
+        "chunks_per_sec": round(len(texts) / reference_seconds, 1),
+        "mean_cosine": 1.0,
+        "min_cosine": 1.0
+    }]
+
+    for backend in backends:
+        try:
+            engine = BatchedEmbeddingEngine(backend)
+        except Exception as e:
+            print(f"Skipping {backend}: {str(e)}")
+            continue
+
+        start_time = time.time()
+        vectors = np.array(engine.embed_documents(texts))
+        seconds = time.time() - start_time
+
+        cosine = (vectors * reference).sum(axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+        )
+
+        results.append({
+            "backend": backend,
+            "chunks_per_sec": round(len(texts) / seconds, 1),
+            "mean_cosine": round(float(cosine.mean()), 5),
+            "min_cosine": round(float(cosine.min()), 5)
+        })
+
+    for result in results:
+        print(f"  {result['backend']:<10} {result['chunks_per_sec']:>8} chunks/sec  "
+              f"mean cosine {result['mean_cosine']}  min cosine {result['min_cosine']}")
+
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python embedding_engine.py <command> [args]")
+        print("Commands:")
+        print("  export - Export and quantize the ONNX model")
+        print("  benchmark <pdf_path> - Compare backends on a PDF")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == "export":
+        export_quantized_onnx()
+
+    elif command == "benchmark" and len(sys.argv) >= 3:
+        benchmark(sys.argv[2])
+
+    else:
+        print("Invalid command or missing arguments")
+        sys.exit(1)
@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+from langchain.embeddings import HuggingFaceEmbeddings
+from query_cache import CachedQueryEmbeddings, query_embedding_cache
+
+# Name of the sentence-transformers model shared by every module
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Dimension of the vectors produced by the model
+EMBEDDING_DIMENSION = 384
+
+# Process-wide embeddings instance, created on first use
+_embeddings = None
+_query_embeddings = None
+_embeddings_lock = threading.Lock()
+
+# Load and warm-up metrics for the shared model
+_metrics = {
+    "model_name": EMBEDDING_MODEL_NAME,
+    "loaded": False,
+    "load_count": 0,
+    "load_time_seconds": None,
+    "loaded_at": None,
+    "warmup_time_seconds": None,
+    "last_error": None
+}
+
+def get_embeddings():
+    """
+    Get the shared embeddings model, loading it on first use
+
+    The model is loaded at most once per process, even when several request
+    threads ask for it at the same time.
+
+    Returns:
+        HuggingFaceEmbeddings: The shared embeddings instance
+    """
+    global _embeddings
+
+    # Fast path once the model is loaded
+    if _embeddings is not None:
+        return _embeddings
+
+    with _embeddings_lock:
+        # Another thread may have loaded the model while we were waiting
+        if _embeddings is not None:
+            return _embeddings
+
+        print(f"Loading embeddings model: {EMBEDDING_MODEL_NAME}")
+        start_time = time.time()
+
+        try:
+            embeddings = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME,
+                model_kwargs={'device': 'cpu'}
+            )
+        except Exception as e:
+            _metrics["last_error"] = str(e)
+            print(f"Error loading embeddings model: {str(e)}")
+            raise
+
+        _metrics["loaded"] = True
+        _metrics["load_count"] += 1
+        _metrics["load_time_seconds"] = round(time.time() - start_time, 3)
+        _metrics["loaded_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        _metrics["last_error"] = None
+
+        _embeddings = embeddings
+        print(f"Loaded embeddings model in {_metrics['load_time_seconds']}s")
+
+    return _embeddings
+
+def get_query_embeddings():
+    """
+    Get the shared embeddings model wrapped with the query embedding cache
+
+    Use this for vector stores that answer questions, so repeated questions
+    skip the transformer forward pass.
+
+    Returns:
+        CachedQueryEmbeddings: The cached embeddings wrapper
+    """
+    global _query_embeddings
+
+    if _query_embeddings is None:
+        _query_embeddings = CachedQueryEmbeddings(get_embeddings(), query_embedding_cache)
+
+    return _query_embeddings
+
+def warm_up():
+    """Load the shared model and run one query through it so the first real request is fast"""
+    embeddings = get_embeddings()
+
+    start_time = time.time()
+    embeddings.embed_query("warm up")
+    _metrics["warmup_time_seconds"] = round(time.time() - start_time, 3)
+
+    print(f"Warmed up embeddings model in {_metrics['warmup_time_seconds']}s")
+    return get_metrics()
+
+def health_check():
+    """
+    Check that the shared model is loaded and produces vectors of the expected size
+
+    Returns:
+        dict: Health status with the current metrics
+    """
+    if _embeddings is None:
+        return {"status": "not_loaded", "metrics": get_metrics()}
+
+    try:
+        start_time = time.time()
+        vector = _embeddings.embed_query("health check")
+        latency_ms = round((time.time() - start_time) * 1000, 2)
+
+        if len(vector) != EMBEDDING_DIMENSION:
+            return {
+                "status": "error",
+                "error": f"Unexpected embedding dimension {len(vector)}",
+                "metrics": get_metrics()
+            }
+
+        return {"status": "ok", "latency_ms": latency_ms, "metrics": get_metrics()}
+
+    except Exception as e:
+        return {"status": "error", "error": str(e), "metrics": get_metrics()}
+
+def get_metrics():
+    """Get a copy of the load metrics for the shared model"""
+    return dict(_metrics)
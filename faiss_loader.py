@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import pickle
+import multiprocessing
+import faiss
+from langchain.vectorstores import FAISS
+from chunk_store import open_chunk_store
+from ann_index import FAISS_INDEX_TYPE, variant_file_name, apply_search_params
+from vector_encoding import index_encoding
+from bm25_index import load_bm25_index
+from index_versions import resolve_index_dir
+
+# Open FAISS indexes memory-mapped so processes on a node share the page cache ("0" to read them into memory).
+# faiss-cpu 1.7.4 maps only IVF inverted lists; flat and HNSW indexes are still read into private
+# memory unless the installed FAISS provides IO_FLAG_MMAP_IFC (load_stats["mmap"] reports what happened)
+FAISS_MMAP = os.environ.get("FAISS_MMAP", "1") == "1"
+
+# Statistics of the last index loaded by this process, by label ("main" for the corpus index)
+load_stats = {}
+
+def get_rss_bytes():
+    """Get the resident set size of this process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+
+    # Peak rather than current RSS where /proc is unavailable (KB on Linux, bytes on macOS)
+    try:
+        import resource
+    except ImportError:
+        # Windows has no resource module; RSS is reported as 0
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _mmap_flags():
+    """
+    FAISS I/O flags for memory-mapped loading
+
+    IO_FLAG_MMAP maps the inverted lists of IVF indexes. Flat indexes are only
+    mapped by IO_FLAG_MMAP_IFC, which newer FAISS releases provide.
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return flags | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+def _is_mapped(index):
+    """Check whether an index loaded with _mmap_flags() actually reads its vectors from a mapping"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # IO_FLAG_MMAP replaces the inverted lists with mapped on-disk lists
+        return isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists)
+    return hasattr(faiss, "IO_FLAG_MMAP_IFC")
+
+def load_faiss_index(folder_path, embeddings, index_name="index", mmap=None, label="main", index_type=None):
+    """
+    Load a FAISS vector store saved with save_local or save_faiss_index, memory-mapping the vector index where FAISS can
+
+    A drop-in replacement for FAISS.load_local. Chunks are read from the
+    SQLite chunk store when the folder has one, and from the pickled docstore
+    otherwise. The mapped index is read-only, so vectors cannot be added to a
+    store loaded this way. Indexes saved with a compressed VECTOR_ENCODING are
+    read in that encoding; nothing needs configuring at load time. A BM25
+    index saved next to it is attached as vector_store.bm25_index (None if absent).
+
+    Args:
+        folder_path: Directory holding <index_name>.faiss and <index_name>.sqlite or <index_name>.pkl
+        embeddings: Embeddings used for queries
+        index_name: Base name of the index files
+        mmap: Memory-map the index (defaults to FAISS_MMAP)
+        label: Name the load statistics are recorded under
+        index_type: Index variant to load (defaults to FAISS_INDEX_TYPE; see ann_index)
+
+    Returns:
+        FAISS: The vector store
+    """
+    mmap = FAISS_MMAP if mmap is None else mmap
+    folder_path = resolve_index_dir(folder_path)
+    rss_before = get_rss_bytes()
+    start_time = time.time()
+
+    # Use the configured approximate variant when one was built, the exact flat index otherwise
+    index_type = index_type or FAISS_INDEX_TYPE
+    index_path = os.path.join(folder_path, variant_file_name(index_name, index_type))
+    if not os.path.exists(index_path):
+        if index_type != "flat":
+            print(f"No {index_type} variant in {folder_path}, using the flat index")
+        index_type = "flat"
+        index_path = os.path.join(folder_path, f"{index_name}.faiss")
+
+    if mmap:
+        index = faiss.read_index(index_path, _mmap_flags())
+        mapped = _is_mapped(index)
+        if not mapped:
+            print(f"FAISS {faiss.__version__} cannot memory-map {index_type} indexes (needs IO_FLAG_MMAP_IFC), reading it into memory")
+    else:
+        index = faiss.read_index(index_path)
+        mapped = False
+    apply_search_params(index)
+
+    sqlite_path = os.path.join(folder_path, f"{index_name}.sqlite")
+    if os.path.exists(sqlite_path):
+        docstore, index_to_docstore_id = open_chunk_store(sqlite_path)
+        chunk_store = "sqlite"
+    else:
+        # Same layout FAISS.save_local writes
+        with open(os.path.join(folder_path, f"{index_name}.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        chunk_store = "pickle"
+
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    # Keyword index for hybrid retrieval (see hybrid_retriever.make_retriever)
+    vector_store.bm25_index = load_bm25_index(folder_path, index_name)
+
+    stats = {
+        "path": folder_path,
+        "mmap_requested": mmap,
+        "mmap": mapped,
+        "chunk_store": chunk_store,
+        "index_type": index_type,
+        "vector_encoding": index_encoding(index),
+        "bm25_index": vector_store.bm25_index is not None,
+        "vectors": index.ntotal,
+        "index_file_bytes": os.path.getsize(index_path),
+        "load_seconds": round(time.time() - start_time, 3),
+        "rss_before_bytes": rss_before,
+        "rss_after_bytes": get_rss_bytes()
+    }
+    stats["rss_increase_bytes"] = stats["rss_after_bytes"] - rss_before
+    load_stats[label] = stats
+
+    print(
+        f"Loaded FAISS index {folder_path} ({index.ntotal} vectors, mmap={'on' if mapped else 'off'}, {chunk_store} chunks) "
+        f"in {stats['load_seconds']}s, RSS +{stats['rss_increase_bytes'] / (1024 * 1024):.1f}MB"
+    )
+    return vector_store
+
+def get_last_load_stats(label="main"):
+    """Get load time and RSS figures for the last index this process loaded under a label"""
+    return dict(load_stats.get(label, {}))
+
+def _benchmark_worker(folder_path, mmap, queue):
+    # Loaded in a fresh process so RSS is not skewed by an earlier load
+    from embedding_service import get_query_embeddings
+
+    embeddings = get_query_embeddings()
+    load_faiss_index(folder_path, embeddings, mmap=mmap)
+    queue.put(get_last_load_stats())
+
+def benchmark(folder_path):
+    """Compare load time and RSS of regular and memory-mapped loading, each in a fresh process"""
+    context = multiprocessing.get_context("spawn")
+    results = {}
+
+    for mmap in (False, True):
+        queue = context.Queue()
+        process = context.Process(target=_benchmark_worker, args=(folder_path, mmap, queue))
+        process.start()
+        results["mmap" if mmap else "load_local"] = queue.get()
+        process.join()
+
+    for name, stats in results.items():
+        print(
+            f"  {name:10s}: {stats['load_seconds']:.3f}s, "
+            f"RSS +{stats['rss_increase_bytes'] / (1024 * 1024):.1f}MB "
+            f"(index file {stats['index_file_bytes'] / (1024 * 1024):.1f}MB, {stats['vectors']} vectors"
+            f"{', not mapped by this FAISS' if stats['mmap_requested'] and not stats['mmap'] else ''})"
+        )
+
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "benchmark":
+        print("Usage: python faiss_loader.py benchmark <faiss_index_dir>")
+        sys.exit(1)
+
+    benchmark(sys.argv[2])
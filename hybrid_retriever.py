@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+import numpy as np
+from langchain.schema import BaseRetriever, Document
+from bm25_index import tokenize
+
+# Fuse BM25 and vector search results for indexes that have a BM25 index
+# (off by default, so answers only change when it is enabled; "1" to enable)
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "0") == "1"
+
+# Candidates taken from each of the two searches before fusion
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "20"))
+
+# Reciprocal rank fusion constant: a document at rank r contributes 1 / (RRF_K + r)
+RRF_K = int(os.environ.get("RRF_K", "60"))
+
+# Threads running BM25 searches alongside the vector searches ("0" runs BM25 inline on the request thread).
+# A BM25 search takes a few milliseconds, so a shared pool only helps if it is sized to the request
+# concurrency; a smaller one makes requests queue behind each other. Measure with compare()
+HYBRID_SEARCH_THREADS = int(os.environ.get("HYBRID_SEARCH_THREADS", "0"))
+
+_bm25_executor = None
+_bm25_executor_lock = threading.Lock()
+
+# Questions with exact drug names, dosages and codes, used by compare()
+SAMPLE_QUESTIONS = [
+    "What is the dose of methotrexate for ectopic pregnancy?",
+    "Misoprostol 800 micrograms vaginally for early pregnancy loss",
+    "When is magnesium sulfate given in pre-eclampsia and what is the loading dose?",
+    "Letrozole 2.5 mg for ovulation induction in PCOS",
+    "Tranexamic acid dose for heavy menstrual bleeding",
+    "Management of CIN 2 and CIN 3 on colposcopy",
+    "Oxytocin infusion regimen for postpartum haemorrhage",
+    "Clomiphene citrate side effects and maximum number of cycles",
+    "Levonorgestrel intrauterine system for endometrial hyperplasia",
+    "Anti-D immunoglobulin dose after miscarriage",
+    "Dydrogesterone in threatened miscarriage",
+    "FIGO staging of endometrial carcinoma",
+]
+
+def reciprocal_rank_fusion(rankings, k=None, rrf_k=None):
+    """
+    Fuse ranked lists of IDs with reciprocal rank fusion
+
+    Args:
+        rankings: Lists of IDs, best first
+        k: Number of fused IDs to return
+        rrf_k: Fusion constant (defaults to RRF_K)
+
+    Returns:
+        list: IDs, best first
+    """
+    rrf_k = rrf_k or RRF_K
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+
+    # Ties keep the order of first appearance, so the vector ranking wins them
+    fused = sorted(scores, key=lambda doc_id: -scores[doc_id])
+    return fused[:k] if k else fused
+
+def _vector_ranking(vector_store, query, candidates):
+    embedding_function = vector_store.embedding_function
+    if hasattr(embedding_function, "embed_query"):
+        query_vector = embedding_function.embed_query(query)
+    else:
+        query_vector = embedding_function(query)
+    _, indices = vector_store.index.search(np.array([query_vector], dtype=np.float32), candidates)
+    return [int(vector_id) for vector_id in indices[0] if vector_id != -1]
+
+def _bm25_ranking(bm25_index, query, candidates):
+    return [doc_id for doc_id, _ in bm25_index.search(query, candidates)]
+
+def get_bm25_executor():
+    """Get the pool running BM25 searches, or None when they run inline (HYBRID_SEARCH_THREADS=0)"""
+    global _bm25_executor
+    if HYBRID_SEARCH_THREADS <= 0:
+        return None
+
+    with _bm25_executor_lock:
+        if _bm25_executor is None:
+            _bm25_executor = ThreadPoolExecutor(max_workers=HYBRID_SEARCH_THREADS, thread_name_prefix="bm25")
+        return _bm25_executor
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing FAISS vector search with BM25 keyword search
+
+    The two rankings are combined with reciprocal rank fusion, so chunks
+    containing exact drug names, dosages or codes are found even when their
+    embeddings rank them low. BM25 runs on executor while the vector search
+    runs, or before it on the calling thread when executor is None. Exposes
+    vectorstore like langchain's VectorStoreRetriever.
+    """
+
+    vectorstore: Any
+    bm25_index: Any
+    k: int = 5
+    candidates: int = HYBRID_CANDIDATES
+    executor: Any = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
+        if self.executor is None:
+            bm25_ids = _bm25_ranking(self.bm25_index, query, self.candidates)
+            vector_ids = _vector_ranking(self.vectorstore, query, self.candidates)
+        else:
+            bm25_future = self.executor.submit(_bm25_ranking, self.bm25_index, query, self.candidates)
+            vector_ids = _vector_ranking(self.vectorstore, query, self.candidates)
+            bm25_ids = bm25_future.result()
+
+        docs = []
+        for vector_id in reciprocal_rank_fusion([vector_ids, bm25_ids], self.k):
+            doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[vector_id])
+            if isinstance(doc, Document):
+                docs.append(doc)
+        return docs
+
+def make_retriever(vector_store, k=5):
+    """
+    Create the retriever for a vector store: hybrid when it was loaded with a BM25 index, vector-only otherwise
+
+    Returns:
+        BaseRetriever: The retriever, with the vector store as retriever.vectorstore
+    """
+    bm25_index = getattr(vector_store, "bm25_index", None)
+    if HYBRID_RETRIEVAL and bm25_index is not None:
+        return HybridRetriever(vectorstore=vector_store, bm25_index=bm25_index, k=k, executor=get_bm25_executor())
+    return vector_store.as_retriever(search_kwargs={"k": k})
+
+def _rare_terms(bm25_index, question, max_share=0.01):
+    """Question terms found in at most max_share of chunks (drug names, doses, codes)"""
+    limit = max(1, int(bm25_index.doc_count * max_share))
+    return {term for term in tokenize(question) if 0 < bm25_index.document_frequency(term) <= limit}
+
+def compare(folder_path, questions=None, k=5, concurrency=1):
+    """
+    Compare vector-only and hybrid retrieval on a saved index
+
+    Hybrid retrieval is measured with BM25 run inline and on a thread pool
+    (HYBRID_SEARCH_THREADS threads, or one per concurrent request when that
+    is 0), with concurrency requests in flight at once.
+
+    With no relevance labels, recall is measured on the questions' rare terms:
+    the share of them that appear in at least one retrieved chunk. Latency is
+    per question, with the embeddings model already warm.
+
+    Returns:
+        dict: Mean and p95 latency and rare-term recall of each mode
+    """
+    from embedding_service import get_query_embeddings
+    from faiss_loader import load_faiss_index
+
+    questions = questions or SAMPLE_QUESTIONS
+    vector_store = load_faiss_index(folder_path, get_query_embeddings(), label="compare")
+    if getattr(vector_store, "bm25_index", None) is None:
+        raise Exception(f"{folder_path} has no BM25 index; re-save it or rebuild the corpus")
+
+    pool_threads = HYBRID_SEARCH_THREADS if HYBRID_SEARCH_THREADS > 0 else concurrency
+    bm25_pool = ThreadPoolExecutor(max_workers=pool_threads, thread_name_prefix="bm25-compare")
+    retrievers = {
+        "vector": vector_store.as_retriever(search_kwargs={"k": k}),
+        "hybrid_inline": HybridRetriever(vectorstore=vector_store, bm25_index=vector_store.bm25_index, k=k),
+        "hybrid_pool": HybridRetriever(vectorstore=vector_store, bm25_index=vector_store.bm25_index, k=k, executor=bm25_pool)
+    }
+    get_query_embeddings().embed_query(questions[0])
+
+    def run_question(retriever, question):
+        start_time = time.time()
+        docs = retriever.get_relevant_documents(question)
+        latency = (time.time() - start_time) * 1000
+
+        text = " ".join(doc.page_content.lower() for doc in docs)
+        rare_terms = _rare_terms(vector_store.bm25_index, question)
+        return latency, len(rare_terms & set(tokenize(text))), len(rare_terms)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as request_pool:
+        for mode, retriever in retrievers.items():
+            # Every request thread asks every question, so concurrency requests are always in flight
+            runs = list(request_pool.map(
+                lambda question: run_question(retriever, question),
+                [question for question in questions for _ in range(concurrency)]
+            ))
+            latencies = [latency for latency, _, _ in runs]
+            found = sum(found for _, found, _ in runs)
+            total = sum(total for _, _, total in runs)
+
+            results[mode] = {
+                "mean_ms": round(float(np.mean(latencies)), 1),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+                "rare_term_recall": round(found / total, 3) if total else None
+            }
+    bm25_pool.shutdown()
+
+    print(
+        f"Retrieval comparison on {folder_path}: {len(questions)} questions, k={k}, "
+        f"{concurrency} concurrent requests, {pool_threads} BM25 pool threads, "
+        f"BM25 index {vector_store.bm25_index.memory_bytes() / (1024 * 1024):.1f}MB"
+    )
+    for mode, result in results.items():
+        recall = "n/a" if result["rare_term_recall"] is None else f"{result['rare_term_recall']:.3f}"
+        print(f"  {mode:13s}: mean {result['mean_ms']:7.1f}ms, p95 {result['p95_ms']:7.1f}ms, rare-term recall {recall}")
+
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "compare":
+        print("Usage: python hybrid_retriever.py compare <faiss_index_dir> [questions_file|-] [concurrency]")
+        sys.exit(1)
+
+    questions = None
+    if len(sys.argv) >= 4 and sys.argv[3] != "-":
+        with open(sys.argv[3], "r") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    concurrency = int(sys.argv[4]) if len(sys.argv) >= 5 else 1
+    compare(sys.argv[2], questions, concurrency=concurrency)
@@ -0,0 +1,204 @@
+import os
+import json
+import struct
+import hashlib
+from azure.core.exceptions import ResourceNotFoundError
+from blob_pool import blob_timeout
+
+# Storage format for new per-PDF indexes: "bundle" (one object) or "files" (loose blobs under faiss_index/)
+PDF_INDEX_FORMAT = os.environ.get("PDF_INDEX_FORMAT", "bundle")
+
+# Bundle layout: magic, format version, header length, JSON header, then the file sections back to back
+BUNDLE_MAGIC = b"FAISSBDL"
+BUNDLE_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+
+# Parallel range requests used when downloading a large bundle
+BUNDLE_DOWNLOAD_CONCURRENCY = int(os.environ.get("BUNDLE_DOWNLOAD_CONCURRENCY", "4"))
+
+def bundle_blob_name(pdf_id):
+    """Name of the blob holding a PDF's packed index"""
+    return f"pdfs/{pdf_id}/index.bundle"
+
+def pack_index(faiss_dir):
+    """
+    Pack the files of a saved FAISS index into a single bundle
+
+    Args:
+        faiss_dir: Directory written by FAISS.save_local
+
+    Returns:
+        bytes: The bundle
+    """
+    sections = []
+    payloads = []
+    offset = 0
+
+    for file_name in sorted(os.listdir(faiss_dir)):
+        with open(os.path.join(faiss_dir, file_name), "rb") as f:
+            payload = f.read()
+
+        sections.append({
+            "name": file_name,
+            "offset": offset,
+            "length": len(payload),
+            "sha256": hashlib.sha256(payload).hexdigest()
+        })
+        payloads.append(payload)
+        offset += len(payload)
+
+    # Section offsets are relative to the end of the header
+    header = json.dumps({"version": BUNDLE_VERSION, "sections": sections}).encode("utf-8")
+    return _PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header)) + header + b"".join(payloads)
+
+def unpack_index(bundle, faiss_dir):
+    """
+    Write the files packed in a bundle to a directory FAISS.load_local can read
+
+    Args:
+        bundle: Bundle bytes
+        faiss_dir: Directory to write the index files to
+    """
+    magic, version, header_length = _PREAMBLE.unpack_from(bundle, 0)
+    if magic != BUNDLE_MAGIC:
+        raise Exception("Not a FAISS index bundle")
+    if version > BUNDLE_VERSION:
+        raise Exception(f"Unsupported index bundle version {version}")
+
+    header_start = _PREAMBLE.size
+    header = json.loads(bundle[header_start:header_start + header_length].decode("utf-8"))
+    data_start = header_start + header_length
+
+    os.makedirs(faiss_dir, exist_ok=True)
+    for section in header["sections"]:
+        start = data_start + section["offset"]
+        payload = bundle[start:start + section["length"]]
+
+        if len(payload) != section["length"] or hashlib.sha256(payload).hexdigest() != section["sha256"]:
+            raise Exception(f"Index bundle section {section['name']} is corrupt")
+
+        # Section names come from the bundle, so never let them escape the target directory
+        with open(os.path.join(faiss_dir, os.path.basename(section["name"])), "wb") as f:
+            f.write(payload)
+
+def upload_index_bundle(container_client, pdf_id, faiss_dir):
+    """
+    Upload a saved FAISS index as a single bundle blob
+
+    Returns:
+        str: The bundle's blob name
+    """
+    blob_name = bundle_blob_name(pdf_id)
+    container_client.upload_blob(
+        name=blob_name,
+        data=pack_index(faiss_dir),
+        overwrite=True,
+        **blob_timeout("upload")
+    )
+    return blob_name
+
+def download_index_bundle(container_client, pdf_id, faiss_dir):
+    """
+    Download a PDF's index bundle and unpack it into faiss_dir
+
+    Small bundles take a single GET; large ones are fetched with parallel
+    range requests.
+
+    Returns:
+        bool: True if the bundle was found, False if the PDF uses loose index files
+    """
+    try:
+        downloader = container_client.download_blob(
+            bundle_blob_name(pdf_id),
+            max_concurrency=BUNDLE_DOWNLOAD_CONCURRENCY,
+            **blob_timeout("download")
+        )
+        bundle = downloader.readall()
+    except ResourceNotFoundError:
+        return False
+
+    unpack_index(bundle, faiss_dir)
+    return True
+
+def download_loose_index_files(container_client, pdf_id, faiss_dir):
+    """
+    Download a PDF's index stored as loose blobs under faiss_index/
+
+    Returns:
+        bool: True if any index files were found
+    """
+    os.makedirs(faiss_dir, exist_ok=True)
+    found = False
+
+    blobs = container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/faiss_index/", **blob_timeout("list"))
+    for blob in blobs:
+        file_path = os.path.join(faiss_dir, os.path.basename(blob.name))
+        with open(file_path, "wb") as download_file:
+            download_file.write(container_client.download_blob(blob.name, **blob_timeout("download")).readall())
+        found = True
+
+    return found
+
+def download_pdf_index(container_client, pdf_id, faiss_dir):
+    """
+    Download a PDF's FAISS index, from its bundle or, for older PDFs, from loose files
+
+    Returns:
+        bool: True if an index was found
+    """
+    if download_index_bundle(container_client, pdf_id, faiss_dir):
+        return True
+    return download_loose_index_files(container_client, pdf_id, faiss_dir)
+
+def upload_pdf_index(container_client, pdf_id, faiss_dir):
+    """
+    Upload a PDF's saved FAISS index in the configured format (PDF_INDEX_FORMAT)
+
+    Returns:
+        list: Names of the uploaded blobs
+    """
+    if PDF_INDEX_FORMAT == "bundle":
+        return [upload_index_bundle(container_client, pdf_id, faiss_dir)]
+
+    blob_names = []
+    for file_name in os.listdir(faiss_dir):
+        blob_name = f"pdfs/{pdf_id}/faiss_index/{file_name}"
+        with open(os.path.join(faiss_dir, file_name), "rb") as data:
+            container_client.upload_blob(
+                name=blob_name,
+                data=data,
+                overwrite=True,
+                **blob_timeout("upload")
+            )
+        blob_names.append(blob_name)
+
+    return blob_names
+
+def get_pdf_index_version(container_client, pdf_id):
+    """
+    Get a version tag for a PDF's stored index, used to revalidate local copies
+
+    For a bundle this is its ETag (one HEAD request); for loose index files it
+    is built from the ETags of every file.
+
+    Returns:
+        str: The version tag, or None if the PDF has no index
+    """
+    try:
+        properties = container_client.get_blob_client(bundle_blob_name(pdf_id)).get_blob_properties(**blob_timeout("metadata"))
+        return properties.etag
+    except ResourceNotFoundError:
+        pass
+
+    blobs = container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/faiss_index/", **blob_timeout("list"))
+    etags = sorted(f"{blob.name}={blob.etag}" for blob in blobs)
+    if not etags:
+        return None
+    return "files:" + hashlib.sha256("\n".join(etags).encode("utf-8")).hexdigest()
+
+def has_pdf_index(blob_names, pdf_id):
+    """Check whether a listing of a PDF's blobs contains its index, in either format"""
+    return any(
+        name == bundle_blob_name(pdf_id) or name.startswith(f"pdfs/{pdf_id}/faiss_index/")
+        for name in blob_names
+    )
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from blob_download import file_lock
+
+# Directory holding local copies of per-PDF FAISS indexes, kept across restarts
+INDEX_CACHE_DIR = os.environ.get(
+    "INDEX_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "index_cache")
+)
+
+# Maximum disk space used by cached indexes (default 2GB)
+INDEX_CACHE_MAX_BYTES = int(os.environ.get("INDEX_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Age after which retired, staging and incomplete directories are treated as left behind and deleted.
+# Every worker process shares the cache directory, so younger ones may belong to a live process
+INDEX_CACHE_STALE_SECONDS = int(os.environ.get("INDEX_CACHE_STALE_SECONDS", "3600"))
+
+def _directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+class IndexDiskCache:
+    """
+    LRU cache of FAISS index directories on local disk, bounded by total size
+
+    Each entry is stored as <cache_dir>/<pdf_id>/faiss_index with an entry.json
+    recording the version (blob ETag) it was downloaded at, its size and when
+    it was last used.
+
+    Entries whose index is loaded (in_use(pdf_id) is true) are never evicted.
+    A loaded entry that is replaced or removed is moved aside and deleted once
+    release(pdf_id) reports its retriever unloaded.
+    """
+
+    def __init__(self, cache_dir=INDEX_CACHE_DIR, max_bytes=INDEX_CACHE_MAX_BYTES, in_use=None,
+                 stale_seconds=INDEX_CACHE_STALE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.in_use = in_use or (lambda pdf_id: False)
+        self._entries = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry_path(self, pdf_id):
+        return os.path.join(self.cache_dir, pdf_id, "entry.json")
+
+    def _write_entry(self, pdf_id, entry, entry_path=None):
+        entry_path = entry_path or self._entry_path(pdf_id)
+        temp_path = f"{entry_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, entry_path)
+
+    def _is_stale(self, path):
+        try:
+            return time.time() - os.path.getmtime(path) > self.stale_seconds
+        except OSError:
+            return False
+
+    def _load_entries(self):
+        """Read the entries left on disk by earlier runs (called with the lock held)"""
+        if self._entries is not None:
+            return
+
+        self._entries = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Other processes share the directory, so only one cleans it at a time, and only what is stale
+        with file_lock(os.path.join(self.cache_dir, ".cleanup.lock")):
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if not os.path.isdir(path):
+                    continue
+
+                # Retired directories may still be loaded by another process, staging ones still being written
+                if name.startswith("."):
+                    if (name.startswith(".retired-") or name.startswith(".staging-")) and self._is_stale(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    continue
+
+                try:
+                    with open(self._entry_path(name), "r") as f:
+                        self._entries[name] = json.load(f)
+                except (OSError, ValueError):
+                    # Entries are complete when renamed into place, so this is left from an interrupted store
+                    if self._is_stale(path):
+                        shutil.rmtree(path, ignore_errors=True)
+
+    def _retire(self, pdf_id):
+        """
+        Take a PDF's directory out of the cache (called with the lock held)
+
+        A directory whose index is loaded is renamed aside rather than deleted,
+        so the loaded retriever keeps its files until release(pdf_id).
+
+        Returns:
+            bool: False if the directory could not be moved (e.g. its files are open on Windows)
+        """
+        target_dir = os.path.join(self.cache_dir, pdf_id)
+        if not os.path.exists(target_dir):
+            return True
+
+        if not self.in_use(pdf_id):
+            shutil.rmtree(target_dir, ignore_errors=True)
+            return True
+
+        retired_dir = os.path.join(self.cache_dir, f".retired-{pdf_id}-{uuid.uuid4()}")
+        try:
+            os.replace(target_dir, retired_dir)
+        except OSError:
+            return False
+
+        # Its age counts from now, so other processes starting up leave it alone while it is loaded
+        try:
+            os.utime(retired_dir)
+        except OSError:
+            pass
+        return True
+
+    def _purge_retired(self, pdf_id):
+        """Delete a PDF's retired directories once its index is no longer loaded (called with the lock held)"""
+        if self.in_use(pdf_id):
+            return
+
+        prefix = f".retired-{pdf_id}-"
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def _evict(self):
+        """Remove least recently used entries not in use until the cache fits its size cap (called with the lock held)"""
+        total = sum(entry["size_bytes"] for entry in self._entries.values())
+
+        for pdf_id in sorted(self._entries, key=lambda key: self._entries[key]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if self.in_use(pdf_id):
+                continue
+
+            total -= self._entries.pop(pdf_id)["size_bytes"]
+            shutil.rmtree(os.path.join(self.cache_dir, pdf_id), ignore_errors=True)
+            self.evictions += 1
+
+    def get(self, pdf_id, version):
+        """
+        Get the local index directory for a PDF if it matches the given version
+
+        Args:
+            pdf_id: ID of the PDF
+            version: Current version tag of the stored index, or None to skip revalidation
+                (e.g. when Azure Storage cannot be reached)
+
+        Returns:
+            str: Path to the cached faiss_index directory, or None on a miss or a stale copy
+        """
+        with self._lock:
+            self._load_entries()
+            entry = self._entries.get(pdf_id)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if version is not None and entry["version"] != version:
+                self.stale += 1
+                return None
+
+            entry["last_used"] = time.time()
+            self._write_entry(pdf_id, entry)
+            self.hits += 1
+            return os.path.join(self.cache_dir, pdf_id, "faiss_index")
+
+    def put(self, pdf_id, faiss_dir, version):
+        """
+        Copy a saved FAISS index into the cache
+
+        Returns:
+            str: Path to the cached faiss_index directory, or None if it is too large to keep
+        """
+        # Copy outside the lock, then swap it in with a rename
+        staging_dir = os.path.join(self.cache_dir, f".staging-{uuid.uuid4()}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        shutil.copytree(faiss_dir, os.path.join(staging_dir, "faiss_index"))
+
+        entry = {
+            "version": version,
+            "size_bytes": _directory_size(staging_dir),
+            "last_used": time.time()
+        }
+
+        # Written before the rename, so a directory without entry.json is never a complete entry
+        self._write_entry(pdf_id, entry, os.path.join(staging_dir, "entry.json"))
+
+        with self._lock:
+            self._load_entries()
+
+            target_dir = os.path.join(self.cache_dir, pdf_id)
+            if not self._retire(pdf_id):
+                # The loaded copy cannot be moved; the caller loads from its own directory
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return None
+
+            self._entries.pop(pdf_id, None)
+            os.replace(staging_dir, target_dir)
+
+            self._entries[pdf_id] = entry
+            self._evict()
+
+            if pdf_id not in self._entries:
+                return None
+            return os.path.join(target_dir, "faiss_index")
+
+    def remove(self, pdf_id):
+        """Remove a PDF's cached index (deferred until release() if it is loaded)"""
+        with self._lock:
+            self._load_entries()
+            self._entries.pop(pdf_id, None)
+            self._retire(pdf_id)
+
+    def release(self, pdf_id):
+        """Note that a PDF's index was unloaded, deleting its retired copies and evicting if over the cap"""
+        with self._lock:
+            self._load_entries()
+            self._purge_retired(pdf_id)
+            self._evict()
+
+    def get_stats(self):
+        """Get hit/miss counters and disk usage"""
+        with self._lock:
+            self._load_entries()
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry["size_bytes"] for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale": self.stale,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+# Process-wide cache used by get_pdf_retriever
+index_disk_cache = IndexDiskCache()
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import time
+import shutil
+
+# Earlier versions kept next to the current one, for rollback
+CORPUS_INDEX_KEEP_VERSIONS = int(os.environ.get("CORPUS_INDEX_KEEP_VERSIONS", "2"))
+
+VERSION_FILE = "version.json"
+
+# Names the version directory loaders should read; replaced atomically on publish
+CURRENT_FILE = "CURRENT"
+
+_VERSION_DIR_PATTERN = re.compile(r"^v(\d+)$")
+
+# Ioctl that makes a file share another's extents (btrfs, XFS, and other copy-on-write filesystems)
+_FICLONE = 0x40049409
+
+def resolve_index_dir(index_dir):
+    """
+    Get the directory holding the files of an index's current version
+
+    A versioned index directory holds v<N>/ subdirectories and a CURRENT file
+    naming one of them. Index directories without CURRENT (per-PDF indexes,
+    and corpus indexes written before versioning) hold the files themselves.
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r") as f:
+            name = f.read().strip()
+    except OSError:
+        return index_dir
+    return os.path.join(index_dir, name)
+
+def version_dir(index_dir, version):
+    return os.path.join(index_dir, f"v{version}")
+
+def list_versions(index_dir):
+    """Version numbers with a directory under index_dir, oldest first"""
+    if not os.path.isdir(index_dir):
+        return []
+    versions = []
+    for name in os.listdir(index_dir):
+        match = _VERSION_DIR_PATTERN.match(name)
+        if match and os.path.isdir(os.path.join(index_dir, name)):
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+def read_version(index_dir):
+    """Get the version record of an index's current version (version 0 if it has none)"""
+    try:
+        with open(os.path.join(resolve_index_dir(index_dir), VERSION_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"version": 0}
+
+def staging_dir(index_dir):
+    """Empty directory to write the next version of an index in, and its version number"""
+    # Versions rolled back from keep their numbers, so the next one comes after all of them
+    version = max([read_version(index_dir)["version"]] + list_versions(index_dir)) + 1
+    path = f"{version_dir(index_dir, version)}.staging"
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    return path, version
+
+def clone_file(source_path, target_path):
+    """
+    Copy a file, sharing its blocks where the filesystem supports copy-on-write clones
+
+    On btrfs, XFS and similar the clone takes constant time and no extra space
+    until either copy is written to; elsewhere the file is copied.
+    """
+    try:
+        import fcntl
+        with open(source_path, "rb") as source, open(target_path, "wb") as target:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        shutil.copystat(source_path, target_path)
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(source_path, target_path)
+
+def _write_current(index_dir, name):
+    temp_path = os.path.join(index_dir, f"{CURRENT_FILE}.tmp")
+    with open(temp_path, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, os.path.join(index_dir, CURRENT_FILE))
+
+def _unversioned_files(index_dir):
+    """Files of an index written before versioning, which loaders read until CURRENT exists"""
+    if not os.path.isdir(index_dir) or os.path.exists(os.path.join(index_dir, CURRENT_FILE)):
+        return []
+    return [name for name in os.listdir(index_dir) if os.path.isfile(os.path.join(index_dir, name))]
+
+def publish_version(index_dir, staged_path, record):
+    """
+    Make a fully written index directory the current version of index_dir
+
+    The directory becomes <index_dir>/v<N> and CURRENT is then replaced in one
+    rename, so loaders always find a complete version. Versions more than
+    CORPUS_INDEX_KEEP_VERSIONS behind are deleted; processes that loaded them
+    keep their open files.
+    """
+    record = dict(record, updated=time.time())
+    with open(os.path.join(staged_path, VERSION_FILE), "w") as f:
+        json.dump(record, f)
+
+    unversioned = _unversioned_files(index_dir)
+    unversioned_version = read_version(index_dir)["version"]
+
+    target_dir = version_dir(index_dir, record["version"])
+    if os.path.exists(target_dir):
+        shutil.rmtree(target_dir)
+    os.replace(staged_path, target_dir)
+    _write_current(index_dir, os.path.basename(target_dir))
+
+    if unversioned:
+        # Keep the files loaders read until now as the previous version, for rollback
+        previous_dir = version_dir(index_dir, unversioned_version)
+        os.makedirs(previous_dir, exist_ok=True)
+        for name in unversioned:
+            os.replace(os.path.join(index_dir, name), os.path.join(previous_dir, name))
+
+    _prune_versions(index_dir, record["version"])
+
+def _prune_versions(index_dir, current_version):
+    for version in list_versions(index_dir):
+        if version < current_version - CORPUS_INDEX_KEEP_VERSIONS:
+            shutil.rmtree(version_dir(index_dir, version), ignore_errors=True)
+
+def rollback(index_dir):
+    """
+    Make the newest version older than the current one current again
+
+    Returns:
+        int: The version rolled back to
+    """
+    current_version = read_version(index_dir)["version"]
+    older = [version for version in list_versions(index_dir) if version < current_version]
+    if not older:
+        raise Exception(f"No previous version of {index_dir} to roll back to")
+
+    _write_current(index_dir, os.path.basename(version_dir(index_dir, older[-1])))
+    return older[-1]
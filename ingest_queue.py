@@ -0,0 +1,154 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pdf_processor import process_pdf
+
+# Number of PDFs processed at the same time
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+
+# How long finished jobs stay available to the status endpoint
+INGEST_JOB_RETENTION_SECONDS = int(os.environ.get("INGEST_JOB_RETENTION_SECONDS", "3600"))
+
+# Share of the total work done in each stage, used to estimate overall progress
+STAGE_WEIGHTS = {
+    "parse": 0.30,
+    "chunk": 0.05,
+    "embed": 0.50,
+    "upload": 0.15
+}
+STAGES = ["parse", "chunk", "embed", "upload"]
+
+# Worker pool and job table
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _overall_progress(stage, done, total):
+    """Estimate the fraction of the whole job that is complete"""
+    completed = sum(STAGE_WEIGHTS[name] for name in STAGES[:STAGES.index(stage)])
+    stage_fraction = done / total if total else 0.0
+    return completed + STAGE_WEIGHTS[stage] * stage_fraction
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job:
+            job.update(fields)
+            job["updated_at"] = time.time()
+
+def _remove_old_jobs():
+    """Forget finished jobs older than the retention period"""
+    now = time.time()
+    with _jobs_lock:
+        for job_id in list(_jobs):
+            job = _jobs[job_id]
+            if job["status"] in ("completed", "failed") and now - job["updated_at"] > INGEST_JOB_RETENTION_SECONDS:
+                del _jobs[job_id]
+
+def _run_job(job_id, pdf_path, filename, on_complete, cleanup_dir, uploader_id):
+    """Process one queued PDF, recording progress in the job table"""
+    started_at = time.time()
+    _update_job(job_id, status="running", started_at=started_at)
+
+    def report(stage, done, total):
+        progress = _overall_progress(stage, done, total)
+        elapsed = time.time() - started_at
+
+        fields = {
+            "stage": stage,
+            "stage_done": done,
+            "stage_total": total,
+            "progress": round(progress, 3),
+            "eta_seconds": round(elapsed * (1 - progress) / progress, 1) if progress > 0 else None
+        }
+        if stage == "parse":
+            fields["pages_done"] = done
+            fields["page_count"] = total
+
+        _update_job(job_id, **fields)
+
+    try:
+        pdf_data = process_pdf(pdf_path, filename, report, uploader_id)
+
+        # The retriever is in memory now, so the PDF can be queried
+        _update_job(job_id, stage="commit", progress=0.99, eta_seconds=0)
+        if on_complete:
+            on_complete(pdf_data)
+
+        _update_job(
+            job_id,
+            status="completed",
+            progress=1.0,
+            eta_seconds=0,
+            result=pdf_data,
+            finished_at=time.time()
+        )
+        print(f"Ingestion job {job_id} completed in {round(time.time() - started_at, 1)}s")
+
+    except Exception as e:
+        _update_job(job_id, status="failed", error=str(e), finished_at=time.time())
+        print(f"Ingestion job {job_id} failed: {str(e)}")
+
+    finally:
+        if cleanup_dir:
+            shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+def submit_pdf_job(pdf_path, filename, on_complete=None, cleanup_dir=None, uploader_id=None):
+    """
+    Queue a PDF saved on disk for background processing
+
+    Args:
+        pdf_path: Path to the saved PDF
+        filename: Name to store the PDF under
+        on_complete: Optional function called with the PDF metadata once it can be queried
+        cleanup_dir: Optional directory to delete when the job finishes
+        uploader_id: ID of the uploader taking a reference to the PDF (see process_pdf)
+
+    Returns:
+        str: The job ID
+    """
+    _remove_old_jobs()
+
+    job_id = str(uuid.uuid4())
+    now = time.time()
+
+    with _jobs_lock:
+        _jobs[job_id] = {
+            "id": job_id,
+            "filename": filename,
+            "size_bytes": os.path.getsize(pdf_path),
+            "status": "queued",
+            "stage": None,
+            "stage_done": 0,
+            "stage_total": None,
+            "pages_done": 0,
+            "page_count": None,
+            "progress": 0.0,
+            "eta_seconds": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+
+    _executor.submit(_run_job, job_id, pdf_path, filename, on_complete, cleanup_dir, uploader_id)
+    return job_id
+
+def get_job(job_id):
+    """Get a copy of a job's status, or None if it is unknown"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+def get_pending_job_count():
+    """Get the number of jobs that are queued or running"""
+    with _jobs_lock:
+        return sum(1 for job in _jobs.values() if job["status"] in ("queued", "running"))
+
+def get_pending_job_bytes():
+    """Get the total size of the PDFs in jobs that are queued or running"""
+    with _jobs_lock:
+        return sum(job["size_bytes"] for job in _jobs.values() if job["status"] in ("queued", "running"))
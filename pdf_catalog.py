@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from azure.core.exceptions import ResourceNotFoundError
+from blob_pool import get_container_client, blob_timeout
+from index_bundle import bundle_blob_name
+
+# Maximum number of per-PDF metadata records kept in memory
+PDF_METADATA_CACHE_MAX_ENTRIES = int(os.environ.get("PDF_METADATA_CACHE_MAX_ENTRIES", "1000"))
+
+# How long a lookup of a missing PDF is remembered
+PDF_METADATA_MISS_TTL_SECONDS = int(os.environ.get("PDF_METADATA_MISS_TTL_SECONDS", "30"))
+
+# How long the catalogue is served from memory before the container is listed again
+PDF_CATALOG_TTL_SECONDS = int(os.environ.get("PDF_CATALOG_TTL_SECONDS", "60"))
+
+def pdf_blob_metadata(page_count, chunk_count, content_hash):
+    """Blob metadata stored on each uploaded PDF, so the catalogue needs no per-PDF reads"""
+    return {
+        "page_count": str(page_count),
+        "chunk_count": str(chunk_count),
+        "content_hash": content_hash or ""
+    }
+
+def build_pdf_catalog(container_client):
+    """
+    Build the PDF catalogue from a single listing of pdfs/
+
+    Page and chunk counts come from the metadata stored on each PDF blob;
+    PDFs uploaded before it was recorded report 0 pages.
+
+    Returns:
+        list: One dict per PDF with id, filename, page_count, chunk_count,
+            content_hash, size_bytes, created_at and has_faiss_index
+    """
+    pdfs = {}
+    index_ids = set()
+
+    blobs = container_client.list_blobs(name_starts_with="pdfs/", include=["metadata"], **blob_timeout("list"))
+    for blob in blobs:
+        # Blob names are pdfs/{pdf_id}/...
+        parts = blob.name.split('/')
+        if len(parts) < 3:
+            continue
+        pdf_id = parts[1]
+
+        if blob.name == bundle_blob_name(pdf_id) or parts[2] == "faiss_index":
+            index_ids.add(pdf_id)
+            continue
+
+        # The PDF itself sits directly under its ID
+        if len(parts) != 3 or not blob.name.lower().endswith('.pdf') or pdf_id in pdfs:
+            continue
+
+        metadata = blob.metadata or {}
+        pdfs[pdf_id] = {
+            "id": pdf_id,
+            "filename": parts[2],
+            "page_count": int(metadata.get("page_count", 0)),
+            "chunk_count": int(metadata.get("chunk_count", 0)),
+            "content_hash": metadata.get("content_hash") or None,
+            "size_bytes": blob.size,
+            "created_at": blob.creation_time.strftime("%Y-%m-%dT%H:%M:%S") if blob.creation_time else None
+        }
+
+    for pdf_id, pdf in pdfs.items():
+        pdf["has_faiss_index"] = pdf_id in index_ids
+
+    return list(pdfs.values())
+
+class PdfCatalogCache:
+    """In-process cache of the PDF catalogue, refreshed after a TTL or when invalidated"""
+
+    def __init__(self, ttl_seconds=PDF_CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._pdfs = None
+        self._loaded_at = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+
+    def get(self, container_client=None):
+        """
+        Get the catalogue, listing the container only when the cached copy is missing or expired
+
+        Returns:
+            list: The catalogue entries (see build_pdf_catalog)
+        """
+        with self._lock:
+            if self._pdfs is not None and time.time() - self._loaded_at < self.ttl_seconds:
+                self.hits += 1
+                return list(self._pdfs)
+            generation = self._generation
+
+        container_client = container_client or get_container_client()
+        if not container_client:
+            return []
+
+        pdfs = build_pdf_catalog(container_client)
+
+        with self._lock:
+            self.refreshes += 1
+            # Don't cache a listing that an upload or delete may have made out of date meanwhile
+            if generation == self._generation:
+                self._pdfs = pdfs
+                self._loaded_at = time.time()
+
+        return list(pdfs)
+
+    def find(self, pdf_id):
+        """Get a PDF's entry from the cached catalogue without listing, or None if it is not cached"""
+        with self._lock:
+            if self._pdfs is None or time.time() - self._loaded_at >= self.ttl_seconds:
+                return None
+            return next((dict(pdf) for pdf in self._pdfs if pdf["id"] == pdf_id), None)
+
+    def invalidate(self):
+        """Drop the cached catalogue, e.g. after an upload or delete"""
+        with self._lock:
+            self._pdfs = None
+            self._generation += 1
+
+    def get_stats(self):
+        """Get hit/refresh counters and the age of the cached catalogue"""
+        with self._lock:
+            return {
+                "cached": self._pdfs is not None,
+                "entries": len(self._pdfs) if self._pdfs is not None else 0,
+                "age_seconds": round(time.time() - self._loaded_at, 1) if self._pdfs is not None else None,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "refreshes": self.refreshes
+            }
+
+def read_pdf_metadata(container_client, pdf_id):
+    """
+    Read one PDF's metadata from storage
+
+    Reads the metadata.json record written at ingestion; PDFs uploaded before
+    it existed fall back to listing their own prefix.
+
+    Returns:
+        dict: The PDF's id, filename and page_count (plus any recorded counts), or None if it does not exist
+    """
+    try:
+        downloader = container_client.download_blob(f"pdfs/{pdf_id}/metadata.json", **blob_timeout("metadata"))
+        return json.loads(downloader.readall())
+    except ResourceNotFoundError:
+        pass
+
+    blobs = container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/", include=["metadata"], **blob_timeout("list"))
+    for blob in blobs:
+        parts = blob.name.split('/')
+        if len(parts) == 3 and blob.name.lower().endswith('.pdf'):
+            metadata = blob.metadata or {}
+            return {
+                "id": pdf_id,
+                "filename": parts[2],
+                "page_count": int(metadata.get("page_count", 0))
+            }
+
+    return None
+
+class PdfMetadataCache:
+    """
+    Thread-safe LRU cache of per-PDF metadata records
+
+    A PDF's metadata does not change after ingestion, so records stay until
+    evicted or invalidated; lookups of missing PDFs are remembered briefly.
+    """
+
+    def __init__(self, max_entries=PDF_METADATA_CACHE_MAX_ENTRIES, miss_ttl_seconds=PDF_METADATA_MISS_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self._entries = OrderedDict()
+        self._misses = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reads = 0
+
+    def put(self, pdf_id, metadata):
+        """Store a PDF's metadata record"""
+        with self._lock:
+            self._misses.pop(pdf_id, None)
+            self._entries[pdf_id] = dict(metadata)
+            self._entries.move_to_end(pdf_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, pdf_id, container_client=None):
+        """
+        Get a PDF's metadata, reading at most that PDF's own record from storage
+
+        Returns:
+            dict: The metadata record, or None if the PDF does not exist
+        """
+        with self._lock:
+            metadata = self._entries.get(pdf_id)
+            if metadata is not None:
+                self._entries.move_to_end(pdf_id)
+                self.hits += 1
+                return dict(metadata)
+
+            missed_at = self._misses.get(pdf_id)
+            if missed_at is not None and time.time() - missed_at < self.miss_ttl_seconds:
+                self.hits += 1
+                return None
+
+            self.misses += 1
+
+        # A fresh catalogue already has the record
+        metadata = pdf_catalog.find(pdf_id)
+
+        if metadata is None:
+            container_client = container_client or get_container_client()
+            if not container_client:
+                return None
+
+            self.reads += 1
+            metadata = read_pdf_metadata(container_client, pdf_id)
+
+        if metadata is None:
+            now = time.time()
+            with self._lock:
+                # Drop expired misses so lookups of unknown IDs cannot grow the table forever
+                for key in [key for key, missed_at in self._misses.items() if now - missed_at >= self.miss_ttl_seconds]:
+                    del self._misses[key]
+                self._misses[pdf_id] = now
+            return None
+
+        self.put(pdf_id, metadata)
+        return dict(metadata)
+
+    def invalidate(self, pdf_id):
+        """Forget a PDF's metadata, e.g. after it is deleted"""
+        with self._lock:
+            self._entries.pop(pdf_id, None)
+            self._misses.pop(pdf_id, None)
+
+    def get_stats(self):
+        """Get hit/miss counters and the number of storage reads"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "storage_reads": self.reads
+            }
+
+# Process-wide caches used by the PDF endpoints
+pdf_catalog = PdfCatalogCache()
+pdf_metadata_cache = PdfMetadataCache()
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pypdf import PdfReader
+from langchain.docstore.document import Document
+
+# Number of processes used to extract page text
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+
+# PDFs with fewer pages than this are extracted in-process, where a pool would cost more than it saves
+PDF_EXTRACT_MIN_PARALLEL_PAGES = int(os.environ.get("PDF_EXTRACT_MIN_PARALLEL_PAGES", "32"))
+
+# Shared process pool, created on first use
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+def _get_pool(workers):
+    """Get the shared process pool, recreating it if the worker count changed"""
+    global _pool, _pool_workers
+
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+
+            # Spawn rather than fork: the parent may be running threads and holding the embeddings model
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+
+        return _pool
+
+def init_worker_process(embedding_threads):
+    """
+    Prepare a process that extracts and embeds whole PDFs (a ProcessPoolExecutor initializer)
+
+    PDFs are already processed in parallel across such processes, so each one
+    extracts its pages sequentially, and it loads its embeddings model before
+    taking any PDFs.
+    """
+    global PDF_EXTRACT_WORKERS
+    PDF_EXTRACT_WORKERS = 1
+
+    import embedding_engine
+    embedding_engine.get_engine(num_threads=embedding_threads)
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end) from a PDF"""
+    reader = PdfReader(pdf_path)
+    return start, [reader.pages[page].extract_text() for page in range(start, end)]
+
+def _to_documents(pdf_path, texts):
+    # Same content and metadata as langchain's PyPDFLoader
+    return [
+        Document(page_content=text, metadata={"source": pdf_path, "page": page})
+        for page, text in enumerate(texts)
+    ]
+
+def load_pdf_pages(pdf_path, workers=None, progress_callback=None):
+    """
+    Extract the pages of a PDF as langchain Documents, in parallel for large PDFs
+
+    Page ranges are extracted in separate processes and merged back in page
+    order, so the "page" metadata matches PyPDFLoader.
+
+    Args:
+        pdf_path: Path to the PDF
+        workers: Number of processes (defaults to PDF_EXTRACT_WORKERS)
+        progress_callback: Optional function called as progress_callback(pages_done, page_count)
+
+    Returns:
+        list: One Document per page
+    """
+    workers = workers or PDF_EXTRACT_WORKERS
+    page_count = len(PdfReader(pdf_path).pages)
+
+    # Small PDFs and single-worker setups are extracted sequentially
+    if workers <= 1 or page_count < PDF_EXTRACT_MIN_PARALLEL_PAGES:
+        reader = PdfReader(pdf_path)
+        texts = []
+        for page in reader.pages:
+            texts.append(page.extract_text())
+            if progress_callback:
+                progress_callback(len(texts), page_count)
+        return _to_documents(pdf_path, texts)
+
+    # Several ranges per worker keep all processes busy when some pages are slower than others
+    range_size = max(1, math.ceil(page_count / (workers * 4)))
+    ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+
+    pool = _get_pool(workers)
+    futures = [pool.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
+
+    texts = [None] * page_count
+    pages_done = 0
+    for future in as_completed(futures):
+        start, range_texts = future.result()
+        texts[start:start + len(range_texts)] = range_texts
+
+        pages_done += len(range_texts)
+        if progress_callback:
+            progress_callback(pages_done, page_count)
+
+    return _to_documents(pdf_path, texts)
+
+def benchmark(pdf_path, workers=None):
+    """Compare sequential and parallel extraction speed on a PDF"""
+    workers = workers or PDF_EXTRACT_WORKERS
+
+    start_time = time.time()
+    sequential = load_pdf_pages(pdf_path, workers=1)
+    sequential_seconds = time.time() - start_time
+
+    # Start the pool before timing so process start-up is not counted against every run
+    _get_pool(workers)
+
+    start_time = time.time()
+    parallel = load_pdf_pages(pdf_path, workers=workers)
+    parallel_seconds = time.time() - start_time
+
+    identical = [doc.page_content for doc in sequential] == [doc.page_content for doc in parallel]
+    page_count = len(sequential)
+
+    print(f"Extracted {page_count} pages from {os.path.basename(pdf_path)}")
+    print(f"  sequential:            {page_count / sequential_seconds:.1f} pages/sec ({sequential_seconds:.2f}s)")
+    print(f"  parallel ({workers} workers): {page_count / parallel_seconds:.1f} pages/sec ({parallel_seconds:.2f}s)")
+    print(f"  speedup: {sequential_seconds / parallel_seconds:.2f}x, identical text: {'Yes' if identical else 'No'}")
+
+    return {
+        "page_count": page_count,
+        "workers": workers,
+        "sequential_pages_per_sec": round(page_count / sequential_seconds, 1),
+        "parallel_pages_per_sec": round(page_count / parallel_seconds, 1),
+        "identical": identical
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "benchmark":
+        print("Usage: python pdf_extract.py benchmark <pdf_path> [workers]")
+        sys.exit(1)
+
+    benchmark(sys.argv[2], int(sys.argv[3]) if len(sys.argv) >= 4 else None)
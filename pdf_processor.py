@@ -1,22 +1,59 @@
 import os
+import json
+import time
 import uuid
 import tempfile
 import shutil
-from langchain.document_loaders import PyPDFLoader
+from contextlib import contextmanager
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from azure.storage.blob import BlobServiceClient
+from blob_pool import get_container_client, blob_timeout
 from dotenv import load_dotenv
+from embedding_service import get_query_embeddings
+from embedding_engine import create_vector_store
+from answer_cache import answer_cache
+from pdf_extract import load_pdf_pages
+from content_hash import compute_file_hash
+from index_bundle import upload_pdf_index, download_pdf_index, get_pdf_index_version
+from index_disk_cache import index_disk_cache
+from chunk_store import save_faiss_index
+from faiss_loader import load_faiss_index
+from hybrid_retriever import make_retriever
+from shared_pdf_index import shared_pdf_index, use_shared_index
+from retriever_cache import RetrieverCache
+from pdf_catalog import pdf_catalog, pdf_metadata_cache, pdf_blob_metadata
+from pdf_references import register_pdf_hash, find_pdf_by_hash, add_pdf_reference, release_pdf_reference
 
 # Load environment variables
 load_dotenv()
 
-# Dictionary to store active PDF retrievers
-active_pdf_retrievers = {}
+# Loaded PDF retrievers, bounded by estimated memory with LRU eviction; the shared index's memory comes out of the same budget
+active_pdf_retrievers = RetrieverCache(on_unload=index_disk_cache.release, reserved_bytes=shared_pdf_index.memory_bytes)
 
-def process_pdf(pdf_file, filename):
-    """Process a PDF file and create a FAISS index for it"""
+# Loaded retrievers read their cached index files, so those are kept on disk until unloaded
+index_disk_cache.in_use = active_pdf_retrievers.__contains__
+
+def process_pdf(pdf_file, filename, progress_callback=None, uploader_id=None):
+    """
+    Process a PDF file and create a FAISS index for it
+    
+    If a PDF with identical content (by SHA-256) was processed before, the
+    uploader's reference to it is added and its ID is returned without
+    reprocessing.
+    
+    Args:
+        pdf_file: Uploaded file object, or path to a PDF already saved on disk
+        filename: Name to store the PDF under
+        progress_callback: Optional function called as progress_callback(stage, done, total)
+            for the parse, chunk, embed and upload stages
+        uploader_id: ID of the uploader (browser session) holding a reference to the PDF,
+            or None to add it without one
+    
+    Returns:
+        dict: The PDF ID and metadata
+    """
+    # Ignore progress reports when nobody is listening
+    report = progress_callback or (lambda stage, done, total: None)
+    
     # Generate a unique ID for this PDF
     pdf_id = str(uuid.uuid4())
     
@@ -25,48 +62,51 @@ def process_pdf(pdf_file, filename):
     pdf_path = os.path.join(temp_dir, filename)
     
     # Save the PDF file temporarily
-    pdf_file.save(pdf_path)
+    if isinstance(pdf_file, str):
+        shutil.copyfile(pdf_file, pdf_path)
+    else:
+        pdf_file.save(pdf_path)
+    
+    # Connect to Azure Blob Storage
+    connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+    container_name = os.environ.get("BLOB_CONTAINER_NAME")
+    
+    if not connection_string or not container_name:
+        shutil.rmtree(temp_dir)
+        raise Exception("Azure Storage connection string or container name not found in .env file")
+    
+    # Get the shared container client, creating the container if it does not exist
+    container_client = get_container_client(container_name, connection_string, create=True)
+    
+    # Reuse the existing index if identical content was uploaded before
+    content_hash = compute_file_hash(pdf_path)
+    if uploader_id:
+        existing_pdf = add_pdf_reference(content_hash, uploader_id, container_client)
+    else:
+        existing_pdf = find_pdf_by_hash(content_hash, container_client)
+    if existing_pdf:
+        print(f"Reusing existing PDF {existing_pdf['id']} for {filename} (same content)")
+        shutil.rmtree(temp_dir)
+        return existing_pdf
     
-    # Process the PDF
-    loader = PyPDFLoader(pdf_path)
-    documents = loader.load()
+    # Extract the pages, in parallel for large PDFs
+    documents = load_pdf_pages(pdf_path, progress_callback=lambda done, total: report("parse", done, total))
     
     # Split the documents into chunks
+    report("chunk", 0, 1)
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200
     )
     chunks = text_splitter.split_documents(documents)
+    report("chunk", 1, 1)
     
-    # Create embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
-    
-    # Create FAISS index
-    vector_store = FAISS.from_documents(chunks, embeddings)
+    # Create FAISS index with the batched embedding engine
+    vector_store = create_vector_store(chunks, progress_callback=lambda done, total: report("embed", done, total))
     
     # Save the FAISS index locally
     faiss_dir = os.path.join(temp_dir, "faiss_index")
-    vector_store.save_local(faiss_dir)
-    
-    # Upload to Azure Blob Storage
-    connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
-    container_name = os.environ.get("BLOB_CONTAINER_NAME")
-    
-    if not connection_string or not container_name:
-        raise Exception("Azure Storage connection string or container name not found in .env file")
-    
-    # Create the BlobServiceClient
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    
-    # Get container client
-    container_client = blob_service_client.get_container_client(container_name)
-    
-    # Check if container exists, if not create it
-    if not container_client.exists():
-        container_client = blob_service_client.create_container(container_name)
+    save_faiss_index(vector_store, faiss_dir)
     
     # Create a directory for this PDF in user_uploads
     user_upload_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_uploads', pdf_id)
@@ -77,36 +117,59 @@ def process_pdf(pdf_file, filename):
     with open(pdf_path, 'rb') as src, open(user_pdf_path, 'wb') as dst:
         dst.write(src.read())
     
-    # Save FAISS index to user_uploads directory
-    user_faiss_dir = os.path.join(user_upload_dir, 'faiss_index')
-    os.makedirs(user_faiss_dir, exist_ok=True)
-    for file_name in os.listdir(faiss_dir):
-        src_path = os.path.join(faiss_dir, file_name)
-        dst_path = os.path.join(user_faiss_dir, file_name)
-        with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
-            dst.write(src.read())
-    
-    # Upload PDF file to Azure Blob Storage
+    # Upload PDF file to Azure Blob Storage, with the counts the catalogue lists
+    report("upload", 0, 2)
     with open(pdf_path, "rb") as data:
         blob_client = container_client.upload_blob(
             name=f"pdfs/{pdf_id}/{filename}",
             data=data,
-            overwrite=True
+            overwrite=True,
+            metadata=pdf_blob_metadata(len(documents), len(chunks), content_hash),
+            **blob_timeout("upload")
         )
+    report("upload", 1, 2)
     
-    # Upload FAISS index files to Azure Blob Storage
-    for file_name in os.listdir(faiss_dir):
-        file_path = os.path.join(faiss_dir, file_name)
-        with open(file_path, "rb") as data:
-            blob_client = container_client.upload_blob(
-                name=f"pdfs/{pdf_id}/faiss_index/{file_name}",
-                data=data,
-                overwrite=True
-            )
+    # Upload the FAISS index (a single bundle blob unless PDF_INDEX_FORMAT=files)
+    upload_pdf_index(container_client, pdf_id, faiss_dir)
+    report("upload", 2, 2)
     
-    # Create retriever and store in memory
-    retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    active_pdf_retrievers[pdf_id] = retriever
+    # Keep a local copy so reloading after a restart or eviction needs no download
+    try:
+        index_disk_cache.put(pdf_id, faiss_dir, get_pdf_index_version(container_client, pdf_id))
+    except Exception as e:
+        print(f"Could not cache FAISS index locally: {str(e)}")
+    
+    # Upload the PDF's metadata record
+    metadata = {
+        "id": pdf_id,
+        "filename": filename,
+        "page_count": len(documents),
+        "chunk_count": len(chunks),
+        "content_hash": content_hash,
+        "size_bytes": os.path.getsize(pdf_path),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    container_client.upload_blob(
+        name=f"pdfs/{pdf_id}/metadata.json",
+        data=json.dumps(metadata),
+        overwrite=True,
+        **blob_timeout("upload")
+    )
+    
+    # Register the content hash so identical uploads reuse this PDF
+    register_pdf_hash(content_hash, metadata, container_client, uploader_id)
+    
+    # The new PDF must show up in the next listing, and its tab needs no storage read
+    pdf_catalog.invalidate()
+    pdf_metadata_cache.put(pdf_id, metadata)
+    
+    if use_shared_index():
+        # Searched through the shared index, so no per-PDF retriever is kept in memory
+        shared_pdf_index.add_vector_store(pdf_id, vector_store)
+    else:
+        # Create retriever and store in memory
+        retriever = make_retriever(vector_store)
+        active_pdf_retrievers.put(pdf_id, retriever)
     
     # Clean up temporary directory
     shutil.rmtree(temp_dir)
@@ -119,141 +182,226 @@ def process_pdf(pdf_file, filename):
     }
 
 def get_pdf_retriever(pdf_id):
-    """Get a retriever for a specific PDF"""
+    """
+    Get a retriever for a specific PDF
+    
+    Indexes are looked up in memory, then in the local disk cache (revalidated
+    against the stored index's ETag), and only then downloaded from Azure Blob
+    Storage.
+    """
     # Check if retriever is in memory
-    if pdf_id in active_pdf_retrievers:
-        return active_pdf_retrievers[pdf_id]
+    retriever = active_pdf_retrievers.get(pdf_id)
+    if retriever:
+        return retriever
     
-    # If not in memory, try to load from Azure Blob Storage
+    # If not in memory, try the local disk cache and then Azure Blob Storage
     connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
     container_name = os.environ.get("BLOB_CONTAINER_NAME")
     
     if not connection_string or not container_name:
         raise Exception("Azure Storage connection string or container name not found in .env file")
     
-    # Create temporary directory
-    temp_dir = tempfile.mkdtemp()
-    faiss_dir = os.path.join(temp_dir, "faiss_index")
-    os.makedirs(faiss_dir, exist_ok=True)
-    
-    # Create the BlobServiceClient
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+    # Get the shared container client
+    container_client = get_container_client(container_name, connection_string)
     
-    # Get container client
-    container_client = blob_service_client.get_container_client(container_name)
+    # Check the stored index's version so a changed index is never served from disk
+    try:
+        version = get_pdf_index_version(container_client, pdf_id)
+        if version is None:
+            print(f"No FAISS index found for PDF {pdf_id}")
+            index_disk_cache.remove(pdf_id)
+            return None
+    except Exception as e:
+        # Storage is unreachable: a local copy is better than nothing
+        print(f"Could not revalidate FAISS index for PDF {pdf_id}, using local copy if any: {str(e)}")
+        version = None
     
+    temp_dir = None
     try:
-        # Download FAISS index files
-        blobs = container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/faiss_index/")
-        for blob in blobs:
-            file_name = os.path.basename(blob.name)
-            file_path = os.path.join(faiss_dir, file_name)
-            with open(file_path, "wb") as download_file:
-                download_file.write(container_client.download_blob(blob.name).readall())
+        faiss_dir = index_disk_cache.get(pdf_id, version)
         
-        # Create embeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
-        )
+        if faiss_dir is None:
+            if version is None:
+                return None
+            
+            # Download the FAISS index: one GET for a bundle, falling back to loose files for older PDFs
+            temp_dir = tempfile.mkdtemp()
+            download_dir = os.path.join(temp_dir, "faiss_index")
+            if not download_pdf_index(container_client, pdf_id, download_dir):
+                raise Exception(f"No FAISS index found for PDF {pdf_id}")
+            
+            # Load from the cache, or from the download if it is too large to cache
+            faiss_dir = index_disk_cache.put(pdf_id, download_dir, version) or download_dir
+        
+        # Get the shared embeddings model
+        embeddings = get_query_embeddings()
         
         # Load the FAISS index
-        vector_store = FAISS.load_local(faiss_dir, embeddings)
+        vector_store = load_faiss_index(faiss_dir, embeddings, label="pdf", index_type="flat")
         
         # Create retriever and store in memory
-        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-        active_pdf_retrievers[pdf_id] = retriever
-        
-        # Clean up temporary directory
-        shutil.rmtree(temp_dir)
+        retriever = make_retriever(vector_store)
+        active_pdf_retrievers.put(pdf_id, retriever)
         
         return retriever
     
     except Exception as e:
-        # Clean up temporary directory
-        shutil.rmtree(temp_dir)
         print(f"Error loading PDF retriever: {str(e)}")
         return None
-
-def delete_pdf(pdf_id):
-    """Delete a PDF and its FAISS index"""
-    # Remove from memory
-    if pdf_id in active_pdf_retrievers:
-        del active_pdf_retrievers[pdf_id]
     
-    # Remove from Azure Blob Storage
-    connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
-    container_name = os.environ.get("BLOB_CONTAINER_NAME")
+    finally:
+        # Clean up temporary directory (a retriever loaded from it already holds its files open)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+@contextmanager
+def pinned_pdf_retriever(pdf_id):
+    """
+    Get a PDF's retriever and keep it from being evicted for the duration of the block
+    
+    Yields None if the retriever could not be loaded.
+    """
+    retriever = get_pdf_retriever(pdf_id)
+    pinned = retriever is not None and active_pdf_retrievers.pin(pdf_id)
+    try:
+        yield retriever
+    finally:
+        if pinned:
+            active_pdf_retrievers.unpin(pdf_id)
+
+def search_pdfs(question, pdf_ids, k=5):
+    """
+    Find the chunks most relevant to a question in one or more PDFs
+    
+    With PDF_INDEX_MODE=shared this is a single search of the shared index,
+    filtered to the given PDFs (PDFs not yet in it are added from their own
+    index first). Otherwise each PDF's retriever is searched and the hits are
+    merged by distance.
+    
+    Returns:
+        list: The relevant Documents, or None if a PDF's index could not be loaded
+    """
+    if use_shared_index():
+        for pdf_id in pdf_ids:
+            if not shared_pdf_index.contains(pdf_id):
+                # Uploaded before the shared index was enabled
+                retriever = get_pdf_retriever(pdf_id)
+                if not retriever:
+                    return None
+                shared_pdf_index.add_vector_store(pdf_id, retriever.vectorstore)
+                active_pdf_retrievers.remove(pdf_id)
+        
+        return shared_pdf_index.search(question, pdf_ids, k)
+    
+    if len(pdf_ids) == 1:
+        with pinned_pdf_retriever(pdf_ids[0]) as retriever:
+            return retriever.get_relevant_documents(question) if retriever else None
+    
+    scored_docs = []
+    for pdf_id in pdf_ids:
+        with pinned_pdf_retriever(pdf_id) as retriever:
+            if not retriever:
+                return None
+            for doc, score in retriever.vectorstore.similarity_search_with_score(question, k=k):
+                doc.metadata["pdf_id"] = pdf_id
+                scored_docs.append((score, doc))
+    
+    # Scores are L2 distances, so smaller is more similar
+    scored_docs.sort(key=lambda item: item[0])
+    return [doc for _, doc in scored_docs[:k]]
+
+def delete_pdf(pdf_id, uploader_id=None):
+    """
+    Release an uploader's reference to a PDF, deleting it and its FAISS index with the last reference
+    
+    Returns:
+        str: "deleted" if the PDF's data was removed, "in_use" if other
+        uploaders still refer to it (nothing is deleted), or None on error
+    """
+    # Keep shared data while other uploads of the same content still refer to it
+    container_client = get_container_client()
+    if not container_client:
+        return None
     
-    if not connection_string or not container_name:
-        return False
+    try:
+        if release_pdf_reference(pdf_id, uploader_id, container_client):
+            print(f"PDF {pdf_id} is still used by other uploaders, keeping its data")
+            return "in_use"
+    except Exception as e:
+        print(f"Error releasing PDF reference: {str(e)}")
+        return None
     
-    # Create the BlobServiceClient
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+    # Remove from memory and from the shared index
+    active_pdf_retrievers.remove(pdf_id)
+    if use_shared_index():
+        shared_pdf_index.remove_pdf(pdf_id)
     
-    # Get container client
-    container_client = blob_service_client.get_container_client(container_name)
+    # Drop cached answers and the local index copy for this PDF
+    answer_cache.invalidate(pdf_id)
+    index_disk_cache.remove(pdf_id)
     
     try:
         # Delete all blobs with the PDF ID prefix
-        blobs = container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/")
+        blobs = container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/", **blob_timeout("list"))
         for blob in blobs:
-            container_client.delete_blob(blob.name)
+            container_client.delete_blob(blob.name, **blob_timeout("delete"))
         
-        return True
+        pdf_catalog.invalidate()
+        pdf_metadata_cache.invalidate(pdf_id)
+        return "deleted"
     
     except Exception as e:
         print(f"Error deleting PDF: {str(e)}")
-        return False
+        return None
 
 def get_active_pdf_count():
-    """Get the number of active PDFs"""
+    """Get the number of PDFs whose retrievers are loaded"""
     return len(active_pdf_retrievers)
 
+def get_retriever_cache_stats():
+    """Get memory usage and eviction metrics of the loaded PDF retrievers"""
+    return active_pdf_retrievers.get_stats()
+
+def get_pdf_metadata(pdf_id):
+    """Get one PDF's metadata (id, filename, page_count, ...) from the shared cache, or None if it does not exist"""
+    connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+    container_name = os.environ.get("BLOB_CONTAINER_NAME")
+    
+    if not connection_string or not container_name:
+        return None
+    
+    try:
+        return pdf_metadata_cache.get(pdf_id, get_container_client(container_name, connection_string))
+    except Exception as e:
+        print(f"Error reading PDF metadata: {str(e)}")
+        return None
+
+def can_admit_pdf(estimated_bytes):
+    """Check whether a PDF index of the estimated size fits the retriever memory budget"""
+    return active_pdf_retrievers.can_admit(estimated_bytes)
+
 def list_pdfs_from_blob():
-    """List all PDFs from Azure Blob Storage"""
+    """List all PDFs from Azure Blob Storage, served from the cached catalogue"""
     connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
     container_name = os.environ.get("BLOB_CONTAINER_NAME")
     
     if not connection_string or not container_name:
         return []
     
-    # Create the BlobServiceClient
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    
-    # Get container client
-    container_client = blob_service_client.get_container_client(container_name)
+    # Get the shared container client
+    container_client = get_container_client(container_name, connection_string)
     
     try:
-        # Get all PDF directories
-        pdf_ids = set()
-        blobs = container_client.list_blobs(name_starts_with="pdfs/")
-        
-        for blob in blobs:
-            # Extract PDF ID from path (pdfs/{pdf_id}/...)
-            parts = blob.name.split('/')
-            if len(parts) >= 2:
-                pdf_ids.add(parts[1])
-        
-        # Get metadata for each PDF
-        pdfs = []
-        for pdf_id in pdf_ids:
-            # Find the PDF file
-            pdf_blobs = list(container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/"))
-            pdf_files = [blob for blob in pdf_blobs if not blob.name.startswith(f"pdfs/{pdf_id}/faiss_index/")]
-            
-            if pdf_files:
-                # Get the filename
-                filename = os.path.basename(pdf_files[0].name)
-                
-                pdfs.append({
-                    "id": pdf_id,
-                    "filename": filename,
-                    "page_count": 0  # We don't know the page count without loading
-                })
-        
-        return pdfs
+        # One listing of the container, refreshed at most every PDF_CATALOG_TTL_SECONDS
+        return [
+            {
+                "id": pdf["id"],
+                "filename": pdf["filename"],
+                "page_count": pdf["page_count"]
+            }
+            for pdf in pdf_catalog.get(container_client)
+        ]
     
     except Exception as e:
         print(f"Error listing PDFs: {str(e)}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,162 @@
+import json
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from blob_pool import get_container_client, blob_timeout
+
+def read_json_blob(container_client, blob_name):
+    """Read a JSON blob, returning (data, etag), or (None, None) if it does not exist"""
+    try:
+        downloader = container_client.download_blob(blob_name, **blob_timeout("metadata"))
+        return json.loads(downloader.readall()), downloader.properties.etag
+    except ResourceNotFoundError:
+        return None, None
+
+def register_pdf_hash(content_hash, metadata, container_client, uploader_id=None):
+    """
+    Record that a processed PDF holds the content with the given SHA-256 hash
+
+    The uploader, when known (a browser session), holds the first reference.
+    PDFs added without one (the command line tools) hold none, so any delete
+    removes them unless a later uploader has taken a reference. If another
+    upload of the same content registered first, this PDF is kept as an
+    independent copy.
+    """
+    references = [uploader_id] if uploader_id else []
+    record = {
+        "pdf_id": metadata["id"],
+        "filename": metadata["filename"],
+        "page_count": metadata["page_count"],
+        "chunk_count": metadata.get("chunk_count", 0),
+        "references": references,
+        "ref_count": len(references)
+    }
+
+    try:
+        container_client.upload_blob(
+            name=f"hashes/{content_hash}.json",
+            data=json.dumps(record),
+            overwrite=False,
+            **blob_timeout("upload")
+        )
+    except ResourceExistsError:
+        print(f"Content hash {content_hash} already registered, keeping {metadata['id']} as a separate copy")
+
+def _update_hash_record(container_client, content_hash, update):
+    """
+    Apply update(record) to a hash record with optimistic concurrency
+
+    update returns the new record, or None to leave the record unchanged. A
+    record left without references is deleted.
+
+    Returns:
+        dict: The new record (the unchanged one if update returned None), or
+        None if there was no record
+    """
+    blob_name = f"hashes/{content_hash}.json"
+
+    # Retry when another request changed the record between our read and write
+    for attempt in range(5):
+        record, etag = read_json_blob(container_client, blob_name)
+        if record is None:
+            return None
+
+        # Records written before references were tracked per uploader hold none
+        record.setdefault("references", [])
+
+        new_record = update(dict(record, references=list(record["references"])))
+        if new_record is None:
+            return record
+        new_record["ref_count"] = len(new_record["references"])
+
+        try:
+            if not new_record["references"]:
+                container_client.delete_blob(blob_name, etag=etag, match_condition=MatchConditions.IfNotModified, **blob_timeout("metadata"))
+            else:
+                container_client.upload_blob(
+                    name=blob_name,
+                    data=json.dumps(new_record),
+                    overwrite=True,
+                    etag=etag,
+                    match_condition=MatchConditions.IfNotModified,
+                    **blob_timeout("metadata")
+                )
+            return new_record
+
+        except (ResourceModifiedError, ResourceNotFoundError):
+            continue
+
+    raise Exception(f"Could not update hash record {content_hash} after repeated conflicts")
+
+def _existing_pdf(record):
+    return {
+        "id": record["pdf_id"],
+        "filename": record["filename"],
+        "page_count": record["page_count"],
+        "deduplicated": True
+    }
+
+def find_pdf_by_hash(content_hash, container_client=None):
+    """
+    Find the PDF holding the content with the given SHA-256 hash, without taking a reference
+
+    Returns:
+        dict: The existing PDF's ID, filename, page_count and chunk_count, or None if the content is new
+    """
+    container_client = container_client or get_container_client()
+    if not container_client:
+        return None
+
+    record, _ = read_json_blob(container_client, f"hashes/{content_hash}.json")
+    if not record:
+        return None
+    return dict(_existing_pdf(record), chunk_count=record.get("chunk_count"))
+
+def add_pdf_reference(content_hash, uploader_id, container_client=None):
+    """
+    Add an uploader's reference to the PDF with the given content hash, if one exists
+
+    An uploader holds at most one reference, so uploading the same content
+    again changes nothing.
+
+    Returns:
+        dict: The existing PDF's ID and metadata, or None if the content is new
+    """
+    container_client = container_client or get_container_client()
+    if not container_client:
+        return None
+
+    def add(record):
+        if uploader_id in record["references"]:
+            return None
+        record["references"].append(uploader_id)
+        return record
+
+    record = _update_hash_record(container_client, content_hash, add)
+    return _existing_pdf(record) if record else None
+
+def release_pdf_reference(pdf_id, uploader_id, container_client):
+    """
+    Drop an uploader's reference to a PDF's content
+
+    Releasing is idempotent: an uploader without a reference releases nothing,
+    so repeated deletes cannot drop other uploaders' references.
+
+    Returns:
+        bool: True if other uploaders still hold references and the PDF's data must be kept
+    """
+    metadata, _ = read_json_blob(container_client, f"pdfs/{pdf_id}/metadata.json")
+    if not metadata or not metadata.get("content_hash"):
+        return False
+
+    def release(record):
+        # Only the registered copy is reference counted; independent copies are left alone
+        if record["pdf_id"] != pdf_id:
+            return None
+        if uploader_id in record["references"]:
+            record["references"].remove(uploader_id)
+        elif record["references"]:
+            return None
+        return record
+
+    record = _update_hash_record(container_client, metadata["content_hash"], release)
+    return record is not None and record["pdf_id"] == pdf_id and len(record["references"]) > 0
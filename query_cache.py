@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+# Maximum memory held by cached query vectors (default 16MB, roughly 10,000 questions)
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+def normalize_question(text):
+    """Normalise question text for use as a cache key"""
+    # all-MiniLM-L6-v2 is uncased and ignores repeated whitespace, so these variants embed identically
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query vectors bounded by total size in bytes"""
+
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key, vector):
+        return len(key.encode("utf-8")) + vector.nbytes
+
+    def get(self, key):
+        """Get the vector for a key, or None on a miss"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        """Store a vector, evicting the least recently used entries to stay under the size cap"""
+        vector = np.asarray(vector, dtype=np.float32)
+        size = self._entry_size(key, vector)
+
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entry_size(key, self._entries.pop(key))
+
+            self._entries[key] = vector
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                old_key, old_vector = self._entries.popitem(last=False)
+                self.current_bytes -= self._entry_size(old_key, old_vector)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all cached vectors"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self):
+        """Get hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated queries from a QueryEmbeddingCache
+
+    Vector stores call embed_query for every retrieval, so wrapping their
+    embeddings skips the transformer forward pass on cache hits. Document
+    embedding is passed straight through.
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_question(text)
+
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector.tolist()
+
+        vector = self.embeddings.embed_query(text)
+        self.cache.put(key, vector)
+        return vector
+
+# Process-wide cache shared by every retriever
+query_embedding_cache = QueryEmbeddingCache()
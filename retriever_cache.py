@@ -0,0 +1,210 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# Estimated memory that loaded PDF indexes may use in total (default 1GB)
+RETRIEVER_CACHE_MAX_BYTES = int(os.environ.get("RETRIEVER_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Maximum number of PDF retrievers kept loaded
+RETRIEVER_CACHE_MAX_ENTRIES = int(os.environ.get("RETRIEVER_CACHE_MAX_ENTRIES", "50"))
+
+# Expected index memory per byte of PDF, used to admit uploads before they are processed
+# (text-heavy PDFs come close to 1:1 once chunk overlap and vectors are counted; scanned ones are far below)
+PDF_INDEX_BYTES_PER_PDF_BYTE = float(os.environ.get("PDF_INDEX_BYTES_PER_PDF_BYTE", "1.0"))
+
+# Rough per-chunk overhead of the docstore and id mapping (dict entries, Document objects, ids)
+_PER_CHUNK_OVERHEAD_BYTES = 400
+
+def estimate_retriever_bytes(retriever):
+    """
+    Estimate the memory held by a FAISS retriever
+
+    Counts the stored vector codes, the docstore text and metadata, the BM25
+    index arrays, and a fixed overhead per chunk.
+    """
+    vector_store = retriever.vectorstore
+    index = vector_store.index
+
+    # code_size is the bytes stored per vector (d * 4 for a flat float32 index)
+    code_size = getattr(index, "code_size", index.d * 4)
+    vector_bytes = index.ntotal * code_size
+
+    docstore_bytes = 0
+    documents = getattr(vector_store.docstore, "_dict", {})
+    for doc in documents.values():
+        docstore_bytes += len(doc.page_content.encode("utf-8"))
+        docstore_bytes += len(json.dumps(doc.metadata, default=str))
+
+    bm25_index = getattr(vector_store, "bm25_index", None)
+    bm25_bytes = bm25_index.memory_bytes() if bm25_index is not None else 0
+
+    return vector_bytes + docstore_bytes + bm25_bytes + len(documents) * _PER_CHUNK_OVERHEAD_BYTES
+
+def estimate_pdf_index_bytes(pdf_size_bytes):
+    """Estimate the memory a PDF's index will use once loaded, from the size of the PDF"""
+    return int(pdf_size_bytes * PDF_INDEX_BYTES_PER_PDF_BYTE)
+
+class RetrieverCache:
+    """
+    Thread-safe LRU cache of PDF retrievers bounded by estimated memory and entry count
+
+    Entries pinned by in-flight queries are never evicted; if only pinned
+    entries remain, the cache may exceed its limits until they are unpinned.
+    on_unload(pdf_id) is called, outside the lock, whenever a PDF's retriever
+    leaves the cache (evicted, replaced or removed). reserved_bytes(), if
+    given, returns memory held outside the cache that counts against
+    max_bytes (the shared PDF index), leaving less room for retrievers.
+    """
+
+    def __init__(self, max_bytes=RETRIEVER_CACHE_MAX_BYTES, max_entries=RETRIEVER_CACHE_MAX_ENTRIES, on_unload=None, reserved_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.on_unload = on_unload
+        self.reserved_bytes = reserved_bytes
+        self._entries = OrderedDict()
+        self._pins = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def __contains__(self, pdf_id):
+        with self._lock:
+            return pdf_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, pdf_id):
+        """Get the retriever for a PDF, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(pdf_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(pdf_id)
+            self.hits += 1
+            return entry["retriever"]
+
+    def put(self, pdf_id, retriever):
+        """Store a retriever, evicting least recently used unpinned entries to stay within the limits"""
+        size = estimate_retriever_bytes(retriever)
+
+        with self._lock:
+            old_entry = self._entries.pop(pdf_id, None)
+            if old_entry:
+                self.current_bytes -= old_entry["bytes"]
+
+            self._entries[pdf_id] = {"retriever": retriever, "bytes": size}
+            self.current_bytes += size
+            unloaded = self._evict()
+            if old_entry and old_entry["retriever"] is not retriever:
+                unloaded.append(pdf_id)
+
+        self._notify_unloaded(unloaded)
+
+    def remove(self, pdf_id):
+        """Remove a PDF's retriever, pinned or not"""
+        with self._lock:
+            entry = self._entries.pop(pdf_id, None)
+            if entry:
+                self.current_bytes -= entry["bytes"]
+
+        if entry:
+            self._notify_unloaded([pdf_id])
+
+    def pin(self, pdf_id):
+        """
+        Protect a PDF's retriever from eviction while a query uses it
+
+        Returns:
+            bool: True if the retriever was loaded and is now pinned
+        """
+        with self._lock:
+            if pdf_id not in self._entries:
+                return False
+
+            self._pins[pdf_id] = self._pins.get(pdf_id, 0) + 1
+            self._entries.move_to_end(pdf_id)
+            return True
+
+    def unpin(self, pdf_id):
+        """Release a pin taken with pin(), evicting if the cache went over its limits meanwhile"""
+        with self._lock:
+            count = self._pins.get(pdf_id, 0) - 1
+            if count > 0:
+                self._pins[pdf_id] = count
+            else:
+                self._pins.pop(pdf_id, None)
+            unloaded = self._evict()
+
+        self._notify_unloaded(unloaded)
+
+    def _notify_unloaded(self, pdf_ids):
+        if self.on_unload:
+            for pdf_id in pdf_ids:
+                self.on_unload(pdf_id)
+
+    def _evict(self):
+        """
+        Evict least recently used unpinned entries until within the limits (called with the lock held)
+
+        Returns:
+            list: IDs of the PDFs whose retrievers were evicted
+        """
+        evicted = []
+        max_bytes = self.max_bytes - self._reserved_bytes()
+        for pdf_id in list(self._entries):
+            if self.current_bytes <= max_bytes and len(self._entries) <= self.max_entries:
+                break
+            if pdf_id in self._pins:
+                continue
+
+            entry = self._entries.pop(pdf_id)
+            self.current_bytes -= entry["bytes"]
+            self.evictions += 1
+            self.evicted_bytes += entry["bytes"]
+            evicted.append(pdf_id)
+            print(f"Evicted retriever for PDF {pdf_id} ({entry['bytes'] / (1024 * 1024):.1f}MB)")
+
+        return evicted
+
+    def _reserved_bytes(self):
+        return self.reserved_bytes() if self.reserved_bytes else 0
+
+    def _pinned_bytes(self):
+        return sum(self._entries[pdf_id]["bytes"] for pdf_id in self._pins if pdf_id in self._entries)
+
+    def can_admit(self, estimated_bytes):
+        """
+        Check whether a new index of the estimated size fits the memory budget
+
+        Unpinned entries can always be evicted, so only pinned ones and the
+        reserved memory count against it.
+        """
+        with self._lock:
+            return self._reserved_bytes() + self._pinned_bytes() + estimated_bytes <= self.max_bytes
+
+    def get_stats(self):
+        """Get hit/miss and eviction counters and estimated memory usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pinned": len(self._pins),
+                "bytes": self.current_bytes,
+                "pinned_bytes": self._pinned_bytes(),
+                "reserved_bytes": self._reserved_bytes(),
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes
+            }
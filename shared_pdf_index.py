@@ -0,0 +1,438 @@
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+import faiss
+from langchain.docstore.document import Document
+from embedding_service import EMBEDDING_DIMENSION, get_query_embeddings
+from vector_encoding import VECTOR_ENCODING
+from blob_download import file_lock
+
+# How uploaded PDFs are indexed: "per_pdf" (one FAISS index each) or "shared" (one index, filtered by pdf_id)
+PDF_INDEX_MODE = os.environ.get("PDF_INDEX_MODE", "per_pdf")
+
+# Directory holding the shared index's vector log and its chunk table
+SHARED_PDF_INDEX_DIR = os.environ.get(
+    "SHARED_PDF_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "shared_pdf_index")
+)
+
+# Deleted vectors are only marked; they are physically removed once they make up this share of the index
+SHARED_INDEX_COMPACT_RATIO = float(os.environ.get("SHARED_INDEX_COMPACT_RATIO", "0.2"))
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS chunks (
+        vector_id INTEGER PRIMARY KEY,
+        pdf_id TEXT NOT NULL,
+        page_content TEXT NOT NULL,
+        metadata TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS chunks_pdf_id ON chunks (pdf_id)",
+    "CREATE TABLE IF NOT EXISTS deleted (vector_id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+]
+
+class _ReadWriteLock:
+    """Lock that many threads can hold for reading, or one for writing"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+
+    def acquire_read(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._writing)
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._writing and not self._readers)
+            self._writing = True
+
+    def release_write(self):
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
+
+def use_shared_index():
+    """Check whether uploaded PDFs are indexed in the shared index"""
+    return PDF_INDEX_MODE == "shared"
+
+class SharedPdfIndex:
+    """
+    One FAISS index holding the chunks of every uploaded PDF
+
+    Vectors get int64 IDs through an IndexIDMap2; a SQLite table maps each ID
+    to its pdf_id, text and metadata. Searches are restricted to a set of PDFs
+    with an IDSelectorBatch of their positions in the index, so one or many
+    PDFs are queried with a single search. Deleting a PDF marks its vectors as
+    deleted; they are removed from the FAISS index once they exceed
+    SHARED_INDEX_COMPACT_RATIO of it.
+
+    Vectors are stored in an append-only log of (id, code) records next to
+    the chunk table, so adding a PDF writes only its own vectors and removing
+    one writes only table rows. A compaction is the only write that rewrites
+    the log, into a new file for the next generation. Rows in the meta table
+    hold the generation and the number of vectors in the log. Every process
+    sharing the directory reads them before using its in-memory index, then
+    appends the vectors other processes added or reloads after a compaction.
+    Changes are made while holding a lock file, so processes take turns.
+
+    The RLock guards the chunk table and is held only while a search resolves
+    its vector IDs. The FAISS search itself runs under the read side of a
+    reader-writer lock, so searches run in parallel and only wait for adds
+    and compactions, which take the write side.
+    """
+
+    def __init__(self, index_dir=SHARED_PDF_INDEX_DIR):
+        self.index_dir = index_dir
+        self.lock_path = os.path.join(index_dir, ".write.lock")
+        self._index = None
+        self._connection = None
+        self._id_map = None
+        self._generation = None
+        self._loaded_vectors = 0
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._index_lock = _ReadWriteLock()
+        self.compactions = 0
+
+    def _open(self):
+        """Open the chunk table and load the index from the vector log, creating them on first use (called with the lock held)"""
+        if self._index is not None:
+            return
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(self.index_dir, "chunks.sqlite"), check_same_thread=False)
+        for statement in _SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+
+        self._index = self._new_index()
+        self._id_map = faiss.vector_to_array(self._index.id_map)
+        self._sync()
+
+    def _new_index(self):
+        # Same metric as the per-PDF indexes (langchain's FAISS default), so scores are comparable.
+        # Only fp16 applies here: SQ8 and PQ need training, and PDFs are added one at a time
+        if VECTOR_ENCODING == "fp16":
+            index = faiss.IndexScalarQuantizer(EMBEDDING_DIMENSION, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+        return faiss.IndexIDMap2(index)
+
+    def _log_path(self, generation):
+        return os.path.join(self.index_dir, f"vectors-{generation}.bin")
+
+    def _record_dtype(self):
+        return np.dtype([("id", "<i8"), ("code", np.uint8, (self._index.index.sa_code_size(),))])
+
+    def _read_meta(self):
+        meta = dict(self._connection.execute("SELECT key, value FROM meta"))
+        return meta.get("generation", 0), meta.get("log_vectors", 0)
+
+    def _sync(self):
+        """
+        Bring the in-memory index up to date with the vector log (called with the lock held)
+
+        Vectors appended by other processes are added; after a compaction in
+        another process the index is reloaded from the new generation's log.
+        """
+        while True:
+            generation, log_vectors = self._read_meta()
+            if generation != self._generation:
+                index, start = self._new_index(), 0
+            elif log_vectors > self._loaded_vectors:
+                index, start = self._index, self._loaded_vectors
+            else:
+                return
+
+            try:
+                records = self._read_log(generation, start, log_vectors)
+            except FileNotFoundError:
+                # Compacted into the next generation since we read the meta rows
+                continue
+            break
+
+        vectors = np.ascontiguousarray(index.index.sa_decode(np.ascontiguousarray(records["code"])), dtype=np.float32)
+        ids = np.ascontiguousarray(records["id"], dtype=np.int64)
+        if index is self._index:
+            self._index_lock.acquire_write()
+            try:
+                index.add_with_ids(vectors, ids)
+                self._id_map = faiss.vector_to_array(index.id_map)
+            finally:
+                self._index_lock.release_write()
+        else:
+            # Searches keep using the old index and id_map they took, so the new ones are swapped in whole
+            if len(ids):
+                index.add_with_ids(vectors, ids)
+            self._index = index
+            self._id_map = faiss.vector_to_array(index.id_map)
+
+        self._generation = generation
+        self._loaded_vectors = log_vectors
+        self._update_memory_bytes()
+
+    def _read_log(self, generation, start, end):
+        dtype = self._record_dtype()
+        if start == end:
+            return np.zeros(0, dtype=dtype)
+        with open(self._log_path(generation), "rb") as f:
+            f.seek(start * dtype.itemsize)
+            return np.frombuffer(f.read((end - start) * dtype.itemsize), dtype=dtype)
+
+    def _write_log(self, path, ids, codes, offset):
+        """Write records at a position in a log file, dropping any an interrupted write left after it"""
+        records = np.zeros(len(ids), dtype=self._record_dtype())
+        records["id"] = ids
+        records["code"] = codes.reshape(records["code"].shape)
+        with open(path, "ab") as f:
+            f.truncate(offset * records.dtype.itemsize)
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _set_meta(self, key, value):
+        self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _update_memory_bytes(self):
+        # Codes of the wrapped index, plus the IndexIDMap2's id_map and reverse map
+        self._memory_bytes = self._index.ntotal * (self._index.index.sa_code_size() + 24)
+
+    def memory_bytes(self):
+        """Estimate the memory the loaded index uses (read without the lock, so other budgets can count it)"""
+        return self._memory_bytes
+
+    def _next_vector_id(self, count):
+        """Reserve count consecutive vector IDs (called with the lock held)"""
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'next_vector_id'").fetchone()
+        start = row[0] if row else 0
+        self._connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('next_vector_id', ?)",
+            (start + count,)
+        )
+        return start
+
+    def contains(self, pdf_id):
+        """Check whether a PDF's chunks are in the shared index"""
+        with self._lock:
+            self._open()
+            row = self._connection.execute("SELECT 1 FROM chunks WHERE pdf_id = ? LIMIT 1", (pdf_id,)).fetchone()
+            return row is not None
+
+    def add_vector_store(self, pdf_id, vector_store):
+        """
+        Add every chunk of a PDF's own FAISS vector store to the shared index
+
+        The vectors are copied from the store's index (decoded if it is compressed),
+        so nothing is re-embedded.
+        Adding a PDF that is already present replaces its chunks.
+
+        Returns:
+            int: The number of chunks added
+        """
+        count = vector_store.index.ntotal
+        vectors = vector_store.index.reconstruct_n(0, count) if count else np.zeros((0, EMBEDDING_DIMENSION), dtype=np.float32)
+
+        rows = []
+        for position in range(count):
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+            metadata = dict(doc.metadata, pdf_id=pdf_id)
+            rows.append((pdf_id, doc.page_content, json.dumps(metadata, default=str)))
+
+        with self._lock:
+            self._open()
+            with file_lock(self.lock_path):
+                self._sync()
+                self._delete_rows(pdf_id)
+
+                start = self._next_vector_id(count)
+                ids = np.arange(start, start + count, dtype=np.int64)
+                self._connection.executemany(
+                    "INSERT INTO chunks (vector_id, pdf_id, page_content, metadata) VALUES (?, ?, ?, ?)",
+                    [(int(vector_id),) + row for vector_id, row in zip(ids, rows)]
+                )
+
+                if count:
+                    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                    # The log is written first; its new length only counts once committed with the rows
+                    self._write_log(self._log_path(self._generation), ids, self._index.index.sa_encode(vectors), self._loaded_vectors)
+                    self._set_meta("log_vectors", self._loaded_vectors + count)
+                self._connection.commit()
+
+                if count:
+                    self._index_lock.acquire_write()
+                    try:
+                        self._index.add_with_ids(vectors, ids)
+                        self._id_map = faiss.vector_to_array(self._index.id_map)
+                    finally:
+                        self._index_lock.release_write()
+                    self._loaded_vectors += count
+                    self._update_memory_bytes()
+                self._compact_if_needed()
+
+        print(f"Added {count} chunks of PDF {pdf_id} to the shared index")
+        return count
+
+    def _delete_rows(self, pdf_id):
+        """Mark a PDF's vectors as deleted and drop its chunks (called with the lock held)"""
+        self._connection.execute("INSERT OR IGNORE INTO deleted SELECT vector_id FROM chunks WHERE pdf_id = ?", (pdf_id,))
+        self._connection.execute("DELETE FROM chunks WHERE pdf_id = ?", (pdf_id,))
+
+    def remove_pdf(self, pdf_id):
+        """Remove a PDF from the shared index"""
+        with self._lock:
+            self._open()
+            with file_lock(self.lock_path):
+                self._sync()
+                self._delete_rows(pdf_id)
+                self._connection.commit()
+                self._compact_if_needed()
+
+    def _compact_if_needed(self, force=False):
+        """
+        Physically remove deleted vectors once there are enough of them
+
+        The remaining vectors are written to the next generation's log, which
+        other processes reload from. Called with the lock and the lock file held.
+        """
+        deleted = np.array(
+            [row[0] for row in self._connection.execute("SELECT vector_id FROM deleted")],
+            dtype=np.int64
+        )
+        if not len(deleted):
+            return
+        if not force and len(deleted) < SHARED_INDEX_COMPACT_RATIO * max(1, self._index.ntotal):
+            return
+
+        self._index_lock.acquire_write()
+        try:
+            self._index.remove_ids(faiss.IDSelectorBatch(len(deleted), faiss.swig_ptr(deleted)))
+            self._id_map = faiss.vector_to_array(self._index.id_map)
+        finally:
+            self._index_lock.release_write()
+
+        generation = self._generation + 1
+        codes = faiss.vector_to_array(faiss.downcast_index(self._index.index).codes)
+        self._write_log(self._log_path(generation), self._id_map, codes, 0)
+        self._connection.execute("DELETE FROM deleted")
+        self._set_meta("generation", generation)
+        self._set_meta("log_vectors", self._index.ntotal)
+        self._connection.commit()
+
+        # Processes that have not read the old log yet find it gone and reload from the new one
+        try:
+            os.remove(self._log_path(self._generation))
+        except FileNotFoundError:
+            pass
+        self._generation = generation
+        self._loaded_vectors = self._index.ntotal
+        self._update_memory_bytes()
+        self.compactions += 1
+        print(f"Compacted the shared index: removed {len(deleted)} deleted vectors")
+
+    def compact(self):
+        """Remove all deleted vectors from the index now"""
+        with self._lock:
+            self._open()
+            with file_lock(self.lock_path):
+                self._sync()
+                self._compact_if_needed(force=True)
+
+    def search(self, question, pdf_ids, k=5):
+        """
+        Find the chunks most similar to a question within the given PDFs
+
+        Args:
+            question: Question text
+            pdf_ids: IDs of the PDFs to search
+            k: Number of chunks to return
+
+        Returns:
+            list: Documents, most similar first, with pdf_id in their metadata
+        """
+        query_vector = np.array([get_query_embeddings().embed_query(question)], dtype=np.float32)
+
+        with self._lock:
+            self._open()
+            self._sync()
+
+            placeholders = ",".join("?" for _ in pdf_ids)
+            vector_ids = np.array(
+                [row[0] for row in self._connection.execute(
+                    f"SELECT vector_id FROM chunks WHERE pdf_id IN ({placeholders})", list(pdf_ids)
+                )],
+                dtype=np.int64
+            )
+            if not len(vector_ids):
+                return []
+
+            # IDs are assigned in increasing order and removal keeps the order, so id_map is sorted
+            id_map = self._id_map
+            positions = np.searchsorted(id_map, vector_ids)
+            found = positions < len(id_map)
+            found[found] = id_map[positions[found]] == vector_ids[found]
+            positions = positions[found]
+            if not len(positions):
+                return []
+
+            # IndexIDMap2 does not accept search parameters in faiss 1.7.4, so the selector
+            # holds positions and the index it wraps is searched; selector and positions must outlive the search
+            positions = np.ascontiguousarray(positions, dtype=np.int64)
+            selector = faiss.IDSelectorBatch(len(positions), faiss.swig_ptr(positions))
+            params = faiss.SearchParameters()
+            params.sel = selector
+            index = faiss.downcast_index(self._index.index)
+
+            # Taken before the RLock is released, so no add or compaction can move the positions first
+            self._index_lock.acquire_read()
+
+        try:
+            _, labels = index.search(query_vector, k, params=params)
+        finally:
+            self._index_lock.release_read()
+
+        hit_ids = [int(id_map[label]) for label in labels[0] if label != -1]
+        if not hit_ids:
+            return []
+
+        with self._lock:
+            placeholders = ",".join("?" for _ in hit_ids)
+            rows = {
+                row[0]: row[1:] for row in self._connection.execute(
+                    f"SELECT vector_id, page_content, metadata FROM chunks WHERE vector_id IN ({placeholders})", hit_ids
+                )
+            }
+
+        # PDFs removed while the search ran have no rows left
+        return [
+            Document(page_content=rows[vector_id][0], metadata=json.loads(rows[vector_id][1]))
+            for vector_id in hit_ids if vector_id in rows
+        ]
+
+    def get_stats(self):
+        """Get the number of PDFs, live and deleted vectors, the log generation, memory and compactions"""
+        with self._lock:
+            self._open()
+            self._sync()
+            return {
+                "pdfs": self._connection.execute("SELECT COUNT(DISTINCT pdf_id) FROM chunks").fetchone()[0],
+                "chunks": self._connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+                "deleted_vectors": self._connection.execute("SELECT COUNT(*) FROM deleted").fetchone()[0],
+                "index_vectors": self._index.ntotal,
+                "generation": self._generation,
+                "memory_bytes": self._memory_bytes,
+                "compactions": self.compactions
+            }
+
+# Process-wide shared index used when PDF_INDEX_MODE=shared
+shared_pdf_index = SharedPdfIndex()
@@ -468,77 +468,74 @@ function askQuestion(question) {
     questionInput.disabled = true;
     submitBtn.disabled = true;
     
-    // Send question to server
-    fetch('/api/ask', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'Cache-Control': 'no-cache'
-        },
-        body: JSON.stringify({
-            question: question,
-            web_search_enabled: webSearchEnabled
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        // Remove loading indicator
-        chatContainer.removeChild(loadingDiv);
+    // Finish the request: save chats and re-enable input
+    function finishQuestion() {
+        saveChats();
+        
+        questionInput.disabled = false;
+        submitBtn.disabled = false;
+        questionInput.focus();
+    }
+    
+    // Show an error message in place of the answer
+    function showError(message) {
+        if (loadingDiv.parentNode === chatContainer) {
+            chatContainer.removeChild(loadingDiv);
+        }
+        
+        renderMessage('assistant', `Error: ${message}`);
+        
+        // Add to chat data
+        activeChat.messages.push({
+            role: 'assistant',
+            content: `Error: ${message}`
+        });
         
-        if (data.error) {
-            // Show error message
-            renderMessage('assistant', `Error: ${data.error}`);
+        finishQuestion();
+    }
+    
+    let answer = '';
+    let sources = [];
+    const loadingContent = loadingDiv.querySelector('.message-content');
+    
+    // Stream the answer from the server (streamAnswer is defined in stream_answer.js)
+    streamAnswer('/api/ask', {
+        question: question,
+        web_search_enabled: webSearchEnabled
+    }, {
+        onSources: function(data) {
+            sources = data.sources || [];
+        },
+        onToken: function(delta) {
+            // Show the partial answer in place of the loading indicator
+            answer += delta;
+            loadingContent.style.whiteSpace = 'pre-wrap';
+            loadingContent.textContent = answer;
+            chatContainer.scrollTop = chatContainer.scrollHeight;
+        },
+        onDone: function() {
+            // Replace the partial answer with the fully rendered message
+            chatContainer.removeChild(loadingDiv);
             
-            // Add to chat data
-            activeChat.messages.push({
-                role: 'assistant',
-                content: `Error: ${data.error}`
-            });
-        } else {
             // Generate title
             const title = generateTitle(question);
             
             // Show answer with sources
-            renderMessage('assistant', data.answer, data.sources, title);
+            renderMessage('assistant', answer, sources, title);
             
             // Add to chat data
             activeChat.messages.push({
                 role: 'assistant',
-                content: data.answer,
-                sources: data.sources,
+                content: answer,
+                sources: sources,
                 title: title
             });
-        }
-        
-        // Save chats
-        saveChats();
-        
-        // Re-enable input
-        questionInput.disabled = false;
-        submitBtn.disabled = false;
-        questionInput.focus();
+            
+            finishQuestion();
+        },
+        onError: showError
     })
-    .catch(error => {
-        // Remove loading indicator
-        chatContainer.removeChild(loadingDiv);
-        
-        // Show error message
-        renderMessage('assistant', `Error: ${error.message}`);
-        
-        // Add to chat data
-        activeChat.messages.push({
-            role: 'assistant',
-            content: `Error: ${error.message}`
-        });
-        
-        // Save chats
-        saveChats();
-        
-        // Re-enable input
-        questionInput.disabled = false;
-        submitBtn.disabled = false;
-        questionInput.focus();
-    });
+    .catch(error => showError(error.message));
 }
 
 // Clear all conversations
@@ -234,39 +234,55 @@ function askPdfQuestion(pdfId, question) {
     loadingDiv.innerHTML = '<div class="loading-spinner"></div><div class="loading-text">Thinking...</div>';
     chatContainer.appendChild(loadingDiv);
     
-    // Send question to server
-    fetch(`/api/ask-pdf/${pdfId}`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
+    // Remove the loading indicator if it is still shown
+    function removeLoading() {
+        if (loadingDiv.parentNode) {
+            loadingDiv.parentNode.removeChild(loadingDiv);
+        }
+    }
+    
+    let answer = '';
+    let messageContent = null;
+    
+    // Stream the answer from the server (streamAnswer is defined in stream_answer.js)
+    streamAnswer(`/api/ask-pdf/${pdfId}`, { question: question }, {
+        onToken: function(delta) {
+            // Replace the loading indicator with the answer as soon as the first token arrives
+            if (!messageContent) {
+                removeLoading();
+                messageContent = createPdfMessageElement(pdfId, 'assistant');
+            }
+            
+            answer += delta;
+            messageContent.innerHTML = marked.parse(answer);
+            chatContainer.scrollTop = chatContainer.scrollHeight;
         },
-        body: JSON.stringify({ question: question })
-    })
-    .then(response => response.json())
-    .then(data => {
-        // Remove loading indicator
-        chatContainer.removeChild(loadingDiv);
-        
-        if (data.error) {
+        onDone: function() {
+            removeLoading();
+            
+            if (messageContent) {
+                storePdfMessage(pdfId, 'assistant', answer);
+            } else {
+                addPdfMessage(pdfId, 'assistant', answer);
+            }
+        },
+        onError: function(message) {
+            removeLoading();
+            
             // Show error message
-            addPdfMessage(pdfId, 'assistant', `Error: ${data.error}`);
-        } else {
-            // Show answer
-            addPdfMessage(pdfId, 'assistant', data.answer);
+            addPdfMessage(pdfId, 'assistant', `Error: ${message}`);
         }
     })
     .catch(error => {
-        // Remove loading indicator
-        chatContainer.removeChild(loadingDiv);
+        removeLoading();
         
         // Show error message
         addPdfMessage(pdfId, 'assistant', `Error: ${error.message}`);
     });
 }
 
-// Add a message to a PDF chat
-function addPdfMessage(pdfId, role, content) {
-    // Create message element
+// Create an empty message element in a PDF chat and return its content element
+function createPdfMessageElement(pdfId, role) {
     const chatContainer = document.querySelector(`.pdf-tab-pane[data-pdf-id="${pdfId}"] .pdf-chat-container`);
     
     const messageDiv = document.createElement('div');
@@ -274,15 +290,15 @@ function addPdfMessage(pdfId, role, content) {
     
     const messageContent = document.createElement('div');
     messageContent.className = 'message-content';
-    messageContent.innerHTML = role === 'user' ? content : marked.parse(content);
     
     messageDiv.appendChild(messageContent);
     chatContainer.appendChild(messageDiv);
     
-    // Scroll to bottom
-    chatContainer.scrollTop = chatContainer.scrollHeight;
-    
-    // Store message in memory
+    return messageContent;
+}
+
+// Store a message in memory and localStorage
+function storePdfMessage(pdfId, role, content) {
     if (activePdfTabs[pdfId]) {
         activePdfTabs[pdfId].messages.push({
             role: role,
@@ -294,6 +310,20 @@ function addPdfMessage(pdfId, role, content) {
     }
 }
 
+// Add a message to a PDF chat
+function addPdfMessage(pdfId, role, content) {
+    // Create message element
+    const chatContainer = document.querySelector(`.pdf-tab-pane[data-pdf-id="${pdfId}"] .pdf-chat-container`);
+    const messageContent = createPdfMessageElement(pdfId, role);
+    messageContent.innerHTML = role === 'user' ? content : marked.parse(content);
+    
+    // Scroll to bottom
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+    
+    // Store message in memory
+    storePdfMessage(pdfId, role, content);
+}
+
 // Set the active PDF tab
 function setActivePdfTab(pdfId) {
     // Update current tab
@@ -402,6 +432,69 @@ function loadPdfTabsFromLocalStorage() {
     }
 }
 
+// Poll a PDF ingestion job until it completes, reporting progress along the way
+function waitForUploadJob(jobId, onProgress) {
+    return new Promise((resolve, reject) => {
+        function poll() {
+            fetch(`/api/upload-status/${jobId}`)
+                .then(response => response.json())
+                .then(status => {
+                    if (status.error) {
+                        reject(new Error(status.error));
+                    } else if (status.status === 'completed') {
+                        resolve(status);
+                    } else {
+                        onProgress(status);
+                        setTimeout(poll, 1000);
+                    }
+                })
+                .catch(reject);
+        }
+        
+        poll();
+    });
+}
+
+// Compute the SHA-256 hex digest of a file (null where Web Crypto is unavailable, e.g. plain HTTP)
+function hashPdfFile(file) {
+    if (!window.crypto || !window.crypto.subtle) {
+        return Promise.resolve(null);
+    }
+    
+    return file.arrayBuffer()
+        .then(buffer => window.crypto.subtle.digest('SHA-256', buffer))
+        .then(digest => Array.from(new Uint8Array(digest))
+            .map(byte => byte.toString(16).padStart(2, '0'))
+            .join(''));
+}
+
+// Upload a PDF file and wait for its ingestion job to finish
+function uploadPdfFile(file, uploadButton) {
+    // Create form data
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    // Upload file
+    return fetch('/api/upload-pdf', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        
+        // The PDF is processed in the background, so poll its job until it finishes
+        uploadButton.textContent = 'Processing...';
+        return waitForUploadJob(data.job_id, function(status) {
+            const percent = Math.round((status.progress || 0) * 100);
+            const eta = status.eta_seconds ? `, ~${Math.ceil(status.eta_seconds)}s left` : '';
+            uploadButton.textContent = `Processing ${status.stage || 'queued'} ${percent}%${eta}`;
+        });
+    });
+}
+
 // Initialize when DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
     initPdfTabs();
@@ -430,28 +523,42 @@ document.addEventListener('DOMContentLoaded', function() {
             uploadButton.disabled = true;
             uploadButton.textContent = 'Uploading...';
             
-            // Create form data
-            const formData = new FormData();
-            formData.append('file', file);
-            
-            // Upload file
-            fetch('/api/upload-pdf', {
-                method: 'POST',
-                body: formData
+            // Check whether the server already has this content before sending the file
+            hashPdfFile(file)
+            .then(sha256 => {
+                if (!sha256) {
+                    return { exists: false };
+                }
+                
+                return fetch('/api/upload-pdf/by-hash', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify({ sha256: sha256 })
+                })
+                .then(response => response.json());
             })
-            .then(response => response.json())
             .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                
+                // Known content: no upload or processing needed
+                if (data.exists) {
+                    return data;
+                }
+                
+                return uploadPdfFile(file, uploadButton);
+            })
+            .then(status => {
                 // Reset form
                 pdfUploadForm.reset();
                 uploadButton.disabled = false;
                 uploadButton.textContent = originalText;
                 
-                if (data.error) {
-                    alert(`Error: ${data.error}`);
-                } else {
-                    // Create new tab for the PDF
-                    createPdfTab(data.pdf_id, data.filename, data.page_count);
-                }
+                // Create new tab for the PDF
+                createPdfTab(status.pdf_id, status.filename, status.page_count);
             })
             .catch(error => {
                 // Reset form
@@ -463,4 +570,4 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
     }
-});
\ No newline at end of file
+});
@@ -0,0 +1,81 @@
+// Streaming answers shared by the chat pages; load before the page scripts that call streamAnswer
+
+// Stream an answer from the server as Server-Sent Events
+// Events arrive in order: sources, token (one per delta), done - or error
+function streamAnswer(url, body, handlers) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+            'Cache-Control': 'no-cache'
+        },
+        body: JSON.stringify(Object.assign({}, body, { stream: true }))
+    })
+    .then(response => {
+        // Errors raised before streaming starts are returned as JSON
+        if (!response.ok || !response.body) {
+            return response.json().then(data => {
+                handlers.onError(data.error || `Request failed with status ${response.status}`);
+            });
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        // Parse one "event: ...\ndata: ..." block and call the matching handler
+        function dispatch(rawEvent) {
+            let eventName = 'message';
+            const dataLines = [];
+            
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            
+            if (dataLines.length === 0) {
+                return;
+            }
+            
+            const data = JSON.parse(dataLines.join('\n'));
+            
+            if (eventName === 'sources' && handlers.onSources) {
+                handlers.onSources(data);
+            } else if (eventName === 'token' && handlers.onToken) {
+                handlers.onToken(data.delta);
+            } else if (eventName === 'done' && handlers.onDone) {
+                handlers.onDone(data);
+            } else if (eventName === 'error' && handlers.onError) {
+                handlers.onError(data.error);
+            }
+        }
+        
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    if (buffer.trim()) {
+                        dispatch(buffer);
+                    }
+                    return;
+                }
+                
+                buffer += decoder.decode(value, { stream: true });
+                
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    dispatch(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+                
+                return read();
+            });
+        }
+        
+        return read();
+    });
+}
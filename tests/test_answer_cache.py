@@ -0,0 +1,71 @@
+import time
+from langchain.docstore.document import Document
+from answer_cache import SemanticAnswerCache, get_chunk_ids
+
+CHUNKS = ("chunk-1", "chunk-2")
+
+def test_chunk_ids_depend_on_source_page_and_text():
+    doc = Document(page_content="Letrozole 2.5 mg", metadata={"source": "book.pdf", "page": 3})
+    same = Document(page_content="Letrozole 2.5 mg", metadata={"source": "book.pdf", "page": 3, "score": 0.1})
+    other_page = Document(page_content="Letrozole 2.5 mg", metadata={"source": "book.pdf", "page": 4})
+
+    assert get_chunk_ids([doc]) == get_chunk_ids([same])
+    assert get_chunk_ids([doc]) != get_chunk_ids([other_page])
+    assert len(get_chunk_ids([doc, other_page])) == 2
+
+def test_similar_question_with_same_chunks_hits():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("corpus", [1.0, 0.0, 0.0], CHUNKS, {"answer": "A"})
+
+    assert cache.lookup("corpus", [0.99, 0.05, 0.0], CHUNKS) == {"answer": "A"}
+    # Below the threshold
+    assert cache.lookup("corpus", [0.7, 0.7, 0.0], CHUNKS) is None
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 1
+
+def test_different_chunks_or_namespace_miss():
+    cache = SemanticAnswerCache()
+    cache.store("corpus", [1.0, 0.0], CHUNKS, {"answer": "A"})
+
+    assert cache.lookup("corpus", [1.0, 0.0], ("chunk-1", "chunk-3")) is None
+    assert cache.lookup("pdf-1", [1.0, 0.0], CHUNKS) is None
+
+def test_returned_result_is_a_copy():
+    cache = SemanticAnswerCache()
+    cache.store("corpus", [1.0, 0.0], CHUNKS, {"answer": "A"})
+
+    cache.lookup("corpus", [1.0, 0.0], CHUNKS)["answer"] = "changed"
+    assert cache.lookup("corpus", [1.0, 0.0], CHUNKS) == {"answer": "A"}
+
+def test_invalidate_removes_only_that_namespace():
+    cache = SemanticAnswerCache()
+    cache.store("pdf-1", [1.0, 0.0], CHUNKS, {"answer": "A"})
+    cache.store("pdf-1", [0.0, 1.0], CHUNKS, {"answer": "B"})
+    cache.store("corpus", [1.0, 0.0], CHUNKS, {"answer": "C"})
+
+    cache.invalidate("pdf-1")
+    assert cache.lookup("pdf-1", [1.0, 0.0], CHUNKS) is None
+    assert cache.lookup("corpus", [1.0, 0.0], CHUNKS) == {"answer": "C"}
+    assert cache.get_stats()["invalidations"] == 2
+
+def test_expired_answers_are_dropped(monkeypatch):
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.store("corpus", [1.0, 0.0], CHUNKS, {"answer": "A"})
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.lookup("corpus", [1.0, 0.0], CHUNKS) is None
+    assert cache.get_stats()["entries"] == 0
+
+def test_oldest_answer_dropped_when_full(monkeypatch):
+    cache = SemanticAnswerCache(max_entries=2)
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+
+    cache.store("pdf-1", [1.0, 0.0], CHUNKS, {"answer": "A"})
+    cache.store("pdf-2", [1.0, 0.0], CHUNKS, {"answer": "B"})
+    cache.store("pdf-1", [0.0, 1.0], CHUNKS, {"answer": "C"})
+
+    assert cache.get_stats()["entries"] == 2
+    assert cache.lookup("pdf-1", [1.0, 0.0], CHUNKS) is None
+    assert cache.lookup("pdf-2", [1.0, 0.0], CHUNKS) == {"answer": "B"}
+    assert cache.lookup("pdf-1", [0.0, 1.0], CHUNKS) == {"answer": "C"}
@@ -0,0 +1,65 @@
+import os
+import time
+import zipfile
+import threading
+import blob_download
+
+def make_zip(tmp_path, etag):
+    zip_path = tmp_path / "faiss_index.zip"
+    with zipfile.ZipFile(zip_path, "w") as zip_ref:
+        zip_ref.writestr("faiss_index/index.faiss", b"vectors")
+    (tmp_path / "faiss_index.zip.etag").write_text(etag)
+    return str(zip_path)
+
+def test_concurrent_extracts_share_one_directory(tmp_path):
+    zip_path = make_zip(tmp_path, '"etag-1"')
+    target_root = str(tmp_path / "extracted")
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(blob_download.extract_zip_once(zip_path, target_root))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1
+    assert sorted(os.listdir(target_root)) == [os.path.basename(results[0])]
+    assert open(os.path.join(results[0], "faiss_index", "index.faiss"), "rb").read() == b"vectors"
+
+def test_new_version_replaces_old(tmp_path):
+    target_root = str(tmp_path / "extracted")
+    old_dir = blob_download.extract_zip_once(make_zip(tmp_path, '"etag-1"'), target_root)
+    new_dir = blob_download.extract_zip_once(make_zip(tmp_path, '"etag-2"'), target_root)
+
+    assert new_dir != old_dir
+    assert os.listdir(target_root) == [os.path.basename(new_dir)]
+
+def test_file_lock_excludes_and_releases(tmp_path):
+    lock_path = str(tmp_path / "file.lock")
+    order = []
+
+    def hold(name):
+        with blob_download.file_lock(lock_path, poll_seconds=0.01):
+            order.append(f"{name} start")
+            time.sleep(0.05)
+            order.append(f"{name} end")
+
+    threads = [threading.Thread(target=hold, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The holders never overlap
+    assert order[0].split()[0] == order[1].split()[0]
+    assert order[2].split()[0] == order[3].split()[0]
+    assert not os.path.exists(lock_path)
+
+def test_stale_lock_is_taken_over(tmp_path, monkeypatch):
+    lock_path = tmp_path / "file.lock"
+    lock_path.write_text("12345")
+    os.utime(lock_path, (time.time() - 100, time.time() - 100))
+    monkeypatch.setattr(blob_download, "BLOB_DOWNLOAD_LOCK_STALE_SECONDS", 10)
+
+    with blob_download.file_lock(str(lock_path), poll_seconds=0.01):
+        assert lock_path.read_text() == str(os.getpid())
@@ -0,0 +1,56 @@
+import os
+import shutil
+import threading
+import pytest
+from langchain.docstore.document import Document
+from langchain.docstore.in_memory import InMemoryDocstore
+import chunk_store
+
+def write_store(folder, texts):
+    """Write a chunk store holding one chunk per text, with docstore IDs c0, c1, ..."""
+    docstore = InMemoryDocstore({f"c{i}": Document(page_content=text, metadata={"page": i}) for i, text in enumerate(texts)})
+    sqlite_path = os.path.join(folder, "index.sqlite")
+    chunk_store.write_chunk_store(sqlite_path, docstore, {i: f"c{i}" for i in range(len(texts))})
+    return sqlite_path
+
+def test_open_store_reads_chunks(tmp_path):
+    sqlite_path = write_store(tmp_path, ["alpha", "beta"])
+
+    docstore, index_to_docstore_id = chunk_store.open_chunk_store(sqlite_path)
+
+    assert len(index_to_docstore_id) == 2
+    assert list(index_to_docstore_id) == [0, 1]
+    assert docstore.search(index_to_docstore_id[1]) == Document(page_content="beta", metadata={"page": 1})
+    with pytest.raises(KeyError):
+        index_to_docstore_id[2]
+
+def test_open_store_survives_removed_directory(tmp_path):
+    folder = tmp_path / "faiss_index"
+    folder.mkdir()
+    sqlite_path = write_store(folder, ["alpha", "beta"])
+    docstore, index_to_docstore_id = chunk_store.open_chunk_store(sqlite_path)
+
+    # A temporary download or evicted cache entry is removed while the retriever is still in use
+    shutil.rmtree(folder)
+
+    assert docstore.search(index_to_docstore_id[0]).page_content == "alpha"
+
+def test_open_store_shared_across_threads(tmp_path):
+    sqlite_path = write_store(tmp_path, [f"text {i}" for i in range(50)])
+    docstore, index_to_docstore_id = chunk_store.open_chunk_store(sqlite_path)
+    errors = []
+
+    def read_all():
+        try:
+            for vector_id in range(50):
+                assert docstore.search(index_to_docstore_id[vector_id]).page_content == f"text {vector_id}"
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read_all) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import faiss
+from langchain.docstore.document import Document
+import corpus_index
+import index_versions
+from bm25_index import BM25Index, load_bm25_index
+from chunk_store import iter_chunk_keys, iter_chunk_texts
+from corpus_builder import write_index_dir
+from faiss_loader import load_faiss_index
+
+WORDS = "estrogen progesterone ovary uterus cervix placenta oxytocin insulin metformin letrozole".split()
+
+def make_book(name, count, seed):
+    """Chunks and vectors of a synthetic book"""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for position in range(count):
+        text = " ".join(rng.choice(WORDS, size=8)) + f" {name.split('.')[0]}"
+        chunks.append(Document(
+            page_content=text,
+            metadata={"book": name, "chunk_id": corpus_index.chunk_id(name, position), "page": position}
+        ))
+    return chunks, rng.random((count, 16), dtype=np.float32)
+
+def current_texts(index_dir):
+    return list(iter_chunk_texts(os.path.join(index_versions.resolve_index_dir(index_dir), "index.sqlite")))
+
+def assert_consistent(index_dir):
+    """The FAISS index, chunk store and BM25 index describe the same chunks in the same order"""
+    folder = index_versions.resolve_index_dir(index_dir)
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    keys = list(iter_chunk_keys(os.path.join(folder, "index.sqlite")))
+    texts = current_texts(index_dir)
+
+    assert [vector_id for vector_id, _, _ in keys] == list(range(index.ntotal))
+    stored = load_bm25_index(folder)
+    rebuilt = BM25Index.build(texts)
+    for field in ("terms", "offsets", "doc_ids", "term_freqs", "doc_lengths"):
+        assert np.array_equal(getattr(stored, field), getattr(rebuilt, field)), field
+
+def test_add_appends_and_publishes_new_version(tmp_path):
+    index_dir = str(tmp_path / "faiss_index")
+    first_chunks, first_vectors = make_book("first.pdf", 30, 1)
+    write_index_dir(index_dir, first_chunks, first_vectors)
+
+    staged = corpus_index._StagedIndex(index_dir)
+    second_chunks, second_vectors = make_book("second.pdf", 12, 2)
+    staged.add(second_chunks, second_vectors)
+
+    # The flat index was appended to on disk, not loaded and rewritten
+    assert staged.index is None
+    staged.publish({"added_books": ["second.pdf"]})
+
+    assert index_versions.resolve_index_dir(index_dir) == os.path.join(index_dir, "v1")
+    assert index_versions.read_version(index_dir)["vectors"] == 42
+    index = faiss.read_index(os.path.join(index_dir, "v1", "index.faiss"))
+    assert np.array_equal(index.reconstruct_n(0, 42), np.concatenate([first_vectors, second_vectors]))
+    assert_consistent(index_dir)
+
+    # The unversioned files were kept as version 0
+    assert sorted(os.listdir(os.path.join(index_dir, "v0")))[:2] == ["index.bm25.npz", "index.faiss"]
+
+def test_remove_book_renumbers_chunks_and_bm25(tmp_path):
+    index_dir = str(tmp_path / "faiss_index")
+    chunks = []
+    vectors = []
+    for seed, name in enumerate(["a.pdf", "b.pdf", "c.pdf"]):
+        book_chunks, book_vectors = make_book(name, 10, seed)
+        chunks.extend(book_chunks)
+        vectors.append(book_vectors)
+    write_index_dir(index_dir, chunks, np.concatenate(vectors))
+
+    staged = corpus_index._StagedIndex(index_dir)
+    removed = [vector_id for vector_id, _, metadata in staged.chunk_keys() if metadata["book"] == "b.pdf"]
+    staged.remove(removed)
+    staged.publish({"removed_books": ["b.pdf"]})
+
+    assert_consistent(index_dir)
+    texts = current_texts(index_dir)
+    assert len(texts) == 20
+    assert all(text.endswith(" a") for text in texts[:10]) and all(text.endswith(" c") for text in texts[10:])
+
+    # A c.pdf chunk is found under its new vector ID by both retrievers
+    folder = index_versions.resolve_index_dir(index_dir)
+    doc_id, _ = load_bm25_index(folder).search("c", k=1)[0]
+    assert doc_id >= 10
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    _, labels = index.search(vectors[2][:1], 1)
+    assert labels[0][0] == 10
+
+def test_rollback_and_next_version_number(tmp_path):
+    index_dir = str(tmp_path / "faiss_index")
+    write_index_dir(index_dir, *make_book("first.pdf", 5, 1))
+
+    for seed, name in [(2, "second.pdf"), (3, "third.pdf")]:
+        staged = corpus_index._StagedIndex(index_dir)
+        staged.add(*make_book(name, 5, seed))
+        staged.publish({"added_books": [name]})
+    assert index_versions.read_version(index_dir)["version"] == 2
+
+    assert index_versions.rollback(index_dir) == 1
+    assert len(current_texts(index_dir)) == 10
+
+    # The rolled-back-from version keeps its number, so the next one does not reuse it
+    staged = corpus_index._StagedIndex(index_dir)
+    assert staged.version == 3
+    staged.add(*make_book("fourth.pdf", 5, 4))
+    staged.publish({"added_books": ["fourth.pdf"]})
+    assert len(current_texts(index_dir)) == 15
+    assert_consistent(index_dir)
+
+def test_old_versions_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_versions, "CORPUS_INDEX_KEEP_VERSIONS", 1)
+    index_dir = str(tmp_path / "faiss_index")
+    write_index_dir(index_dir, *make_book("first.pdf", 5, 1))
+
+    for seed in range(2, 6):
+        staged = corpus_index._StagedIndex(index_dir)
+        staged.add(*make_book(f"book{seed}.pdf", 5, seed))
+        staged.publish({})
+
+    assert index_versions.list_versions(index_dir) == [3, 4]
+
+def test_loader_reads_current_version(tmp_path):
+    index_dir = str(tmp_path / "faiss_index")
+    write_index_dir(index_dir, *make_book("first.pdf", 5, 1))
+    staged = corpus_index._StagedIndex(index_dir)
+    staged.add(*make_book("second.pdf", 7, 2))
+    staged.publish({})
+
+    vector_store = load_faiss_index(index_dir, embeddings=None, mmap=False, label="test")
+
+    assert vector_store.index.ntotal == 12
+    assert vector_store.bm25_index.doc_count == 12
+    assert vector_store.docstore.search(vector_store.index_to_docstore_id[11]).metadata["book"] == "second.pdf"
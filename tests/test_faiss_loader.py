@@ -0,0 +1,42 @@
+import numpy as np
+import faiss
+from langchain.docstore.document import Document
+import faiss_loader
+from ann_index import build_variant
+from corpus_builder import write_index_dir
+from faiss_loader import get_last_load_stats, load_faiss_index
+
+def write_index(tmp_path, count=400):
+    chunks = [Document(page_content=f"chunk {i}", metadata={"book": "a.pdf", "chunk_id": f"a.pdf:{i}"}) for i in range(count)]
+    vectors = np.random.default_rng(0).random((count, 16), dtype=np.float32)
+    index_dir = str(tmp_path / "faiss_index")
+    write_index_dir(index_dir, chunks, vectors)
+    return index_dir
+
+def test_flat_index_reports_whether_it_was_mapped(tmp_path):
+    index_dir = write_index(tmp_path)
+
+    load_faiss_index(index_dir, None, mmap=True, label="test", index_type="flat")
+    stats = get_last_load_stats("test")
+
+    # faiss-cpu 1.7.4 cannot map flat indexes; newer releases can
+    assert stats["mmap_requested"] is True
+    assert stats["mmap"] is hasattr(faiss, "IO_FLAG_MMAP_IFC")
+
+def test_ivf_index_is_mapped(tmp_path):
+    index_dir = write_index(tmp_path)
+    build_variant(index_dir, "ivf_flat", nlist=4)
+
+    vector_store = load_faiss_index(index_dir, None, mmap=True, label="test", index_type="ivf_flat")
+
+    assert get_last_load_stats("test")["mmap"] is True
+    assert vector_store.index.ntotal == 400
+
+def test_no_mapping_when_disabled(tmp_path):
+    index_dir = write_index(tmp_path)
+    build_variant(index_dir, "ivf_flat", nlist=4)
+
+    load_faiss_index(index_dir, None, mmap=False, label="test", index_type="ivf_flat")
+
+    assert get_last_load_stats("test")["mmap"] is False
+    assert get_last_load_stats("test")["mmap_requested"] is False
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import faiss
+import pytest
+from langchain.docstore.document import Document
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.vectorstores import FAISS
+import hybrid_retriever
+from bm25_index import BM25Index, tokenize
+from hybrid_retriever import HybridRetriever, make_retriever, reciprocal_rank_fusion
+
+TEXTS = [
+    "Methotrexate 50 mg/m2 intramuscularly for ectopic pregnancy",
+    "Misoprostol 800 micrograms vaginally for early pregnancy loss",
+    "Magnesium sulfate loading dose in pre-eclampsia",
+    "Letrozole 2.5 mg daily for ovulation induction",
+    "The placenta and the uterus in the third trimester",
+    "Oxytocin infusion for postpartum haemorrhage, with the uterus massaged",
+]
+
+def test_tokenize_keeps_codes_and_doses():
+    assert tokenize("Letrozole 2.5mg, CIN-3 and N83.2 for the patient") == ["letrozole", "2.5mg", "cin-3", "n83.2", "patient"]
+
+def test_bm25_ranks_rare_terms_first():
+    index = BM25Index.build(TEXTS)
+
+    assert index.doc_count == len(TEXTS)
+    assert index.document_frequency("uterus") == 2
+    assert index.document_frequency("unknown") == 0
+    assert index.search("letrozole ovulation")[0][0] == 3
+    assert [doc_id for doc_id, _ in index.search("uterus")] in ([4, 5], [5, 4])
+    assert index.search("nothing matches") == []
+
+    ranked = index.search("pregnancy methotrexate", k=2)
+    assert ranked[0][0] == 0 and len(ranked) == 2
+    assert ranked[0][1] > ranked[1][1]
+
+def test_bm25_save_load_round_trip(tmp_path):
+    index = BM25Index.build(TEXTS)
+    path = str(tmp_path / "index.bm25.npz")
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+    assert loaded.search("uterus oxytocin") == index.search("uterus oxytocin")
+
+def test_bm25_appended_and_without_match_rebuild():
+    appended = BM25Index.build(TEXTS[:4]).appended(TEXTS[4:])
+    removed = BM25Index.build(TEXTS).without([1, 4])
+
+    for index, texts in ((appended, TEXTS), (removed, [TEXTS[0], TEXTS[2], TEXTS[3], TEXTS[5]])):
+        rebuilt = BM25Index.build(texts)
+        for field in ("terms", "offsets", "doc_ids", "term_freqs", "doc_lengths"):
+            assert np.array_equal(getattr(index, field), getattr(rebuilt, field)), field
+
+def test_reciprocal_rank_fusion():
+    # b is second in both rankings, so it beats a and c, each first in only one
+    assert reciprocal_rank_fusion([["a", "b", "d"], ["c", "b"]]) == ["b", "a", "c", "d"]
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "a"]], k=1) == ["a"]
+    assert reciprocal_rank_fusion([[], []]) == []
+    assert reciprocal_rank_fusion([["x"], ["y"]], rrf_k=1) == ["x", "y"]
+
+@pytest.fixture
+def vector_store():
+    rng = np.random.default_rng(0)
+    vectors = rng.random((len(TEXTS), 8), dtype=np.float32)
+    index = faiss.IndexFlatL2(8)
+    index.add(vectors)
+
+    # Every query embeds next to the placenta chunk, so only BM25 can find the others
+    store = FAISS(
+        lambda text: vectors[4].tolist(),
+        index,
+        InMemoryDocstore({str(i): Document(page_content=text) for i, text in enumerate(TEXTS)}),
+        {i: str(i) for i in range(len(TEXTS))}
+    )
+    store.bm25_index = BM25Index.build(TEXTS)
+    return store
+
+def test_hybrid_retriever_inline_and_pool_agree(vector_store):
+    inline = HybridRetriever(vectorstore=vector_store, bm25_index=vector_store.bm25_index, k=2)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        pooled = HybridRetriever(vectorstore=vector_store, bm25_index=vector_store.bm25_index, k=2, executor=pool)
+        pooled_docs = pooled.get_relevant_documents("letrozole")
+
+    docs = inline.get_relevant_documents("letrozole")
+    assert [doc.page_content for doc in docs] == [doc.page_content for doc in pooled_docs]
+    assert {doc.page_content for doc in docs} == {TEXTS[3], TEXTS[4]}
+
+def test_make_retriever_is_vector_only_unless_enabled(vector_store, monkeypatch):
+    assert not isinstance(make_retriever(vector_store), HybridRetriever)
+
+    monkeypatch.setattr(hybrid_retriever, "HYBRID_RETRIEVAL", True)
+    retriever = make_retriever(vector_store, k=3)
+    assert isinstance(retriever, HybridRetriever) and retriever.k == 3
+    assert retriever.executor is None
+
+    monkeypatch.setattr(hybrid_retriever, "HYBRID_SEARCH_THREADS", 2)
+    assert make_retriever(vector_store).executor is hybrid_retriever.get_bm25_executor()
+
+    del vector_store.bm25_index
+    assert not isinstance(make_retriever(vector_store), HybridRetriever)
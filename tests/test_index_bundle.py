@@ -0,0 +1,100 @@
+import struct
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+import index_bundle
+from index_bundle import bundle_blob_name, download_pdf_index, has_pdf_index, pack_index, unpack_index, upload_pdf_index
+
+FILES = {
+    "index.faiss": b"\x00\x01faiss" * 100,
+    "index.sqlite": b"SQLite format 3\x00" + bytes(range(256)),
+    "index.bm25.npz": b"",
+}
+
+def write_files(folder):
+    folder.mkdir()
+    for name, data in FILES.items():
+        (folder / name).write_bytes(data)
+    return str(folder)
+
+def read_files(folder):
+    return {path.name: path.read_bytes() for path in folder.iterdir()}
+
+class FakeContainerClient:
+    """Blobs held in a dict, with the calls index_bundle makes"""
+
+    def __init__(self):
+        self.blobs = {}
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        self.blobs[name] = data if isinstance(data, bytes) else data.read()
+
+    def download_blob(self, name, **kwargs):
+        if name not in self.blobs:
+            raise ResourceNotFoundError(f"{name} not found")
+        return _Downloader(self.blobs[name])
+
+    def list_blobs(self, name_starts_with="", **kwargs):
+        return [type("Blob", (), {"name": name})() for name in self.blobs if name.startswith(name_starts_with)]
+
+class _Downloader:
+    def __init__(self, data):
+        self.data = data
+
+    def readall(self):
+        return self.data
+
+def test_round_trip(tmp_path):
+    bundle = pack_index(write_files(tmp_path / "source"))
+    unpack_index(bundle, str(tmp_path / "target"))
+
+    assert read_files(tmp_path / "target") == FILES
+
+def test_corrupt_section_rejected(tmp_path):
+    bundle = bytearray(pack_index(write_files(tmp_path / "source")))
+    bundle[-1] ^= 0xFF
+
+    with pytest.raises(Exception, match="corrupt"):
+        unpack_index(bytes(bundle), str(tmp_path / "target"))
+
+def test_truncated_bundle_rejected(tmp_path):
+    bundle = pack_index(write_files(tmp_path / "source"))
+
+    with pytest.raises(Exception, match="corrupt"):
+        unpack_index(bundle[:-10], str(tmp_path / "target"))
+
+def test_wrong_magic_and_newer_version_rejected(tmp_path):
+    bundle = pack_index(write_files(tmp_path / "source"))
+
+    with pytest.raises(Exception, match="Not a FAISS index bundle"):
+        unpack_index(b"NOTABNDL" + bundle[8:], str(tmp_path / "target"))
+
+    newer = struct.pack("<I", index_bundle.BUNDLE_VERSION + 1)
+    with pytest.raises(Exception, match="Unsupported"):
+        unpack_index(bundle[:8] + newer + bundle[12:], str(tmp_path / "target"))
+
+def test_section_names_stay_in_target_dir(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "index.faiss").write_bytes(b"data")
+    bundle = pack_index(str(source)).replace(b'"index.faiss"', b'"../xx.faiss"')
+
+    # The header length is unchanged, since both names have the same length
+    unpack_index(bundle, str(tmp_path / "target" / "inner"))
+    assert (tmp_path / "target" / "inner" / "xx.faiss").read_bytes() == b"data"
+    assert not (tmp_path / "target" / "xx.faiss").exists()
+
+@pytest.mark.parametrize("index_format", ["bundle", "files"])
+def test_upload_and_download_in_either_format(tmp_path, monkeypatch, index_format):
+    monkeypatch.setattr(index_bundle, "PDF_INDEX_FORMAT", index_format)
+    container_client = FakeContainerClient()
+
+    blob_names = upload_pdf_index(container_client, "pdf-1", write_files(tmp_path / "source"))
+    if index_format == "bundle":
+        assert blob_names == [bundle_blob_name("pdf-1")]
+    else:
+        assert sorted(blob_names) == sorted(f"pdfs/pdf-1/faiss_index/{name}" for name in FILES)
+    assert has_pdf_index(blob_names, "pdf-1") and not has_pdf_index(blob_names, "pdf-2")
+
+    assert download_pdf_index(container_client, "pdf-1", str(tmp_path / "target"))
+    assert read_files(tmp_path / "target") == FILES
+    assert not download_pdf_index(container_client, "pdf-2", str(tmp_path / "missing"))
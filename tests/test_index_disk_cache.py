@@ -0,0 +1,118 @@
+import os
+from index_disk_cache import IndexDiskCache
+
+def make_index_dir(tmp_path, name, size):
+    folder = tmp_path / "downloads" / name
+    folder.mkdir(parents=True)
+    (folder / "index.faiss").write_bytes(b"x" * size)
+    return str(folder)
+
+def retired_dirs(cache):
+    return [name for name in os.listdir(cache.cache_dir) if name.startswith(".retired-")]
+
+def test_put_and_get_by_version(tmp_path):
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000)
+    path = cache.put("pdf-1", make_index_dir(tmp_path, "a", 100), "etag-1")
+
+    assert cache.get("pdf-1", "etag-1") == path
+    assert cache.get("pdf-1", "etag-2") is None
+    assert cache.get("pdf-2", "etag-1") is None
+    assert cache.get_stats()["hits"] == 1
+
+def test_evict_skips_entries_in_use(tmp_path):
+    loaded = {"pdf-1"}
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=1_500, in_use=loaded.__contains__)
+
+    cache.put("pdf-1", make_index_dir(tmp_path, "a", 1_000), "etag-1")
+    cache.put("pdf-2", make_index_dir(tmp_path, "b", 1_000), "etag-1")
+
+    # pdf-1 is older but loaded, so the newcomer is the one that does not fit
+    assert cache.get("pdf-1", "etag-1") is not None
+    assert cache.get("pdf-2", "etag-1") is None
+
+def test_release_evicts_entries_kept_while_in_use(tmp_path):
+    loaded = {"pdf-1", "pdf-2"}
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=1_500, in_use=loaded.__contains__)
+    cache.put("pdf-1", make_index_dir(tmp_path, "a", 1_000), "etag-1")
+    cache.put("pdf-2", make_index_dir(tmp_path, "b", 1_000), "etag-1")
+    assert cache.get_stats()["entries"] == 2
+
+    # Over the cap while both are loaded; unloading pdf-1 lets it go
+    loaded.discard("pdf-1")
+    cache.release("pdf-1")
+    assert cache.get("pdf-1", "etag-1") is None
+    assert cache.get("pdf-2", "etag-1") is not None
+
+def test_replacing_loaded_entry_defers_removal(tmp_path):
+    loaded = {"pdf-1"}
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000, in_use=loaded.__contains__)
+    old_path = cache.put("pdf-1", make_index_dir(tmp_path, "a", 100), "etag-1")
+    old_file = open(os.path.join(old_path, "index.faiss"), "rb")
+
+    new_path = cache.put("pdf-1", make_index_dir(tmp_path, "b", 200), "etag-2")
+
+    # The loaded copy was moved aside, not deleted
+    assert cache.get("pdf-1", "etag-2") == new_path
+    assert len(retired_dirs(cache)) == 1
+    assert len(old_file.read()) == 100
+    old_file.close()
+
+    loaded.clear()
+    cache.release("pdf-1")
+    assert retired_dirs(cache) == []
+
+def test_remove_loaded_entry_defers_removal(tmp_path):
+    loaded = {"pdf-1"}
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000, in_use=loaded.__contains__)
+    cache.put("pdf-1", make_index_dir(tmp_path, "a", 100), "etag-1")
+
+    cache.remove("pdf-1")
+    assert cache.get("pdf-1", None) is None
+    assert len(retired_dirs(cache)) == 1
+
+    loaded.clear()
+    cache.release("pdf-1")
+    assert retired_dirs(cache) == []
+
+def age(path, seconds):
+    old = os.path.getmtime(path) - seconds
+    os.utime(path, (old, old))
+
+def test_startup_keeps_directories_other_processes_may_use(tmp_path):
+    loaded = {"pdf-1"}
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000, in_use=loaded.__contains__)
+    cache.put("pdf-1", make_index_dir(tmp_path, "a", 100), "etag-1")
+    cache.remove("pdf-1")
+
+    # A store in progress in another process, and an entry directory without entry.json
+    os.makedirs(tmp_path / "cache" / ".staging-other" / "faiss_index")
+    os.makedirs(tmp_path / "cache" / "pdf-2" / "faiss_index")
+
+    # Another worker starting now must not delete what the first one still uses or writes
+    other = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000)
+    assert other.get_stats()["entries"] == 0
+    assert len(retired_dirs(other)) == 1
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted(retired_dirs(other) + [".staging-other", "pdf-2"])
+
+def test_startup_removes_stale_directories(tmp_path):
+    loaded = {"pdf-1"}
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000, in_use=loaded.__contains__)
+    cache.put("pdf-1", make_index_dir(tmp_path, "a", 100), "etag-1")
+    cache.put("pdf-3", make_index_dir(tmp_path, "b", 100), "etag-1")
+    cache.remove("pdf-1")
+    os.makedirs(tmp_path / "cache" / ".staging-other")
+    os.makedirs(tmp_path / "cache" / "pdf-2")
+
+    for name in os.listdir(tmp_path / "cache"):
+        age(tmp_path / "cache" / name, 7200)
+
+    restarted = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000, stale_seconds=3600)
+    assert restarted.get_stats()["entries"] == 1
+    assert sorted(os.listdir(tmp_path / "cache")) == ["pdf-3"]
+
+def test_entry_is_complete_when_renamed_into_place(tmp_path):
+    cache = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000)
+    cache.put("pdf-1", make_index_dir(tmp_path, "a", 100), "etag-1")
+
+    other = IndexDiskCache(str(tmp_path / "cache"), max_bytes=10_000)
+    assert other.get("pdf-1", "etag-1") == str(tmp_path / "cache" / "pdf-1" / "faiss_index")
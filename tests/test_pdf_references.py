@@ -0,0 +1,167 @@
+import json
+import itertools
+from types import SimpleNamespace
+import pytest
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+import pdf_references
+import pdf_processor
+
+class FakeContainerClient:
+    """In-memory stand-in for a ContainerClient, honouring overwrite and ETag conditions"""
+
+    def __init__(self):
+        self.blobs = {}
+        self._etags = itertools.count(1)
+
+    def _check_etag(self, name, etag, match_condition):
+        if match_condition == MatchConditions.IfNotModified:
+            if name not in self.blobs:
+                raise ResourceNotFoundError(name)
+            if self.blobs[name][1] != etag:
+                raise ResourceModifiedError(name)
+
+    def download_blob(self, name, **kwargs):
+        if name not in self.blobs:
+            raise ResourceNotFoundError(name)
+        data, etag = self.blobs[name]
+        return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=etag))
+
+    def upload_blob(self, name, data, overwrite=False, etag=None, match_condition=None, **kwargs):
+        if not overwrite and name in self.blobs:
+            raise ResourceExistsError(name)
+        self._check_etag(name, etag, match_condition)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.blobs[name] = (data, f"etag-{next(self._etags)}")
+
+    def delete_blob(self, name, etag=None, match_condition=None, **kwargs):
+        self._check_etag(name, etag, match_condition)
+        if name not in self.blobs:
+            raise ResourceNotFoundError(name)
+        del self.blobs[name]
+
+    def list_blobs(self, name_starts_with="", **kwargs):
+        return [SimpleNamespace(name=name) for name in list(self.blobs) if name.startswith(name_starts_with)]
+
+    def record(self, content_hash):
+        return json.loads(self.blobs[f"hashes/{content_hash}.json"][0])
+
+HASH = "a" * 64
+
+def upload_pdf(client, pdf_id, content_hash=HASH, uploader_id="session-1"):
+    """Store a processed PDF's blobs and register its hash, as process_pdf does"""
+    metadata = {"id": pdf_id, "filename": f"{pdf_id}.pdf", "page_count": 3, "chunk_count": 7, "content_hash": content_hash}
+    client.upload_blob(f"pdfs/{pdf_id}/metadata.json", json.dumps(metadata))
+    client.upload_blob(f"pdfs/{pdf_id}/{pdf_id}.pdf", b"%PDF")
+    pdf_references.register_pdf_hash(content_hash, metadata, client, uploader_id)
+
+@pytest.fixture
+def client():
+    return FakeContainerClient()
+
+def test_add_reference_per_uploader(client):
+    upload_pdf(client, "pdf-1")
+
+    existing = pdf_references.add_pdf_reference(HASH, "session-2", client)
+
+    assert existing == {"id": "pdf-1", "filename": "pdf-1.pdf", "page_count": 3, "deduplicated": True}
+    assert client.record(HASH)["references"] == ["session-1", "session-2"]
+
+def test_add_reference_is_idempotent_per_uploader(client):
+    upload_pdf(client, "pdf-1")
+
+    # Uploading the same content again from either session adds nothing
+    assert pdf_references.add_pdf_reference(HASH, "session-1", client)["id"] == "pdf-1"
+    pdf_references.add_pdf_reference(HASH, "session-2", client)
+    pdf_references.add_pdf_reference(HASH, "session-2", client)
+
+    assert client.record(HASH)["ref_count"] == 2
+
+def test_add_reference_to_unknown_content(client):
+    assert pdf_references.add_pdf_reference(HASH, "session-1", client) is None
+
+def test_find_takes_no_reference(client):
+    upload_pdf(client, "pdf-1")
+
+    assert pdf_references.find_pdf_by_hash(HASH, client)["chunk_count"] == 7
+    assert client.record(HASH)["references"] == ["session-1"]
+
+def test_release_keeps_data_until_last_reference(client):
+    upload_pdf(client, "pdf-1")
+    pdf_references.add_pdf_reference(HASH, "session-2", client)
+
+    assert pdf_references.release_pdf_reference("pdf-1", "session-1", client) is True
+    assert client.record(HASH)["references"] == ["session-2"]
+
+    # Releasing the last reference deletes the record and reports no references left
+    assert pdf_references.release_pdf_reference("pdf-1", "session-2", client) is False
+    assert f"hashes/{HASH}.json" not in client.blobs
+
+def test_repeated_release_cannot_drop_other_references(client):
+    upload_pdf(client, "pdf-1")
+    pdf_references.add_pdf_reference(HASH, "session-2", client)
+
+    for _ in range(3):
+        assert pdf_references.release_pdf_reference("pdf-1", "session-1", client) is True
+    # A session that never uploaded the PDF releases nothing either
+    assert pdf_references.release_pdf_reference("pdf-1", "session-3", client) is True
+
+    assert client.record(HASH)["references"] == ["session-2"]
+
+def test_pdf_without_references_can_be_deleted(client):
+    # Added by the command line tools, which take no reference
+    upload_pdf(client, "pdf-1", uploader_id=None)
+
+    assert pdf_references.release_pdf_reference("pdf-1", "session-1", client) is False
+    assert f"hashes/{HASH}.json" not in client.blobs
+
+def test_record_without_references_field_can_be_deleted(client):
+    upload_pdf(client, "pdf-1")
+    client.upload_blob(f"hashes/{HASH}.json", json.dumps({"pdf_id": "pdf-1", "filename": "pdf-1.pdf", "page_count": 3, "ref_count": 2}), overwrite=True)
+
+    assert pdf_references.release_pdf_reference("pdf-1", "session-1", client) is False
+    assert f"hashes/{HASH}.json" not in client.blobs
+
+def test_release_independent_copy_leaves_record(client):
+    upload_pdf(client, "pdf-1")
+    upload_pdf(client, "pdf-2", uploader_id="session-2")
+
+    # pdf-2 lost the registration race, so deleting it leaves pdf-1's references alone
+    assert pdf_references.release_pdf_reference("pdf-2", "session-2", client) is False
+    assert client.record(HASH)["pdf_id"] == "pdf-1"
+    assert client.record(HASH)["references"] == ["session-1"]
+
+def test_update_retries_after_conflicting_write(client):
+    upload_pdf(client, "pdf-1")
+    real_upload = client.upload_blob
+    conflicts = []
+
+    def upload_with_conflict(name, data, **kwargs):
+        # Another session adds its reference between our read and write, once
+        if not conflicts and kwargs.get("match_condition"):
+            conflicts.append(name)
+            record = client.record(HASH)
+            record["references"].append("session-3")
+            real_upload(name, json.dumps(record), overwrite=True)
+        return real_upload(name, data, **kwargs)
+
+    client.upload_blob = upload_with_conflict
+    pdf_references.add_pdf_reference(HASH, "session-2", client)
+
+    assert conflicts
+    assert client.record(HASH)["references"] == ["session-1", "session-3", "session-2"]
+    assert client.record(HASH)["ref_count"] == 3
+
+def test_delete_pdf_with_remaining_references(client, monkeypatch):
+    monkeypatch.setattr(pdf_processor, "get_container_client", lambda *args, **kwargs: client)
+    upload_pdf(client, "pdf-1")
+    pdf_references.add_pdf_reference(HASH, "session-2", client)
+
+    assert pdf_processor.delete_pdf("pdf-1", "session-1") == "in_use"
+    assert pdf_processor.delete_pdf("pdf-1", "session-1") == "in_use"
+    assert "pdfs/pdf-1/pdf-1.pdf" in client.blobs
+
+    assert pdf_processor.delete_pdf("pdf-1", "session-2") == "deleted"
+    assert not [name for name in client.blobs if name.startswith("pdfs/pdf-1/")]
+    assert f"hashes/{HASH}.json" not in client.blobs
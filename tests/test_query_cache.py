@@ -0,0 +1,68 @@
+import numpy as np
+from query_cache import CachedQueryEmbeddings, QueryEmbeddingCache, normalize_question
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0, 2.0, 3.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+def test_normalize_question():
+    assert normalize_question("  What is  PCOS?\n") == "what is pcos?"
+    assert normalize_question("What is PCOS?") != normalize_question("What is PCOS")
+
+def test_case_and_whitespace_variants_share_an_entry():
+    embeddings = CountingEmbeddings()
+    cached = CachedQueryEmbeddings(embeddings, QueryEmbeddingCache())
+
+    first = cached.embed_query("What is PCOS?")
+    assert cached.embed_query("what  is pcos? ") == first
+    assert cached.embed_query("What is endometriosis?") != first
+
+    assert embeddings.queries == ["What is PCOS?", "What is endometriosis?"]
+    assert cached.cache.get_stats()["hits"] == 1
+
+def test_documents_are_not_cached():
+    embeddings = CountingEmbeddings()
+    cached = CachedQueryEmbeddings(embeddings, QueryEmbeddingCache())
+
+    cached.embed_documents(["a chunk", "a chunk"])
+    assert len(embeddings.queries) == 2
+    assert cached.cache.get_stats()["entries"] == 0
+
+def test_evicts_least_recently_used_within_byte_cap():
+    vector = np.zeros(4, dtype=np.float32)
+    entry_size = len("q1") + vector.nbytes
+    cache = QueryEmbeddingCache(max_bytes=2 * entry_size)
+
+    cache.put("q1", vector)
+    cache.put("q2", vector)
+    assert cache.get("q1") is not None
+    cache.put("q3", vector)
+
+    # q1 was used after q2, so q2 is the one evicted
+    assert cache.get("q2") is None
+    assert cache.get("q1") is not None and cache.get("q3") is not None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 2 * entry_size
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = QueryEmbeddingCache()
+    cache.put("q", np.zeros(4))
+    cache.put("q", np.ones(4))
+
+    assert cache.get_stats()["bytes"] == len("q") + 16
+    assert np.array_equal(cache.get("q"), np.ones(4, dtype=np.float32))
+
+def test_entries_larger_than_the_cap_are_skipped():
+    cache = QueryEmbeddingCache(max_bytes=8)
+    cache.put("q", np.zeros(4))
+
+    assert cache.get("q") is None
+    cache.clear()
+    assert cache.get_stats()["bytes"] == 0
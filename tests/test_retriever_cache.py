@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+from langchain.docstore.document import Document
+from retriever_cache import RetrieverCache, estimate_retriever_bytes, _PER_CHUNK_OVERHEAD_BYTES
+
+def make_retriever(vector_count, dimension=4):
+    """Retriever with vector_count flat float32 vectors and one short chunk per vector"""
+    index = SimpleNamespace(ntotal=vector_count, d=dimension, code_size=dimension * 4)
+    docstore = SimpleNamespace(_dict={str(i): Document(page_content="ab", metadata={}) for i in range(vector_count)})
+    return SimpleNamespace(vectorstore=SimpleNamespace(index=index, docstore=docstore))
+
+# 16 vector bytes, 2 text bytes, 2 metadata bytes ("{}") and the fixed overhead per chunk
+CHUNK_BYTES = 16 + 2 + 2 + _PER_CHUNK_OVERHEAD_BYTES
+
+def test_estimate_counts_vectors_chunks_and_bm25():
+    retriever = make_retriever(10)
+    assert estimate_retriever_bytes(retriever) == 10 * CHUNK_BYTES
+
+    retriever.vectorstore.bm25_index = SimpleNamespace(memory_bytes=lambda: 1000)
+    assert estimate_retriever_bytes(retriever) == 10 * CHUNK_BYTES + 1000
+
+def test_evicts_least_recently_used_over_byte_limit():
+    unloaded = []
+    cache = RetrieverCache(max_bytes=2 * CHUNK_BYTES, max_entries=10, on_unload=unloaded.append)
+
+    cache.put("pdf-1", make_retriever(1))
+    cache.put("pdf-2", make_retriever(1))
+    assert cache.get("pdf-1") is not None
+    cache.put("pdf-3", make_retriever(1))
+
+    assert "pdf-2" not in cache
+    assert "pdf-1" in cache and "pdf-3" in cache
+    assert unloaded == ["pdf-2"]
+    assert cache.get_stats()["evictions"] == 1 and cache.current_bytes == 2 * CHUNK_BYTES
+
+def test_evicts_over_entry_limit():
+    cache = RetrieverCache(max_bytes=10 ** 9, max_entries=2)
+    for pdf_id in ("pdf-1", "pdf-2", "pdf-3"):
+        cache.put(pdf_id, make_retriever(1))
+
+    assert len(cache) == 2 and "pdf-1" not in cache
+
+def test_pinned_entries_survive_until_unpinned():
+    unloaded = []
+    cache = RetrieverCache(max_bytes=2 * CHUNK_BYTES, max_entries=10, on_unload=unloaded.append)
+
+    cache.put("pdf-1", make_retriever(1))
+    cache.put("pdf-2", make_retriever(1))
+    assert cache.pin("pdf-1") and cache.pin("pdf-2")
+    cache.put("pdf-3", make_retriever(1))
+
+    # The newcomer is evicted, as the only unpinned entry
+    assert "pdf-1" in cache and "pdf-2" in cache and "pdf-3" not in cache
+
+    # A pinned entry reloaded at a larger size takes the cache over its limit
+    cache.put("pdf-2", make_retriever(2))
+    assert cache.current_bytes == 3 * CHUNK_BYTES
+
+    cache.unpin("pdf-1")
+    assert "pdf-1" not in cache and "pdf-2" in cache
+    assert unloaded == ["pdf-3", "pdf-2", "pdf-1"]
+
+def test_pin_of_missing_entry_fails():
+    cache = RetrieverCache()
+    assert not cache.pin("pdf-1")
+    assert cache.get("pdf-1") is None
+    assert cache.get_stats()["misses"] == 1
+
+def test_replace_and_remove_notify_and_keep_byte_count():
+    unloaded = []
+    cache = RetrieverCache(on_unload=unloaded.append)
+
+    retriever = make_retriever(1)
+    cache.put("pdf-1", retriever)
+    cache.put("pdf-1", retriever)
+    assert unloaded == []
+
+    cache.put("pdf-1", make_retriever(2))
+    assert cache.current_bytes == 2 * CHUNK_BYTES
+    assert unloaded == ["pdf-1"]
+
+    cache.remove("pdf-1")
+    cache.remove("pdf-1")
+    assert cache.current_bytes == 0
+    assert unloaded == ["pdf-1", "pdf-1"]
+
+def test_can_admit_counts_only_pinned_entries():
+    cache = RetrieverCache(max_bytes=3 * CHUNK_BYTES, max_entries=10)
+    cache.put("pdf-1", make_retriever(2))
+
+    # pdf-1 could be evicted to make room
+    assert cache.can_admit(3 * CHUNK_BYTES)
+
+    cache.pin("pdf-1")
+    assert cache.can_admit(CHUNK_BYTES)
+    assert not cache.can_admit(2 * CHUNK_BYTES)
+    assert cache.get_stats()["pinned_bytes"] == 2 * CHUNK_BYTES
+
+def test_reserved_bytes_count_against_the_budget():
+    reserved = [0]
+    cache = RetrieverCache(max_bytes=5 * CHUNK_BYTES, max_entries=10, reserved_bytes=lambda: reserved[0])
+    cache.put("pdf-1", make_retriever(2))
+    cache.put("pdf-2", make_retriever(2))
+    assert len(cache) == 2
+
+    # Memory held elsewhere (the shared index) grew, so the next store evicts to make room
+    reserved[0] = 2 * CHUNK_BYTES
+    assert cache.can_admit(3 * CHUNK_BYTES)
+    assert not cache.can_admit(4 * CHUNK_BYTES)
+    cache.put("pdf-3", make_retriever(1))
+    assert "pdf-1" not in cache and "pdf-2" in cache and "pdf-3" in cache
+    assert cache.get_stats()["reserved_bytes"] == 2 * CHUNK_BYTES
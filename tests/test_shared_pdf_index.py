@@ -0,0 +1,161 @@
+import os
+import threading
+import numpy as np
+import faiss
+import pytest
+from langchain.docstore.document import Document
+import shared_pdf_index
+from shared_pdf_index import SharedPdfIndex
+
+DIMENSION = 8
+
+class FakeVectorStore:
+    """The parts of a langchain FAISS store that add_vector_store reads"""
+
+    def __init__(self, vectors, texts):
+        self.index = faiss.IndexFlatL2(DIMENSION)
+        self.index.add(vectors)
+        self.index_to_docstore_id = {position: str(position) for position in range(len(texts))}
+        self._docs = {str(position): Document(page_content=text, metadata={"page": position}) for position, text in enumerate(texts)}
+        self.docstore = self
+
+    def search(self, docstore_id):
+        return self._docs[docstore_id]
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.vector = np.zeros(DIMENSION, dtype=np.float32)
+
+    def embed_query(self, question):
+        return self.vector.tolist()
+
+@pytest.fixture
+def shared_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_pdf_index, "EMBEDDING_DIMENSION", DIMENSION)
+    monkeypatch.setattr(shared_pdf_index, "VECTOR_ENCODING", "float32")
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(shared_pdf_index, "get_query_embeddings", lambda: embeddings)
+    index = SharedPdfIndex(str(tmp_path / "shared"))
+    index.embeddings = embeddings
+    return index
+
+def add_pdf(index, pdf_id, count, seed):
+    vectors = np.random.default_rng(seed).random((count, DIMENSION), dtype=np.float32)
+    index.add_vector_store(pdf_id, FakeVectorStore(vectors, [f"{pdf_id} chunk {position}" for position in range(count)]))
+    return vectors
+
+def test_search_only_returns_requested_pdfs(shared_index):
+    add_pdf(shared_index, "pdf-a", 20, 1)
+    b_vectors = add_pdf(shared_index, "pdf-b", 20, 2)
+    add_pdf(shared_index, "pdf-c", 20, 3)
+
+    shared_index.embeddings.vector = b_vectors[4]
+    docs = shared_index.search("question", ["pdf-b"], k=5)
+    assert len(docs) == 5
+    assert docs[0].page_content == "pdf-b chunk 4"
+    assert all(doc.metadata["pdf_id"] == "pdf-b" for doc in docs)
+
+    docs = shared_index.search("question", ["pdf-a", "pdf-c"], k=40)
+    assert len(docs) == 40
+    assert {doc.metadata["pdf_id"] for doc in docs} == {"pdf-a", "pdf-c"}
+
+def test_search_after_compaction(shared_index, monkeypatch):
+    monkeypatch.setattr(shared_pdf_index, "SHARED_INDEX_COMPACT_RATIO", 0.0)
+    add_pdf(shared_index, "pdf-a", 10, 1)
+    add_pdf(shared_index, "pdf-b", 10, 2)
+    c_vectors = add_pdf(shared_index, "pdf-c", 10, 3)
+
+    shared_index.remove_pdf("pdf-b")
+    assert shared_index.get_stats()["index_vectors"] == 20
+
+    # Positions of pdf-c moved down by the removal; the labels still map to its chunks
+    shared_index.embeddings.vector = c_vectors[7]
+    docs = shared_index.search("question", ["pdf-c"], k=3)
+    assert docs[0].page_content == "pdf-c chunk 7"
+    assert shared_index.search("question", ["pdf-b"]) == []
+
+def test_chunk_table_usable_during_search(shared_index, monkeypatch):
+    add_pdf(shared_index, "pdf-a", 10, 1)
+
+    searching = threading.Event()
+    release = threading.Event()
+    downcast_index = faiss.downcast_index
+
+    class SlowIndex:
+        def __init__(self, index):
+            self.index = index
+
+        def search(self, *args, **kwargs):
+            searching.set()
+            release.wait(5)
+            return self.index.search(*args, **kwargs)
+
+    monkeypatch.setattr(faiss, "downcast_index", lambda index: SlowIndex(downcast_index(index)))
+    results = []
+    thread = threading.Thread(target=lambda: results.append(shared_index.search("question", ["pdf-a"], k=2)))
+    thread.start()
+    assert searching.wait(5)
+
+    # The FAISS search is in progress; lookups in the chunk table do not wait for it
+    assert shared_index.contains("pdf-a")
+    assert shared_index.get_stats()["chunks"] == 10
+
+    release.set()
+    thread.join(5)
+    assert len(results[0]) == 2
+
+def log_size(index):
+    return sum(os.path.getsize(os.path.join(index.index_dir, name)) for name in os.listdir(index.index_dir) if name.startswith("vectors-"))
+
+def test_add_and_remove_only_write_their_changes(shared_index, monkeypatch):
+    monkeypatch.setattr(shared_pdf_index, "SHARED_INDEX_COMPACT_RATIO", 0.5)
+    record_size = 8 + DIMENSION * 4
+    add_pdf(shared_index, "pdf-a", 10, 1)
+    add_pdf(shared_index, "pdf-b", 5, 2)
+    assert log_size(shared_index) == 15 * record_size
+
+    # Below the compaction ratio nothing is rewritten
+    shared_index.remove_pdf("pdf-b")
+    assert log_size(shared_index) == 15 * record_size
+
+    shared_index.compact()
+    assert log_size(shared_index) == 10 * record_size
+    assert shared_index.get_stats()["generation"] == 1
+
+def test_processes_see_each_others_changes(shared_index, tmp_path):
+    # Two instances on one directory stand in for two worker processes
+    other = SharedPdfIndex(str(tmp_path / "shared"))
+    a_vectors = add_pdf(shared_index, "pdf-a", 10, 1)
+    b_vectors = add_pdf(other, "pdf-b", 10, 2)
+
+    # Neither add overwrote the other's vectors
+    shared_index.embeddings.vector = b_vectors[3]
+    assert shared_index.search("question", ["pdf-b"], k=1)[0].page_content == "pdf-b chunk 3"
+    shared_index.embeddings.vector = a_vectors[6]
+    assert other.search("question", ["pdf-a"], k=1)[0].page_content == "pdf-a chunk 6"
+
+    # A compaction in one reloads the other from the new generation
+    other.remove_pdf("pdf-a")
+    other.compact()
+    assert shared_index.get_stats()["index_vectors"] == 10
+    shared_index.embeddings.vector = b_vectors[8]
+    assert shared_index.search("question", ["pdf-b"], k=1)[0].page_content == "pdf-b chunk 8"
+
+    # A restarted process loads everything from the log
+    restarted = SharedPdfIndex(str(tmp_path / "shared"))
+    assert restarted.get_stats()["index_vectors"] == 10
+    assert restarted.memory_bytes() == other.memory_bytes() > 0
+
+def test_interrupted_append_is_dropped(shared_index, tmp_path):
+    add_pdf(shared_index, "pdf-a", 10, 1)
+
+    # Records written by a process that died before committing its rows
+    with open(os.path.join(shared_index.index_dir, "vectors-0.bin"), "ab") as f:
+        f.write(b"\0" * (8 + DIMENSION * 4) * 3)
+
+    other = SharedPdfIndex(str(tmp_path / "shared"))
+    assert other.get_stats()["index_vectors"] == 10
+    b_vectors = add_pdf(other, "pdf-b", 5, 2)
+    shared_index.embeddings.vector = b_vectors[2]
+    assert shared_index.search("question", ["pdf-b"], k=1)[0].page_content == "pdf-b chunk 2"
+    assert shared_index.get_stats()["index_vectors"] == 15
@@ -0,0 +1,35 @@
+import json
+import pytest
+import upload_faiss_to_blob
+from test_pdf_references import FakeContainerClient, upload_pdf, HASH
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeContainerClient()
+    monkeypatch.setenv("AZURE_STORAGE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+    monkeypatch.setenv("BLOB_CONTAINER_NAME", "test")
+    monkeypatch.setattr(upload_faiss_to_blob, "get_container_client", lambda *args, **kwargs: client)
+    return client
+
+def test_known_content_reports_existing_pdf_without_reference(client, tmp_path, monkeypatch):
+    upload_pdf(client, "pdf-1")
+    pdf_path = tmp_path / "copy.pdf"
+    pdf_path.write_bytes(b"%PDF")
+
+    # The precomputed hash is used as is
+    monkeypatch.setattr(upload_faiss_to_blob, "compute_file_hash", lambda path: pytest.fail("file hashed again"))
+    result = upload_faiss_to_blob.process_and_upload_pdf(str(pdf_path), content_hash=HASH)
+
+    assert result["id"] == "pdf-1" and result["deduplicated"]
+    assert result["chunk_count"] == 7
+    assert client.record(HASH)["references"] == ["session-1"]
+
+def test_chunk_count_of_older_hash_record_read_from_metadata(client, tmp_path):
+    upload_pdf(client, "pdf-1")
+    client.upload_blob(f"hashes/{HASH}.json", json.dumps({"pdf_id": "pdf-1", "filename": "pdf-1.pdf", "page_count": 3}), overwrite=True)
+    pdf_path = tmp_path / "copy.pdf"
+    pdf_path.write_bytes(b"%PDF")
+
+    result = upload_faiss_to_blob.process_and_upload_pdf(str(pdf_path), content_hash=HASH)
+
+    assert result["chunk_count"] == 7
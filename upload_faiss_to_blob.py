@@ -1,21 +1,30 @@
 import os
+import json
+import time
 import uuid
 import shutil
 import tempfile
-from azure.storage.blob import BlobServiceClient
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from blob_pool import get_container_client, blob_timeout
 from dotenv import load_dotenv
-from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
+from embedding_engine import create_vector_store
+from pdf_extract import load_pdf_pages, init_worker_process
+from chunk_store import save_faiss_index
+from content_hash import compute_file_hash
+from index_bundle import upload_pdf_index, download_pdf_index
+from pdf_catalog import build_pdf_catalog, pdf_blob_metadata
+from pdf_references import register_pdf_hash, find_pdf_by_hash, read_json_blob
 
-def process_and_upload_pdf(pdf_path, filename=None):
+def process_and_upload_pdf(pdf_path, filename=None, content_hash=None):
     """
     Process a PDF file, create a FAISS index, and upload both to Azure Blob Storage
     
     Args:
         pdf_path: Path to the PDF file
         filename: Optional filename to use (if not provided, uses basename of pdf_path)
+        content_hash: SHA-256 of the file if the caller already computed it
         
     Returns:
         dict: Information about the uploaded PDF including ID and blob URLs
@@ -40,14 +49,31 @@ def process_and_upload_pdf(pdf_path, filename=None):
         filename = os.path.basename(pdf_path)
     
     try:
+        # Get the shared container client, creating the container if it does not exist
+        container_client = get_container_client(container_name, connection_string, create=True)
+        
+        # Skip content that is already uploaded; no reference is taken, since nothing here could release it
+        content_hash = content_hash or compute_file_hash(pdf_path)
+        existing_pdf = find_pdf_by_hash(content_hash, container_client)
+        if existing_pdf:
+            print(f"{filename} is already uploaded as PDF {existing_pdf['id']}, skipping it")
+            if existing_pdf["chunk_count"] is None:
+                # Hash records written before chunk counts were kept
+                stored, _ = read_json_blob(container_client, f"pdfs/{existing_pdf['id']}/metadata.json")
+                existing_pdf["chunk_count"] = (stored or {}).get("chunk_count", 0)
+            return {
+                **existing_pdf,
+                "pdf_blob": None,
+                "faiss_blobs": []
+            }
+        
         # Create a temporary directory for processing
         temp_dir = tempfile.mkdtemp()
         
         print(f"Processing PDF: {filename}")
         
-        # Load and process the PDF
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
+        # Load and process the PDF, extracting pages in parallel for large PDFs
+        documents = load_pdf_pages(pdf_path)
         
         print(f"Loaded {len(documents)} pages from PDF")
         
@@ -60,59 +86,55 @@ def process_and_upload_pdf(pdf_path, filename=None):
         
         print(f"Created {len(chunks)} text chunks")
         
-        # Create embeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
-        )
-        
-        # Create FAISS index
-        vector_store = FAISS.from_documents(chunks, embeddings)
+        # Create FAISS index with the batched embedding engine
+        vector_store = create_vector_store(chunks)
         
         # Save the FAISS index locally in the temp directory
         faiss_dir = os.path.join(temp_dir, "faiss_index")
-        vector_store.save_local(faiss_dir)
+        save_faiss_index(vector_store, faiss_dir)
         
         print(f"Created FAISS index in {faiss_dir}")
         
-        # Create the BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        
-        # Get container client
-        container_client = blob_service_client.get_container_client(container_name)
-        
-        # Check if container exists, if not create it
-        if not container_client.exists():
-            print(f"Container {container_name} does not exist. Creating...")
-            container_client = blob_service_client.create_container(container_name)
-        
-        # Upload the PDF file
+        # Upload the PDF file, with the counts the catalogue lists
         pdf_blob_name = f"pdfs/{upload_id}/{filename}"
         with open(pdf_path, "rb") as data:
             blob_client = container_client.upload_blob(
                 name=pdf_blob_name,
                 data=data,
-                overwrite=True
+                overwrite=True,
+                metadata=pdf_blob_metadata(len(documents), len(chunks), content_hash),
+                **blob_timeout("upload")
             )
         
         print(f"Uploaded PDF to {pdf_blob_name}")
         
-        # Upload FAISS index files
-        faiss_blobs = []
-        for file_name in os.listdir(faiss_dir):
-            file_path = os.path.join(faiss_dir, file_name)
-            blob_name = f"pdfs/{upload_id}/faiss_index/{file_name}"
-            
-            with open(file_path, "rb") as data:
-                blob_client = container_client.upload_blob(
-                    name=blob_name,
-                    data=data,
-                    overwrite=True
-                )
-            
-            faiss_blobs.append(blob_name)
+        # Upload the FAISS index (a single bundle blob unless PDF_INDEX_FORMAT=files)
+        faiss_blobs = upload_pdf_index(container_client, upload_id, faiss_dir)
+        
+        print(f"Uploaded FAISS index: {', '.join(faiss_blobs)}")
+        
+        # Upload the PDF's metadata record, in the same form process_pdf writes
+        container_client.upload_blob(
+            name=f"pdfs/{upload_id}/metadata.json",
+            data=json.dumps({
+                "id": upload_id,
+                "filename": filename,
+                "page_count": len(documents),
+                "chunk_count": len(chunks),
+                "content_hash": content_hash,
+                "size_bytes": os.path.getsize(pdf_path),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            }),
+            overwrite=True,
+            **blob_timeout("upload")
+        )
         
-        print(f"Uploaded FAISS index files: {', '.join(os.listdir(faiss_dir))}")
+        # Later uploads of the same content reference this PDF
+        register_pdf_hash(
+            content_hash,
+            {"id": upload_id, "filename": filename, "page_count": len(documents), "chunk_count": len(chunks)},
+            container_client
+        )
         
         # Create metadata file with information about the PDF
         metadata = {
@@ -173,6 +195,110 @@ def upload_directory_pdfs(directory_path):
     print(f"Successfully processed and uploaded {len(results)} out of {len(pdf_files)} PDFs")
     return results
 
+def _load_manifest(manifest_path):
+    """Load the bulk upload manifest (content hash -> upload metadata)"""
+    if not os.path.exists(manifest_path):
+        return {}
+    
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def _save_manifest(manifest, manifest_path):
+    """Write the manifest atomically so a crash never leaves it half-written"""
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+def _bulk_upload_worker(pdf_path, content_hash):
+    """Process and upload one PDF inside a bulk worker process"""
+    return pdf_path, process_and_upload_pdf(pdf_path, content_hash=content_hash)
+
+def bulk_upload_directory_pdfs(directory_path, workers=None, manifest_path=None):
+    """
+    Process and upload all PDFs in a directory concurrently, skipping PDFs already uploaded
+    
+    Completed PDFs are recorded in a manifest keyed by SHA-256 content hash, so
+    rerunning after a crash only processes the PDFs that did not finish.
+    
+    Args:
+        directory_path: Path to directory containing PDFs
+        workers: Number of worker processes (defaults to the number of CPUs, at most 4)
+        manifest_path: Path to the manifest (defaults to .upload_manifest.json in the directory)
+        
+    Returns:
+        list: Information about the PDFs uploaded in this run
+    """
+    if not os.path.isdir(directory_path):
+        print(f"Error: {directory_path} is not a valid directory")
+        return []
+    
+    workers = workers or min(os.cpu_count() or 1, 4)
+    manifest_path = manifest_path or os.path.join(directory_path, ".upload_manifest.json")
+    manifest = _load_manifest(manifest_path)
+    
+    # Find PDFs whose content has not been uploaded yet
+    pdf_files = sorted(f for f in os.listdir(directory_path) if f.lower().endswith('.pdf'))
+    pending = {}
+    for pdf_file in pdf_files:
+        pdf_path = os.path.join(directory_path, pdf_file)
+        content_hash = compute_file_hash(pdf_path)
+        if content_hash in manifest or content_hash in pending.values():
+            print(f"Skipping {pdf_file} (already uploaded)")
+            continue
+        pending[pdf_path] = content_hash
+    
+    print(f"Found {len(pdf_files)} PDF files in {directory_path}, {len(pending)} to upload with {workers} workers")
+    
+    if not pending:
+        return []
+    
+    results = []
+    start_time = time.time()
+    
+    # Split the CPU between workers so their embedding threads do not oversubscribe it
+    embedding_threads = max(1, (os.cpu_count() or 1) // workers)
+    
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker_process,
+        initargs=(embedding_threads,)
+    ) as executor:
+        futures = [executor.submit(_bulk_upload_worker, pdf_path, content_hash) for pdf_path, content_hash in pending.items()]
+        
+        for future in as_completed(futures):
+            try:
+                pdf_path, result = future.result()
+            except Exception as e:
+                print(f"Error in bulk upload worker: {str(e)}")
+                continue
+            
+            if not result:
+                continue
+            
+            # Record the PDF as done before moving on
+            result["content_hash"] = pending[pdf_path]
+            manifest[pending[pdf_path]] = {
+                "filename": result["filename"],
+                "id": result["id"],
+                "page_count": result["page_count"],
+                "chunk_count": result["chunk_count"],
+                "deduplicated": result.get("deduplicated", False),
+                "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            }
+            _save_manifest(manifest, manifest_path)
+            results.append(result)
+    
+    # Report aggregate throughput
+    elapsed = time.time() - start_time
+    # Chunks of PDFs that were already uploaded were not embedded in this run
+    total_chunks = sum(result["chunk_count"] for result in results if not result.get("deduplicated"))
+    print(f"Successfully processed and uploaded {len(results)} out of {len(pending)} PDFs in {elapsed:.1f}s")
+    print(f"Throughput: {len(results) / (elapsed / 60):.2f} PDFs/min, {total_chunks / elapsed:.1f} chunks/sec")
+    
+    return results
+
 def download_faiss_index(upload_id):
     """
     Download a FAISS index from Azure Blob Storage
@@ -200,21 +326,12 @@ def download_faiss_index(upload_id):
         faiss_dir = os.path.join(temp_dir, "faiss_index")
         os.makedirs(faiss_dir, exist_ok=True)
         
-        # Create the BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        
-        # Get container client
-        container_client = blob_service_client.get_container_client(container_name)
-        
-        # Download FAISS index files
-        blobs = container_client.list_blobs(name_starts_with=f"pdfs/{upload_id}/faiss_index/")
+        # Get the shared container client
+        container_client = get_container_client(container_name, connection_string)
         
-        for blob in blobs:
-            file_name = os.path.basename(blob.name)
-            file_path = os.path.join(faiss_dir, file_name)
-            
-            with open(file_path, "wb") as download_file:
-                download_file.write(container_client.download_blob(blob.name).readall())
+        # Download the FAISS index from its bundle, or from loose files for older uploads
+        if not download_pdf_index(container_client, upload_id, faiss_dir):
+            raise Exception(f"No FAISS index found for upload ID: {upload_id}")
         
         print(f"Downloaded FAISS index for upload ID: {upload_id}")
         return faiss_dir
@@ -245,42 +362,11 @@ def list_uploaded_pdfs():
         return []
     
     try:
-        # Create the BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        
-        # Get container client
-        container_client = blob_service_client.get_container_client(container_name)
-        
-        # Get all PDF directories
-        pdf_ids = set()
-        blobs = container_client.list_blobs(name_starts_with="pdfs/")
-        
-        for blob in blobs:
-            # Extract PDF ID from path (pdfs/{pdf_id}/...)
-            parts = blob.name.split('/')
-            if len(parts) >= 2:
-                pdf_ids.add(parts[1])
-        
-        # Get information for each PDF
-        pdfs = []
-        for pdf_id in pdf_ids:
-            # Find the PDF file
-            pdf_blobs = list(container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/"))
-            pdf_files = [blob for blob in pdf_blobs if not blob.name.startswith(f"pdfs/{pdf_id}/faiss_index/")]
-            
-            if pdf_files:
-                # Get the filename
-                filename = os.path.basename(pdf_files[0].name)
-                
-                # Check if FAISS index exists
-                faiss_blobs = list(container_client.list_blobs(name_starts_with=f"pdfs/{pdf_id}/faiss_index/"))
-                has_faiss = len(faiss_blobs) > 0
-                
-                pdfs.append({
-                    "id": pdf_id,
-                    "filename": filename,
-                    "has_faiss_index": has_faiss
-                })
+        # Get the shared container client
+        container_client = get_container_client(container_name, connection_string)
+        
+        # Build the catalogue from a single listing of the container
+        pdfs = build_pdf_catalog(container_client)
         
         return pdfs
         
@@ -297,6 +383,7 @@ if __name__ == "__main__":
         print("Commands:")
         print("  upload <pdf_path> - Process and upload a single PDF")
         print("  upload_dir <directory_path> - Process and upload all PDFs in a directory")
+        print("  bulk_upload <directory_path> [workers] - Upload a directory concurrently, skipping PDFs already uploaded")
         print("  list - List all uploaded PDFs")
         print("  download <upload_id> - Download a FAISS index")
         sys.exit(1)
@@ -314,6 +401,12 @@ if __name__ == "__main__":
         results = upload_directory_pdfs(directory_path)
         print(f"Uploaded {len(results)} PDFs")
     
+    elif command == "bulk_upload" and len(sys.argv) >= 3:
+        directory_path = sys.argv[2]
+        workers = int(sys.argv[3]) if len(sys.argv) >= 4 else None
+        results = bulk_upload_directory_pdfs(directory_path, workers)
+        print(f"Uploaded {len(results)} PDFs")
+    
     elif command == "list":
         pdfs = list_uploaded_pdfs()
         print(f"Found {len(pdfs)} uploaded PDFs:")
@@ -0,0 +1,250 @@
+import os
+import sys
+import math
+import zlib
+import struct
+import numpy as np
+import faiss
+from index_versions import resolve_index_dir
+
+# How saved indexes store their vectors: "float32" (raw), "fp16", "sq8" (8-bit scalar quantization) or "pq"
+VECTOR_ENCODING = os.environ.get("VECTOR_ENCODING", "float32")
+
+# PQ sub-quantizers; each vector takes VECTOR_PQ_M bytes (must divide the embedding dimension)
+VECTOR_PQ_M = int(os.environ.get("VECTOR_PQ_M", "48"))
+
+ENCODINGS = ["float32", "fp16", "sq8", "pq"]
+
+def build_encoded_index(vectors, encoding, pq_m=None):
+    """
+    Build an index holding vectors in the given encoding, keeping their order
+
+    PQ needs enough vectors to train its codebooks; small PDFs fall back to
+    fewer bits per code, and the tiniest to SQ8.
+
+    Returns:
+        faiss.Index: The index with all vectors added
+    """
+    vector_count, dimension = vectors.shape
+
+    if encoding == "pq":
+        pq_m = pq_m or VECTOR_PQ_M
+        # At least 39 training points per centroid
+        nbits = min(8, int(math.log2(max(2, vector_count // 39))))
+        if nbits < 4:
+            encoding = "sq8"
+        else:
+            index = faiss.IndexPQ(dimension, pq_m, nbits, faiss.METRIC_L2)
+
+    if encoding == "float32":
+        index = faiss.IndexFlatL2(dimension)
+    elif encoding == "fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif encoding == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif encoding != "pq":
+        raise ValueError(f"Unknown vector encoding {encoding}, expected one of {', '.join(ENCODINGS)}")
+
+    if vector_count:
+        index.train(vectors)
+        index.add(vectors)
+    return index
+
+def index_encoding(index):
+    """Name of the encoding an index stores its vectors in"""
+    if isinstance(index, faiss.IndexFlat):
+        return "float32"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    return type(index).__name__
+
+# Index file types whose codes are the last thing in the file, and the unit of their stored code length
+_APPENDABLE_INDEX_FILES = {b"IxF2": "floats", b"IxFI": "floats", b"IxSQ": "bytes"}
+
+def append_to_index_file(index_path, vectors):
+    """
+    Append vectors to a saved flat or scalar-quantized index file without rewriting it
+
+    These files end with their vector codes, so new codes are written at the
+    end and the vector count and code length in the file are updated. Only
+    the header is parsed, to encode the new vectors the same way.
+
+    Returns:
+        int: The number of vectors in the index afterwards, or None if the file is
+        of a type that cannot be appended to (the caller rewrites it)
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    with open(index_path, "r+b") as f:
+        fourcc = f.read(4)
+        unit = _APPENDABLE_INDEX_FILES.get(fourcc)
+        if unit is None:
+            return None
+
+        dimension, ntotal = struct.unpack("<iq", f.read(12))
+        if vectors.shape[1] != dimension:
+            raise Exception(f"Embeddings have {vectors.shape[1]} dimensions, {index_path} has {dimension}")
+        file_size = f.seek(0, os.SEEK_END)
+
+        # Find the code size whose code block and stored length match the end of the file
+        for code_size in sorted({4 * dimension, 2 * dimension, dimension, (dimension + 1) // 2, (6 * dimension + 7) // 8}):
+            codes_bytes = ntotal * code_size
+            length_offset = file_size - codes_bytes - 8
+            if length_offset < 16:
+                continue
+            f.seek(length_offset)
+            stored_length = struct.unpack("<Q", f.read(8))[0]
+            if stored_length == (codes_bytes // 4 if unit == "floats" else codes_bytes):
+                break
+        else:
+            return None
+
+        # The same header with no vectors is an empty index with the same encoding
+        f.seek(0)
+        header = bytearray(f.read(length_offset))
+        header[8:16] = struct.pack("<q", 0)
+        encoder = faiss.deserialize_index(np.frombuffer(bytes(header) + struct.pack("<Q", 0), dtype=np.uint8))
+        if encoder.sa_code_size() != code_size:
+            return None
+
+        codes = encoder.sa_encode(vectors)
+        new_total = ntotal + len(vectors)
+        new_codes_bytes = new_total * code_size
+
+        f.seek(file_size)
+        f.write(codes.tobytes())
+        f.seek(length_offset)
+        f.write(struct.pack("<Q", new_codes_bytes // 4 if unit == "floats" else new_codes_bytes))
+        f.seek(8)
+        f.write(struct.pack("<q", new_total))
+
+    return new_total
+
+def encode_vector_store(vector_store, encoding=None):
+    """
+    Replace a vector store's flat index with one in the configured encoding (VECTOR_ENCODING)
+
+    The vectors keep their positions, so the docstore mapping is unchanged.
+    Encoded stores are for searching; new texts cannot be added to a PQ or
+    SQ8 index without retraining.
+
+    Returns:
+        The same vector store
+    """
+    encoding = encoding or VECTOR_ENCODING
+    if encoding == "float32" or not isinstance(vector_store.index, faiss.IndexFlat):
+        return vector_store
+
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    vector_store.index = build_encoded_index(vectors, encoding)
+    return vector_store
+
+def convert_index_file(folder_path, encoding, index_name="index"):
+    """
+    Re-encode a saved flat index in place, keeping the original as <index_name>.faiss.float32
+
+    Returns:
+        dict: Size of the index before and after
+    """
+    folder_path = resolve_index_dir(folder_path)
+    index_path = os.path.join(folder_path, f"{index_name}.faiss")
+    index = faiss.read_index(index_path)
+    if not isinstance(index, faiss.IndexFlat):
+        raise Exception(f"{index_path} is not a flat float32 index")
+
+    encoded = build_encoded_index(index.reconstruct_n(0, index.ntotal), encoding)
+
+    backup_path = f"{index_path}.float32"
+    if not os.path.exists(backup_path):
+        os.replace(index_path, backup_path)
+
+    temp_path = f"{index_path}.tmp"
+    faiss.write_index(encoded, temp_path)
+    os.replace(temp_path, index_path)
+
+    sizes = {"before_bytes": os.path.getsize(backup_path), "after_bytes": os.path.getsize(index_path)}
+    print(f"Re-encoded {index_path} as {encoding}: {sizes['before_bytes'] / 1024:.0f}KB -> {sizes['after_bytes'] / 1024:.0f}KB")
+    return sizes
+
+def _recall(indices, ground_truth, k):
+    hits = sum(len(set(row[:k]) & set(truth[:k])) for row, truth in zip(indices, ground_truth))
+    return hits / (len(ground_truth) * k)
+
+def measure(folder_paths, index_name="index", k=5, query_count=200):
+    """
+    Measure memory, transfer size and recall@k of each encoding on saved flat indexes
+
+    Memory is the serialized index size; transfer is that size after the zlib
+    compression a bundle download would see at best. Recall is measured
+    against the flat index, using a sample of each index's own vectors as queries.
+
+    Returns:
+        dict: Totals and mean recall per encoding
+    """
+    totals = {encoding: {"memory_bytes": 0, "transfer_bytes": 0, "recall": []} for encoding in ENCODINGS}
+
+    for folder_path in folder_paths:
+        folder_path = resolve_index_dir(folder_path)
+        flat_index = faiss.read_index(os.path.join(folder_path, f"{index_name}.faiss"))
+        if not isinstance(flat_index, faiss.IndexFlat) or flat_index.ntotal == 0:
+            print(f"Skipping {folder_path}: not a non-empty flat float32 index")
+            continue
+
+        vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), size=min(query_count, len(vectors)), replace=False)]
+        _, ground_truth = flat_index.search(queries, k)
+
+        for encoding in ENCODINGS:
+            index = flat_index if encoding == "float32" else build_encoded_index(vectors, encoding)
+            serialized = faiss.serialize_index(index).tobytes()
+            _, indices = index.search(queries, k)
+
+            totals[encoding]["memory_bytes"] += len(serialized)
+            totals[encoding]["transfer_bytes"] += len(zlib.compress(serialized, 6))
+            totals[encoding]["recall"].append(_recall(indices, ground_truth, k))
+
+    baseline = totals["float32"]
+    results = {}
+    print(f"Vector encoding comparison over {len(baseline['recall'])} indexes (recall@{k} against float32)")
+    for encoding, total in totals.items():
+        if not total["recall"]:
+            continue
+        results[encoding] = {
+            "memory_bytes": total["memory_bytes"],
+            "transfer_bytes": total["transfer_bytes"],
+            "memory_saved": round(1 - total["memory_bytes"] / baseline["memory_bytes"], 3),
+            "transfer_saved": round(1 - total["transfer_bytes"] / baseline["transfer_bytes"], 3),
+            "recall": round(sum(total["recall"]) / len(total["recall"]), 4)
+        }
+        print(
+            f"  {encoding:8s}: memory {total['memory_bytes'] / (1024 * 1024):7.2f}MB "
+            f"({results[encoding]['memory_saved'] * 100:4.1f}% saved), "
+            f"transfer {total['transfer_bytes'] / (1024 * 1024):7.2f}MB "
+            f"({results[encoding]['transfer_saved'] * 100:4.1f}% saved), recall {results[encoding]['recall']:.3f}"
+        )
+
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("convert", "measure"):
+        print("Usage: python vector_encoding.py <command> [args]")
+        print("Commands:")
+        print("  convert <faiss_index_dir> <fp16|sq8|pq> - Re-encode a saved flat index in place")
+        print("  measure [faiss_index_dir ...] - Compare encodings (defaults to faiss_index and every index under user_uploads)")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == "convert" and len(sys.argv) >= 4 and sys.argv[3] in ENCODINGS[1:]:
+        convert_index_file(sys.argv[2], sys.argv[3])
+
+    elif command == "measure":
+        from chunk_store import find_index_dirs
+        measure(sys.argv[2:] or find_index_dirs())
+
+    else:
+        print("Invalid command or missing arguments")
+        sys.exit(1)